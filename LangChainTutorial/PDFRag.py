@@ -1,56 +1,112 @@
-import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import sys
+import asyncio
+import argparse
+import contextlib
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores import FAISS
 from langchain.chains import RetrievalQA
-from langchain.docstore.document import Document
+from index_store import PDFIndexStore
+from vector_index import IndexSpec, IndexInfo, embedding_options
+from embedding_cache import CachedEmbeddings
+from keyword_index import HybridRetriever
+from partitions import PersonPartitions
+from context_packing import ContextPacker
+from chat_pipeline import cite_sources
+from answer_cache import AnswerCache, answer_namespace, question_person
+from batch_questions import read_questions, run_batch
 
 pdf_dir = "./pdfs/"  # PDF 파일이 저장된 폴더 경로
-documents = []
-dirs = os.listdir(pdf_dir)
 
-def combine_docs(path):
-    loader = PyPDFLoader(path).load()
+# 1~3. PDF 불러오기, 텍스트 나누기, 벡터 저장소 구축
+# 저장된 인덱스가 있으면 불러오고 추가/변경된 PDF만 다시 임베딩
+def load_vectorstore():
+    # 같은 청크는 다시 임베딩하지 않도록 디스크 캐시 사용 (EMBEDDING_DIMENSIONS 로 차원 축소)
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(**embedding_options("text-embedding-3-small")))
+    store = PDFIndexStore(
+        pdf_dir=pdf_dir,
+        embeddings=embeddings,
+        chunk_size=2000,
+        chunk_overlap=100,
+        combine_pages=True,
+        index_spec=IndexSpec.from_env(),  # FAISS_INDEX_TYPE 로 flat/ivf/hnsw/ivf_pq/sq 선택
+    )
+    db = store.sync()
 
-    temp_text = ""
-    for temp in loader:
-        temp_text += temp.page_content + "\n\n"
+    # 파싱에 실패한 PDF 알림 (나머지 파일은 정상적으로 인덱싱됨)
+    if store.last_report is not None:
+        for path, error in store.last_report.failures.items():
+            print(f"⚠️ PDF 처리 실패: {path} ({error})")
+    if store.last_dedup_report is not None and store.last_dedup_report.chunks:
+        print(f"🧹 {store.last_dedup_report.describe()}")
+    index_info = store.load_manifest().get("index")
+    if index_info is not None:
+        print(f"🗂️ 인덱스: {IndexInfo(**index_info).describe()}")
+    return db, store
 
-    return Document(page_content=temp_text)
+# 4. QA 체인 구성
+# 벡터 검색과 BM25 키워드 검색(사람 이름 등 정확히 일치하는 단어)을 RRF 로 합쳐서 사용
+# 질문에 사람 이름이 나오면 그 사람의 문서만 검색
+# 2000자 청크를 그대로 4개 넣지 않고, 겹치는 조각은 MMR 로 줄이고 이어지는 청크는 합쳐서 토큰 예산(CONTEXT_MAX_TOKENS) 안에서 전달
+def build_qa_chain(db, keyword_index):
+    retriever = HybridRetriever(
+        vectorstore=db,
+        keyword_index=keyword_index,
+        partitions=PersonPartitions(db),
+        packer=ContextPacker.from_env()
+    )
 
-# 1. PDF 폴더 내 모든 파일 불러오기
-for dir in dirs:
-    full_path = os.path.join(pdf_dir, dir)
-    temp_doc = combine_docs(full_path)
-    documents.append(temp_doc)
+    return RetrievalQA.from_chain_type(
+        llm=ChatOpenAI(model="gpt-4.1-nano"),
+        chain_type='stuff',
+        retriever=retriever,
+        return_source_documents=True
+    )
 
-# 2. 텍스트 나누기
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=2000,
-    chunk_overlap=100,
-)
-chunks = text_splitter.split_documents(documents)
+# 5. 질문 루프
+# PDF 파싱 워커 프로세스(spawn)가 이 스크립트를 다시 불러와도 실행되지 않도록 main 에서만 실행
+# --batch 로 질문 파일(JSONL 또는 한 줄에 질문 하나, "-" 이면 표준 입력)을 주면 여러 질문을 동시에 처리
+# 예: python PDFRag.py --batch questions.jsonl --output results.jsonl --concurrency 8 --rate 5
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDF 문서 질문 답변")
+    parser.add_argument("--batch", help="질문 파일 경로 (- 이면 표준 입력)")
+    parser.add_argument("--output", help="결과 JSONL 경로 (이미 있으면 답이 없는 질문만 이어서 실행, 없으면 표준 출력)")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 처리할 질문 수")
+    parser.add_argument("--rate", type=float, help="초당 시작할 최대 질문 수")
+    args = parser.parse_args()
 
-# 3. 임베딩 생성 및 벡터 저장소 구축
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-db = FAISS.from_documents(chunks, embeddings)
+    # 결과를 표준 출력으로 내보낼 때는 인덱스 안내 메시지가 섞이지 않도록 표준 에러로 출력
+    with contextlib.redirect_stdout(sys.stderr if args.batch and not args.output else sys.stdout):
+        db, store = load_vectorstore()
+    # 색인된 PDF 가 없으면 검색할 문서가 없으므로 종료
+    if db is None:
+        sys.exit(f"❌ {pdf_dir} 폴더에 색인된 PDF 가 없습니다. PDF 파일을 넣고 다시 실행하세요.")
+    qa_chain = build_qa_chain(db, store.keyword_index)
 
-# 4. QA 체인 구성
-retriever = db.as_retriever()
+    if args.batch:
+        # 평가용이므로 답변 캐시를 쓰지 않고 모든 질문을 실제로 실행 (실패한 질문이 있으면 종료 코드 1)
+        questions = read_questions(args.batch)
+        failed = asyncio.run(run_batch(qa_chain, questions, args.output, args.concurrency, args.rate))
+        sys.exit(1 if failed else 0)
 
-qa_chain = RetrievalQA.from_chain_type(
-    llm=ChatOpenAI(model="gpt-4.1-nano"),
-    chain_type='stuff',
-    retriever=retriever,
-    return_source_documents=True
-)
+    # 같은 (또는 의미가 거의 같은) 질문은 검색과 LLM 호출 없이 캐시된 답변 사용
+    # 질문에 나오는 사람마다 구역을 나눠서 이름만 다른 질문에 다른 사람의 답변을 쓰지 않음
+    answer_cache = AnswerCache(db.embeddings)
+    index_version = store.load_manifest()["version"]
+    persons = qa_chain.retriever.partitions.persons
 
-# 5. 질문 루프
-while True:
-    question = input("질문을 입력하세요 (종료하려면 'exit'): ")
-    if question.lower() == "exit":
-        break
+    while True:
+        question = input("질문을 입력하세요 (종료하려면 'exit'): ")
+        if question.lower() == "exit":
+            break
+
+        namespace = answer_namespace("gpt-4.1-nano", None, index_version, question_person(question, None, persons))
+        cached = answer_cache.get(question, namespace)
+        if cached is not None:
+            print("💬 답변 (캐시):", cached.answer)
+            print("📎 출처:", ", ".join(cached.sources or []))
+            continue
 
-    result = qa_chain.invoke({"query": question})
-    print("💬 답변:", result)
+        result = qa_chain.invoke({"query": question})
+        sources = cite_sources(result["source_documents"])
+        answer_cache.put(question, result["result"], namespace, sources)
+        print("💬 답변:", result["result"])
+        print("📎 출처:", ", ".join(sources))
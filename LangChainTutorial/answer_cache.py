@@ -0,0 +1,145 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+import numpy as np
+from embedding_cache import normalize_text
+from partitions import find_person
+
+# 캐시 적중 종류
+EXACT_HIT = "exact"
+SEMANTIC_HIT = "semantic"
+
+
+# temperature 를 몇 개의 구간으로 묶기 (비슷한 설정끼리는 답변을 함께 사용)
+def temperature_band(temperature):
+    if temperature is None:
+        return "default"
+    if temperature == 0:
+        return "0"
+    if temperature <= 0.5:
+        return "low"
+    if temperature <= 1.0:
+        return "mid"
+    return "high"
+
+
+# 답변이 달라질 수 있는 조건을 모은 캐시 구역 (인덱스 버전이 바뀌면 이전 답변은 다시 쓰지 않음)
+def answer_namespace(model, temperature, index_version, *extra):
+    return (model, temperature_band(temperature), index_version) + tuple(extra)
+
+
+# 답변 캐시 구역에 넣을 사람 (검색 대상을 고르지 않았으면 질문에 나오는 이름)
+# "차수민은 어떤 사람이야?" 와 "박수현은 어떤 사람이야?" 처럼 이름만 다른 질문은 임베딩이 거의 같아도
+# 서로 다른 사람의 문서로 답하므로 다른 구역에 저장
+def question_person(question, person, persons):
+    return person if person is not None else find_person(question, persons)
+
+
+# 답변 캐시 구역에 넣을 앞선 대화의 요약값 (첫 질문이면 None)
+# "그 사람 취미는?" 처럼 앞 대화에 따라 뜻이 달라지는 질문은 대화가 같을 때만 저장된 답변을 사용
+def conversation_digest(messages):
+    if not messages:
+        return None
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(json.dumps([message["role"], message["content"]], ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    kind: str
+    similarity: float
+    question: str
+    sources: list = None
+
+
+@dataclass
+class _Entry:
+    question: str
+    answer: str
+    vector: np.ndarray
+    created: float
+    sources: list = None
+
+
+# 같은 질문이나 의미가 거의 같은 질문에 대해 LLM 을 다시 부르지 않도록 답변을 저장하는 캐시
+class AnswerCache:
+    def __init__(self, embeddings, similarity_threshold=0.92, ttl=24 * 60 * 60, max_entries=1000):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self._entries = OrderedDict()  # (구역, 정규화된 질문) -> 항목 (오래 사용하지 않은 순서)
+        self._lock = threading.Lock()
+
+    # 질문 임베딩 (길이 1로 정규화해서 내적이 코사인 유사도가 되도록 함)
+    def _embed(self, question):
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry.created > self.ttl
+
+    # 캐시된 답변 찾기 (정확히 같은 질문 → 유사한 질문 순서, 없으면 None)
+    def get(self, question, namespace):
+        key = (namespace, normalize_text(question))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return CachedAnswer(entry.answer, EXACT_HIT, 1.0, entry.question, entry.sources)
+            candidates = [(k, e) for k, e in self._entries.items()
+                          if k[0] == namespace and not self._expired(e, now)]
+
+        if not candidates or self.similarity_threshold is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        query = self._embed(question)
+        similarities = np.stack([e.vector for _, e in candidates]) @ query
+        best = int(np.argmax(similarities))
+        with self._lock:
+            if similarities[best] < self.similarity_threshold:
+                self.stats["misses"] += 1
+                return None
+            best_key, entry = candidates[best]
+            if best_key in self._entries:
+                self._entries.move_to_end(best_key)
+            self.stats["semantic_hits"] += 1
+        return CachedAnswer(entry.answer, SEMANTIC_HIT, float(similarities[best]), entry.question, entry.sources)
+
+    # 답변 저장 (최대 개수를 넘으면 가장 오래 사용하지 않은 답변부터 삭제)
+    def put(self, question, answer, namespace, sources=None):
+        vector = self._embed(question)
+        key = (namespace, normalize_text(question))
+        with self._lock:
+            self._entries[key] = _Entry(question, answer, vector, time.time(), sources)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    # 적중률 등 캐시 상태 요약
+    def summary(self):
+        with self._lock:
+            hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
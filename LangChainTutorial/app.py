@@ -1,33 +1,51 @@
 import streamlit as st
 import os
 from pathlib import Path
-import base64
-import pygame
+from importlib.machinery import ModuleSpec
+from startup_profile import StartupProfile
+
+# PDF 파싱 워커(forkserver/spawn)는 ingest 모듈의 함수만 실행하는데, Streamlit 이 만든 __main__ 모듈에는
+# __spec__ 이 없어서 워커가 이 스크립트를 __mp_main__ 으로 다시 실행함 (화면, 서버, 인덱스 준비까지)
+# __main__ 이름의 spec 을 달아 두면 워커는 스크립트를 다시 실행하지 않음
+__spec__ = ModuleSpec("__main__", None)
 
 # 페이지 설정 (가장 먼저 실행되어야 함)
 st.set_page_config(page_title="차수민 챗봇", page_icon="💬")
 
 from dotenv import load_dotenv
-from openai import OpenAI, BadRequestError
-import tempfile
-import time
-import hashlib
-from datetime import datetime
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.chains import RetrievalQA
-from langchain_openai import ChatOpenAI
+# openai, langchain, FAISS 인덱스처럼 무거운 모듈은 첫 화면을 그린 뒤 백그라운드 준비 작업에서 import
+from warmup import BackgroundTask, FAILED
+from speech_cache import SpeechCache
+from conversation_memory import token_budget
+from speech_jobs import SpeechJobQueue, PENDING, READY
+from turn_tracing import Tracer
+from chat_pipeline import RAG_MODE_SINGLE, RAG_MODE_TWO_STAGE, describe_metrics
 
 # 환경 변수 로드
 load_dotenv()
 
-# OpenAI 클라이언트 초기화
-client = OpenAI()
+# 시작 단계별 시간 기록 (프로세스당 하나, 첫 실행의 시간만 기록)
+@st.cache_resource
+def get_startup_profile():
+    return StartupProfile()
+
+startup_profile = get_startup_profile()
+startup_profile.mark("모듈 import")
 
-# pygame 초기화
-pygame.mixer.init()
+# OpenAI 클라이언트 초기화 (openai 패키지 import 가 오래 걸리므로 백그라운드에서 시작)
+def create_client():
+    from openai import OpenAI
+    return OpenAI()
+
+@st.cache_resource
+def start_openai_client():
+    return BackgroundTask(create_client, name="openai")
+
+openai_task = start_openai_client()
+
+# OpenAI 클라이언트 (준비될 때까지 기다림)
+def get_client():
+    return openai_task.result()
 
 # 현재 작업 디렉토리 가져오기
 current_dir = Path(__file__).parent.absolute()
@@ -49,98 +67,158 @@ if "voice_type" not in st.session_state:
     st.session_state.voice_type = "alloy"
 if "voice_instructions" not in st.session_state:
     st.session_state.voice_instructions = ""
+if "rag_mode" not in st.session_state:
+    st.session_state.rag_mode = RAG_MODE_SINGLE
+if "person_scope" not in st.session_state:
+    st.session_state.person_scope = None
+if "debug_turns" not in st.session_state:
+    st.session_state.debug_turns = 0
+
+# 채팅 API 서버 주소 (지정하면 그 서버에 질문만 보내고, 없으면 이 프로세스 안에서 서버를 띄움)
+CHAT_API_URL = os.getenv("CHAT_API_URL")
+
+# 음성 합성 함수 (백그라운드 스레드에서도 호출할 수 있도록 음성 설정을 인자로 받고 mp3 바이트를 반환)
+def synthesize_speech(text, voice_model, voice_type, voice_instructions):
+    with get_client().audio.speech.with_streaming_response.create(
+        model=voice_model,
+        voice=voice_type,
+        input=text,
+        instructions=voice_instructions if voice_instructions else None,
+        response_format="mp3"
+    ) as response:
+        return response.read()
 
-# 음성 파일 경로 생성 함수
-def get_speech_file_path(message_content):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    content_hash = hashlib.md5(message_content.encode()).hexdigest()[:8]
-    return str(speech_dir / f"speech_{timestamp}_{content_hash}.mp3")
-
-# 음성 생성 및 저장 함수
-def generate_and_save_speech(text, file_path):
-    try:
-        with client.audio.speech.with_streaming_response.create(
-            model=st.session_state.voice_model,
-            voice=st.session_state.voice_type,
-            input=text,
-            instructions=st.session_state.voice_instructions if st.session_state.voice_instructions else None,
-            response_format="mp3"
-        ) as response:
-            # 파일 확장자가 없으면 추가
-            if not file_path.endswith('.mp3'):
-                file_path += '.mp3'
-            response.stream_to_file(file_path)
-            if not os.path.exists(file_path):
-                raise Exception("음성 파일이 생성되지 않았습니다.")
-            return file_path
-    except Exception as e:
-        st.error(f"음성 생성 중 오류가 발생했습니다: {str(e)}")
-        raise
-
-# 음성 재생 함수
-def play_speech(file_path):
-    try:
-        pygame.mixer.music.load(file_path)
-        pygame.mixer.music.play()
-        while pygame.mixer.music.get_busy():
-            time.sleep(0.1)
-        pygame.mixer.music.unload()
-    except Exception as e:
-        st.error(f"음성 재생 중 오류가 발생했습니다: {str(e)}")
-
-# 파일을 base64로 인코딩하는 함수
-def get_binary_file_downloader_html(file_path, file_label='File'):
-    with open(file_path, 'rb') as f:
-        data = f.read()
-    b64 = base64.b64encode(data).decode()
-    return f'<a href="data:audio/mp3;base64,{b64}" download="{os.path.basename(file_path)}">{file_label}</a>'
-
-# PDF 문서 로드 및 벡터 저장소 초기화
+# 음성 캐시 초기화 (모든 세션이 함께 사용)
+@st.cache_resource
+def get_speech_cache():
+    return SpeechCache(speech_dir)
+
+speech_cache = get_speech_cache()
+
+# 채팅 기록의 음성을 백그라운드에서 만드는 작업 큐 (모든 세션이 함께 사용)
+@st.cache_resource
+def get_speech_jobs():
+    return SpeechJobQueue(speech_cache, synthesize_speech)
+
+speech_jobs = get_speech_jobs()
+
+# 현재 음성 설정
+def current_voice_settings():
+    return {
+        "voice_model": st.session_state.voice_model,
+        "voice_type": st.session_state.voice_type,
+        "voice_instructions": st.session_state.voice_instructions,
+    }
+
+# 음성 파일 경로 가져오기 함수 (같은 텍스트와 음성 설정으로 만든 파일이 캐시에 없으면 None)
+def get_speech_file_path(message_content, voice):
+    return speech_cache.peek(speech_cache.key(message_content, **voice))
+
+# 턴 단계별 시간 / 토큰 / 바이트 기록 (프로세스당 하나, TRACE_LOG 로 로그 위치 설정)
+@st.cache_resource
+def get_tracer():
+    return Tracer()
+
+tracer = get_tracer()
+
+# 오디오 플레이어 표시 함수 (자동 재생하지 않음)
+# 음성 캐시를 함께 쓰는 채팅 API 서버가 이 프로세스에 있으면 파일 내용을 페이지에 넣지 않고 서버의 /audio/{key} URL 로 참조
+# (외부 채팅 API 서버를 쓰거나 서버가 아직 준비되지 않았으면 Streamlit 미디어 파일 관리자로 제공)
+def render_audio(file_path):
+    if chat_service is not None:
+        st.audio(chat_api.audio_url(chat_service.audio_url(Path(file_path).stem)), format="audio/mp3")
+    else:
+        st.audio(file_path, format="audio/mp3")
+
+# 문서 인덱스 생성 (chat_service 는 langchain, FAISS 를 쓰므로 백그라운드 작업 안에서 import)
+def create_index():
+    from chat_service import create_live_index
+    return create_live_index()
+
+# 인덱스 준비는 백그라운드에서 하고 화면은 바로 표시 (프로세스당 한 번, 외부 채팅 API 서버를 쓰면 None)
 @st.cache_resource
 def initialize_pdf_rag():
-    # PDF 파일들이 있는 디렉토리
-    pdf_dir = "pdfs"
-    
-    # 모든 PDF 문서를 로드
-    all_docs = []
-    for filename in os.listdir(pdf_dir):
-        if filename.endswith(".pdf"):
-            file_path = os.path.join(pdf_dir, filename)
-            loader = PyPDFLoader(file_path)
-            docs = loader.load()
-            all_docs.extend(docs)
-    
-    # 텍스트 분할기 초기화
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=200
-    )
-    
-    # 문서 분할
-    texts = text_splitter.split_documents(all_docs)
-    
-    # 임베딩 모델 초기화
-    embeddings = OpenAIEmbeddings()
-    
-    # 벡터 저장소 생성
-    vectorstore = FAISS.from_documents(texts, embeddings)
-    
-    # QA 체인 초기화
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=ChatOpenAI(temperature=0),
-        chain_type="stuff",
-        retriever=vectorstore.as_retriever()
-    )
-    
-    return qa_chain
+    return None if CHAT_API_URL else BackgroundTask(create_index, name="pdf-index")
+
+# PDF RAG 초기화 (준비되기 전에는 None 이고, 그동안은 문서 검색 없이 답변)
+rag_task = initialize_pdf_rag()
+live_index = rag_task.get() if rag_task is not None else None
+# 현재 인덱스 스냅샷 (색인된 PDF 가 없으면 None 이거나 벡터 저장소가 None)
+snapshot = live_index.current() if live_index is not None else None
+
+# 채팅 파이프라인 (검색, 답변 캐시, 답변 스트리밍, 문장별 음성 합성)을 제공하는 API 서버와 클라이언트
+# CHAT_API_URL 이 없으면 이 프로세스의 인덱스와 캐시를 그대로 쓰는 서버를 스레드에서 시작하고 뜰 때까지 기다림
+def create_chat_api():
+    from chat_client import ChatAPIClient
+    if CHAT_API_URL:
+        return None, ChatAPIClient(CHAT_API_URL, public_url=os.getenv("CHAT_API_PUBLIC_URL"))
+    from chat_service import ChatService
+    from chat_server import ChatServerThread, create_app
+    service = ChatService.from_env(rag_task, speech_cache, tracer)
+    server = ChatServerThread(
+        create_app(service),
+        host=os.getenv("CHAT_API_HOST", "127.0.0.1"),
+        port=int(os.getenv("CHAT_API_PORT", "8503"))
+    ).start()
+    return service, ChatAPIClient(server.base_url, public_url=os.getenv("CHAT_API_PUBLIC_URL"))
+
+# starlette, uvicorn, httpx import 와 서버 시작은 인덱스처럼 백그라운드에서 하고 화면은 바로 표시 (프로세스당 한 번)
+@st.cache_resource
+def start_chat_api():
+    return BackgroundTask(create_chat_api, name="chat-api")
+
+# 채팅 API (준비되기 전에는 None, 질문하면 준비될 때까지 기다림)
+chat_api_task = start_chat_api()
+chat_service, chat_api = chat_api_task.get() or (None, None)
 
-# PDF RAG 초기화
-qa_chain = initialize_pdf_rag()
+# 답변 캐시 (서버가 이 프로세스 안에 있을 때만 상태를 표시)
+answer_cache = chat_service.answer_cache if chat_service is not None else None
+
+# 채팅 API 세션 ID (대화 기록과 요약 메모리는 서버에 있음, 처음 질문할 때 생성)
+def get_chat_session():
+    if "chat_session_id" not in st.session_state:
+        st.session_state.chat_session_id = chat_api.create_session()
+    return st.session_state.chat_session_id
 
 # 사이드바 설정
 with st.sidebar:
     st.title("설정 ⚙️")
-    
+    api_health = {"persons": []}
+    if chat_api_task.status == FAILED:
+        st.error(f"채팅 API 를 시작하지 못했습니다: {chat_api_task.error}")
+    elif chat_api is None:
+        st.info(f"🌐 채팅 API 시작 중... ({chat_api_task.running_time():.0f}초 경과)")
+    elif CHAT_API_URL:
+        try:
+            api_health = chat_api.health()
+            st.caption(f"🌐 채팅 API 서버 {CHAT_API_URL} · 인덱스 {api_health['index']}" + (f" v{api_health['index_version']}" if api_health["index_version"] else ""))
+        except Exception as e:
+            st.error(f"채팅 API 서버에 연결할 수 없습니다: {e}")
+    # 문서 인덱스 상태 (외부 채팅 API 서버를 쓰면 rag_task 가 None 이고, 인덱스 상태는 위의 서버 상태로 표시)
+    if live_index is not None and (snapshot is None or snapshot.vectorstore is None):
+        st.info("📚 색인된 PDF 가 없어 문서 검색 없이 답변합니다. pdfs 폴더에 PDF 를 넣으면 자동으로 색인합니다.")
+    elif live_index is not None:
+        st.caption(f"📚 현재 인덱스 버전 v{live_index.version}" + (" · mmap 공유" if live_index.mapped else ""))
+        if answer_cache is not None:
+            answer_summary = answer_cache.summary()
+            st.caption(f"💾 답변 캐시: 적중률 {answer_summary['hit_rate']:.0%} (같은 질문 {answer_summary['exact_hits']} / 유사한 질문 {answer_summary['semantic_hits']} / 미스 {answer_summary['misses']}) · {answer_summary['entries']}개")
+    elif rag_task is not None and rag_task.status == FAILED:
+        st.error(f"문서 인덱스를 준비하지 못했습니다: {rag_task.error}")
+    elif rag_task is not None:
+        st.info(f"📚 문서 색인 중... ({rag_task.running_time():.0f}초 경과) 그동안은 문서 검색 없이 답변합니다.")
+    cache_summary = speech_cache.summary()
+    st.caption(f"🔊 음성 캐시: 적중 {cache_summary['hits']} / 미스 {cache_summary['misses']} · 파일 {cache_summary['files']}개 ({cache_summary['bytes'] / 1024 / 1024:.1f}MB) · 생성 중 {speech_jobs.pending()}개")
+    if live_index is not None:
+        from vector_index import IndexInfo
+        if live_index.store.last_report is not None:
+            for path, error in live_index.store.last_report.failures.items():
+                st.warning(f"PDF 처리 실패: {os.path.basename(path)} ({error})")
+        if live_index.store.last_dedup_report is not None and live_index.store.last_dedup_report.chunks:
+            st.caption(f"🧹 {live_index.store.last_dedup_report.describe()}")
+        index_info = live_index.store.load_manifest().get("index")
+        if index_info is not None:
+            st.caption(f"🗂️ 인덱스: {IndexInfo(**index_info).describe()}")
+
     # AI 모델 선택
     model_options = {
         "GPT-4.1 Nano": "gpt-4.1-nano",
@@ -154,7 +232,7 @@ with st.sidebar:
         index=list(model_options.keys()).index(next(k for k, v in model_options.items() if v == st.session_state.model))
     )
     st.session_state.model = model_options[selected_model]
-    
+
     # Temperature 설정
     st.session_state.temperature = st.slider(
         "창의성 (Temperature)",
@@ -164,6 +242,66 @@ with st.sidebar:
         step=0.1,
         help="값이 높을수록 더 창의적인 응답을 생성합니다. 낮을수록 더 결정적이고 일관된 응답을 생성합니다."
     )
+    if "memory_info" in st.session_state:
+        memory = st.session_state.memory_info
+        st.caption(f"🧠 대화 메모리: 요약된 메시지 {memory['summarized_count']}개 · 최근 메시지 {memory['last_window']}개 그대로 전달 · 예산 {token_budget(st.session_state.model)} 토큰")
+
+    # RAG 답변 방식 선택
+    rag_mode_options = {
+        "단일 호출 (검색 결과 직접 전달)": RAG_MODE_SINGLE,
+        "2단계 (RetrievalQA + 채팅)": RAG_MODE_TWO_STAGE
+    }
+    selected_rag_mode = st.radio(
+        "RAG 답변 방식",
+        options=list(rag_mode_options.keys()),
+        index=list(rag_mode_options.values()).index(st.session_state.rag_mode),
+        help="단일 호출은 검색된 문서 조각을 바로 채팅 모델에 넘겨 LLM 호출을 한 번으로 줄입니다."
+    )
+    st.session_state.rag_mode = rag_mode_options[selected_rag_mode]
+
+    # 검색 대상 선택 (한 사람을 고르면 그 사람의 문서만 검색, 자동이면 질문에 나온 이름으로 범위를 정함)
+    if CHAT_API_URL:
+        persons = api_health["persons"]
+    else:
+        partitions = snapshot.partitions if snapshot is not None else None
+        persons = partitions.persons if partitions is not None else []
+    person_options = ["자동 (질문에 나온 이름)"] + persons
+    selected_person = st.selectbox(
+        "검색 대상",
+        options=person_options,
+        index=person_options.index(st.session_state.person_scope) if st.session_state.person_scope in person_options else 0
+    )
+    st.session_state.person_scope = None if selected_person == person_options[0] else selected_person
+
+    # 모드별 평균 지연 시간과 토큰 수 비교
+    turn_metrics_list = [m["metrics"] for m in st.session_state.messages if "metrics" in m]
+    if turn_metrics_list:
+        with st.expander("RAG 방식별 평균"):
+            for mode, label in [(RAG_MODE_SINGLE, "단일 호출"), (RAG_MODE_TWO_STAGE, "2단계")]:
+                rows = [m for m in turn_metrics_list if m["mode"] == mode]
+                if rows:
+                    ttfts = [m["ttft"] for m in rows if m.get("ttft") is not None]
+                    st.write(
+                        f"{label}: {sum(m['latency'] for m in rows) / len(rows):.2f}초, "
+                        f"첫 토큰 {sum(ttfts) / len(ttfts) if ttfts else 0:.2f}초, "
+                        f"토큰 {sum(m['prompt_tokens'] + m['completion_tokens'] for m in rows) / len(rows):.0f}개 "
+                        f"({len(rows)}턴)"
+                    )
+
+    # 시작 단계별 시간 (백그라운드 준비 작업은 끝난 것만 표시)
+    for task, stage in [(openai_task, "OpenAI 클라이언트 준비"), (rag_task, "문서 인덱스 준비"), (chat_api_task, "채팅 API 준비")]:
+        if task is not None and task.elapsed is not None:
+            startup_profile.record(stage, task.elapsed)
+    with st.expander("⏱️ 시작 프로파일"):
+        st.text(startup_profile.describe())
+
+    # 최근 턴의 단계별 기록 표시 (0 이면 표시하지 않음)
+    if st.checkbox("🔍 디버그 패널", value=st.session_state.debug_turns > 0):
+        st.session_state.debug_turns = st.slider("표시할 최근 턴 수", 1, 20, st.session_state.debug_turns or 5)
+        if chat_api is not None:
+            st.caption(f"📈 지표: {chat_api.public_url}/metrics")
+    else:
+        st.session_state.debug_turns = 0
 
     # 음성 설정 구분선
     st.divider()
@@ -199,7 +337,7 @@ with st.sidebar:
 
     # 음성 지시사항 설정
     st.subheader("음성 지시사항")
-    
+
     # 미리 정의된 지시사항 옵션
     preset_instructions = {
         "기본": "",
@@ -211,14 +349,14 @@ with st.sidebar:
         "조폭": "조폭같은 말투",
         "술취한 사람": "술 취한 목소리"
     }
-    
+
     # 지시사항 선택 방식
     instruction_mode = st.radio(
         "지시사항 설정 방식",
         ["미리 정의된 옵션", "직접 입력"],
         horizontal=True
     )
-    
+
     if instruction_mode == "미리 정의된 옵션":
         selected_preset = st.selectbox(
             "지시사항 선택",
@@ -236,54 +374,67 @@ with st.sidebar:
 # 타이틀
 st.title("AI 채팅방 🤖")
 
-# 오디오 HTML 생성 함수
-def get_audio_html(audio_file):
-    with open(audio_file, "rb") as f:
-        audio_bytes = f.read()
-    audio_b64 = base64.b64encode(audio_bytes).decode()
-    audio_html = f"""
-        <audio controls autoplay>
-            <source src="data:audio/mp3;base64,{audio_b64}" type="audio/mp3">
-            Your browser does not support the audio element.
-        </audio>
-    """
-    return audio_html
+# 턴 기록을 단계별 표로 변환 (시작 시각과 걸린 시간은 ms)
+def trace_rows(record):
+    rows = []
+    for span in record["spans"]:
+        attrs = {k: v for k, v in span.items() if k not in ("name", "start", "duration")}
+        rows.append({
+            "단계": span["name"],
+            "시작(ms)": round(span["start"] * 1000, 1),
+            "시간(ms)": round(span["duration"] * 1000, 1),
+            "속성": ", ".join(f"{k}={v}" for k, v in attrs.items())
+        })
+    return rows
+
+# 디버그 패널 (최근 N개 턴의 단계별 기록)
+if st.session_state.debug_turns:
+    traces = [m["trace"] for m in st.session_state.messages if "trace" in m][-st.session_state.debug_turns:]
+    for record in reversed(traces):
+        with st.expander(f"🔍 {record['mode']} · {record['duration']:.2f}초 · {record['turn_id']}"):
+            st.table(trace_rows(record))
+    if not traces:
+        st.caption("🔍 기록된 턴이 없습니다")
 
 # 채팅 기록 표시
+pending_speech_jobs = []
 for i, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         st.write(message["content"])
-        
+
+        # 답변에 사용된 인덱스 버전 표시
+        if "index_version" in message:
+            st.caption(f"📚 인덱스 버전 v{message['index_version']}")
+        if message.get("sources"):
+            st.caption("📎 출처: " + ", ".join(message["sources"]))
+        if "metrics" in message:
+            st.caption(describe_metrics(message["metrics"]))
+
         # AI 응답에만 음성 재생 버튼 추가
         if message["role"] == "assistant":
-            # 음성 파일 경로가 없으면 생성
-            if "speech_file" not in message:
-                try:
-                    speech_file = get_speech_file_path(message["content"])
-                    if not os.path.exists(speech_file):
-                        speech_file = generate_and_save_speech(message["content"], speech_file)
-                        st.success(f"음성 파일이 생성되었습니다: {speech_file}")
-                    message["speech_file"] = speech_file
-                except Exception as e:
-                    st.error(f"음성 파일 생성 중 오류가 발생했습니다: {str(e)}")
-                    continue
-            
+            # 음성 파일이 없으면 백그라운드 작업으로 요청하고 화면은 기다리지 않고 계속 그림
+            # (채팅 API 서버가 만든 음성은 서버 URL 로 재생)
+            if "speech_url" not in message and ("speech_file" not in message or not os.path.exists(message["speech_file"])):
+                job = speech_jobs.request(message["content"], current_voice_settings())
+                message["speech_status"] = job.status
+                if job.status == READY:
+                    message["speech_file"] = job.path
+                elif job.status == PENDING:
+                    message.pop("speech_file", None)
+                    pending_speech_jobs.append(job)
+                    st.caption("🔊 음성 생성 중...")
+                else:
+                    message.pop("speech_file", None)
+                    st.error(f"음성 파일 생성 중 오류가 발생했습니다: {job.error}")
+                    st.button("음성 다시 생성", key=f"retry_speech_{i}", on_click=speech_jobs.retry, args=(job.key,))
+
             # 음성 재생
             try:
-                if "speech_file" in message and os.path.exists(message["speech_file"]):
-                    # HTML 오디오 플레이어 직접 생성
-                    with open(message["speech_file"], "rb") as f:
-                        audio_bytes = f.read()
-                    audio_b64 = base64.b64encode(audio_bytes).decode()
-                    audio_html = f"""
-                        <audio controls autoplay>
-                            <source src="data:audio/mp3;base64,{audio_b64}" type="audio/mp3">
-                            Your browser does not support the audio element.
-                        </audio>
-                    """
-                    st.markdown(audio_html, unsafe_allow_html=True)
-                else:
-                    st.error("음성 파일을 찾을 수 없습니다. 다시 생성해주세요.")
+                if "speech_url" in message:
+                    st.audio(message["speech_url"], format="audio/mp3")
+                elif "speech_file" in message:
+                    # 파일 내용 대신 URL을 넘겨서 다시 실행할 때마다 음성을 읽고 인코딩하지 않도록 함
+                    render_audio(message["speech_file"])
             except Exception as e:
                 st.error(f"음성 재생 중 오류가 발생했습니다: {str(e)}")
 
@@ -294,64 +445,114 @@ if prompt := st.chat_input("메시지를 입력하세요..."):
     with st.chat_message("user"):
         st.write(prompt)
 
-    # AI 응답 생성
+    # AI 응답 생성 (채팅 API 서버에 질문을 보내고 SSE 로 받은 토큰을 바로 말풍선에 표시)
     with st.chat_message("assistant"):
+        from chat_client import ChatAPIError, SessionExpired
         try:
-            # PDF RAG를 사용하여 답변 생성
-            rag_response = qa_chain.invoke({"query": prompt})
-            rag_answer = rag_response["result"]
-            
-            # 시스템 메시지에 음성 지시사항 반영
-            system_message = {
-                "role": "system",
-                "content": f"당신은 {st.session_state.voice_instructions}로 대화하는 AI 어시스턴트입니다. 모든 응답은 이 톤과 스타일을 유지해야 합니다."
-            } if st.session_state.voice_instructions else None
-
-            # 메시지 목록 준비
-            messages = [system_message] if system_message else []
-            messages.extend([
-                {"role": m["role"], "content": m["content"]}
-                for m in st.session_state.messages
-            ])
-            
-            # PDF RAG 답변을 컨텍스트로 포함
-            messages.append({
-                "role": "system",
-                "content": f"다음은 PDF 문서에서 찾은 관련 정보입니다: {rag_answer}"
-            })
-
-            # OpenAI API 호출
-            response = client.chat.completions.create(
-                model=st.session_state.model,
-                messages=messages,
-                temperature=st.session_state.temperature,
-            )
-            
-            # AI 응답 표시
-            ai_response = response.choices[0].message.content
-            st.write(ai_response)
-            
-            # 음성 파일 생성 및 저장
+            # 채팅 API 가 아직 시작 중이면 준비될 때까지 기다림 (시작에 실패했으면 그 오류를 표시)
+            if chat_api is None:
+                with st.spinner("채팅 API 를 시작하는 중입니다..."):
+                    chat_service, chat_api = chat_api_task.result()
+            request = {
+                "message": prompt,
+                "model": st.session_state.model,
+                "temperature": st.session_state.temperature,
+                "rag_mode": st.session_state.rag_mode,
+                "person": st.session_state.person_scope,
+                **current_voice_settings()
+            }
+            try:
+                events = chat_api.chat(get_chat_session(), request)
+            except SessionExpired:
+                # 서버가 다시 시작되어 세션이 없어졌으면 새 세션으로 다시 요청
+                del st.session_state.chat_session_id
+                events = chat_api.chat(get_chat_session(), request)
+
+            # 문장 음성은 브라우저에서 재생 (서버가 문장 음성을 합성되는 대로 이어 보내는 스트림을 자동 재생)
+            # 첫 문장이 준비되면 바로 재생이 시작되고, 다음 문장은 같은 플레이어에서 이어서 재생됨
+            audio_slot = st.empty()
+            turn = {}
+
+            def handle(event, data):
+                if event == "start" and data["audio_stream"] is not None:
+                    audio_slot.audio(chat_api.audio_url(data["audio_stream"]), format="audio/mp3", autoplay=True)
+                elif event == "speech_error":
+                    turn["speech_error"] = data["message"]
+                elif event == "error":
+                    raise ChatAPIError(data)
+                elif event != "speech":
+                    # 문장별 음성(speech)은 위의 스트림으로 받으므로 따로 기록하지 않음
+                    turn[event] = data
+
+            # answer 이벤트까지의 토큰을 말풍선에 표시
+            def tokens():
+                for event, data in events:
+                    if event == "token":
+                        yield data["text"]
+                    else:
+                        handle(event, data)
+                        if event == "answer":
+                            return
+
+            st.write_stream(tokens())
+            answer = turn["answer"]
+            if answer["index_version"] is not None:
+                st.caption(f"📚 인덱스 버전 v{answer['index_version']}")
+            else:
+                st.caption("📚 문서 인덱스가 아직 준비되지 않아 문서 검색 없이 답변했습니다")
+            if answer["sources"]:
+                st.caption("📎 출처: " + ", ".join(answer["sources"]))
+            st.caption(describe_metrics(answer["metrics"]))
+
+            # AI 응답을 메시지 히스토리에 추가
+            message = {
+                "role": "assistant",
+                "content": answer["answer"],
+                "sources": answer["sources"],
+                "metrics": answer["metrics"]
+            }
+            if answer["index_version"] is not None:
+                message["index_version"] = answer["index_version"]
+            st.session_state.messages.append(message)
+
+            # 남은 문장 음성과 합쳐진 음성 파일 (다시 듣기용)
             try:
-                speech_file = get_speech_file_path(ai_response)
-                generate_and_save_speech(ai_response, speech_file)
-                st.success(f"음성 파일이 생성되었습니다: {speech_file}")
-                
-                # AI 응답을 메시지 히스토리에 추가
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": ai_response,
-                    "speech_file": speech_file
-                })
-                
-                # 음성 재생
-                with open(speech_file, "rb") as f:
-                    audio_bytes = f.read()
-                st.audio(audio_bytes, format="audio/mp3")
+                for event, data in events:
+                    handle(event, data)
+                done = turn["done"]
+                message["trace"] = done["trace"]
+                st.session_state.memory_info = done["memory"]
+                if done["audio"] is None:
+                    raise Exception(turn.get("speech_error", "음성 파일이 생성되지 않았습니다."))
+                message["speech_url"] = chat_api.audio_url(done["audio"])
+                message["speech_status"] = READY
+                # 다시 듣기는 위의 플레이어로 (끝난 턴의 스트림은 합쳐진 음성 파일로 넘겨줌)
+                st.success(f"음성 파일이 생성되었습니다: {message['speech_url']}")
             except Exception as e:
                 st.error(f"음성 생성/재생 중 오류가 발생했습니다: {str(e)}")
-            
-        except BadRequestError as e:
-            st.error(f"API 호출 중 오류가 발생했습니다: {str(e)}")
+
+        except ChatAPIError as e:
+            if e.type == "BadRequestError":
+                st.error(f"API 호출 중 오류가 발생했습니다: {str(e)}")
+            else:
+                st.error(f"예기치 않은 오류가 발생했습니다: {str(e)}")
         except Exception as e:
             st.error(f"예기치 않은 오류가 발생했습니다: {str(e)}")
+
+startup_profile.mark("첫 화면 표시")
+
+# 생성 중인 음성이 있으면 잠시 기다렸다가 다시 그려서 준비된 플레이어를 표시
+if pending_speech_jobs:
+    speech_jobs.wait(pending_speech_jobs, timeout=1.0)
+    st.rerun()
+
+# 채팅 API 를 시작하는 중이면 잠시 기다렸다가 다시 그려서 서버 상태를 갱신
+if chat_api_task.status != FAILED and not chat_api_task.ready:
+    chat_api_task.wait(1.0)
+    st.rerun()
+# 문서 인덱스를 준비하는 중이면 잠시 기다렸다가 다시 그려서 색인 상태를 갱신
+elif rag_task is not None and rag_task.status != FAILED and not rag_task.ready:
+    rag_task.wait(2.0)
+    st.rerun()
+elif (rag_task is None or rag_task.ready) and openai_task.elapsed is not None:
+    startup_profile.log_once()
@@ -0,0 +1,122 @@
+import io
+import os
+import queue
+import threading
+from functools import partial
+
+
+# 소리를 내지 않는 출력 장치 (사운드 장치가 없는 서버용)
+class NullAudioSink:
+    name = "null"
+
+    def play(self, source, stop_event):
+        pass
+
+
+# pygame 으로 음성을 재생하는 출력 장치
+class PygameAudioSink:
+    name = "pygame"
+
+    def __init__(self):
+        import pygame
+        self.pygame = pygame
+        pygame.mixer.init()
+
+    # 음성 하나를 끝까지 재생 (stop_event 가 설정되면 바로 중단)
+    def play(self, source, stop_event):
+        music = self.pygame.mixer.music
+        if isinstance(source, (bytes, bytearray)):
+            music.load(io.BytesIO(source), "mp3")
+        else:
+            music.load(str(source))
+        music.play()
+        while music.get_busy() and not stop_event.wait(0.05):
+            pass
+        music.stop()
+        music.unload()
+
+
+# 출력 장치 선택 (AUDIO_SINK=null 이거나 사운드 장치를 열 수 없으면 소리 없이 동작)
+def create_audio_sink(headless=None):
+    if headless is None:
+        headless = os.getenv("AUDIO_SINK", "").lower() in ("null", "none", "headless")
+    if headless:
+        return NullAudioSink()
+    try:
+        return PygameAudioSink()
+    except Exception:
+        return NullAudioSink()
+
+
+# 전용 재생 스레드와 대기열로 음성을 차례대로 재생하는 플레이어 (스크립트 스레드는 기다리지 않음)
+class AudioPlayer:
+    def __init__(self, sink=None):
+        self.sink = sink or create_audio_sink()
+        self.stats = {"played": 0, "skipped": 0, "dropped": 0, "errors": 0}
+        self.last_error = None
+        self._queue = queue.Queue()
+        self._stop_current = threading.Event()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._playing = False
+        self._thread = threading.Thread(target=self._run, name="audio-player", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            generation, source = self._queue.get()
+            with self._lock:
+                if generation != self._generation:
+                    self.stats["dropped"] += 1
+                    continue
+                self._stop_current.clear()
+                self._playing = True
+            try:
+                self.sink.play(source, self._stop_current)
+                self.stats["played"] += 1
+            except Exception as e:
+                self.last_error = e
+                self.stats["errors"] += 1
+            finally:
+                with self._lock:
+                    self._playing = False
+
+    def _enqueue(self, generation, source):
+        with self._lock:
+            if generation != self._generation:
+                self.stats["dropped"] += 1
+                return
+        self._queue.put((generation, source))
+
+    # 음성(mp3 바이트 또는 파일 경로)을 대기열 끝에 추가
+    def enqueue(self, source):
+        with self._lock:
+            generation = self._generation
+        self._enqueue(generation, source)
+
+    # 재생 중인 음성과 대기열을 모두 멈추고, 새 음성을 넣을 함수 반환
+    # (이전 응답의 파이프라인이 늦게 넣는 음성 조각은 버려짐)
+    def interrupt(self):
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._stop_current.set()
+        return partial(self._enqueue, generation)
+
+    # 지금 재생 중인 음성만 건너뛰고 다음 음성 재생
+    def skip(self):
+        with self._lock:
+            if self._playing:
+                self.stats["skipped"] += 1
+                self._stop_current.set()
+
+    # 재생 중인 음성과 대기열 모두 정지
+    def stop(self):
+        self.interrupt()
+
+    def is_playing(self):
+        with self._lock:
+            return self._playing
+
+    def pending(self):
+        return self._queue.qsize()
@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from langchain_community.callbacks import get_openai_callback
+from chat_pipeline import cite_sources
+
+
+# 질문 목록 읽기 (path 가 "-" 이면 표준 입력)
+# 한 줄에 질문 하나: JSON 이면 {"id": ..., "question": ...}, 아니면 줄 전체가 질문 (id 는 줄 번호)
+def read_questions(path):
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        items = []
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                items.append({"id": str(record.get("id", number)), "question": record["question"]})
+            else:
+                items.append({"id": str(number), "question": line})
+        return items
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+# 결과 파일에 이미 답이 있는 질문 ID (오류로 끝난 질문과 중단되면서 잘린 마지막 줄은 다시 실행)
+def completed_ids(path):
+    done = set()
+    if path is None or not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record:
+                done.add(str(record["id"]))
+    return done
+
+
+# 초당 시작할 수 있는 요청 수 제한 (rate 가 없으면 제한 없음)
+class RateLimiter:
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# 질문 하나를 비동기 체인으로 실행하고 결과 레코드 만들기 (실패하면 error 를 담아서 반환)
+async def answer_question(qa_chain, item, semaphore, limiter):
+    async with semaphore:
+        await limiter.wait()
+        started = time.perf_counter()
+        record = {"id": item["id"], "question": item["question"]}
+        try:
+            with get_openai_callback() as cb:
+                result = await qa_chain.ainvoke({"query": item["question"]})
+            record.update({
+                "answer": result["result"],
+                "sources": cite_sources(result.get("source_documents", [])),
+                "prompt_tokens": cb.prompt_tokens,
+                "completion_tokens": cb.completion_tokens,
+                "total_tokens": cb.total_tokens,
+            })
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["latency"] = round(time.perf_counter() - started, 3)
+        return record
+
+
+# 질문들을 동시에 최대 concurrency 개씩 실행하면서 끝나는 순서대로 결과를 JSONL 로 기록
+# output 이 있으면 이어서 쓰고, 이미 답이 있는 질문은 건너뜀 (중단 후 같은 명령으로 다시 실행하면 이어서 진행)
+async def run_batch(qa_chain, items, output=None, concurrency=4, rate=None):
+    done = completed_ids(output)
+    pending = [item for item in items if item["id"] not in done]
+    if done:
+        print(f"이미 답한 질문 {len(items) - len(pending)}개 건너뜀", file=sys.stderr)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+    if output is None:
+        f = sys.stdout
+    else:
+        # 중단되면서 마지막 줄이 잘렸으면 새 줄부터 이어서 씀
+        if os.path.exists(output) and os.path.getsize(output):
+            with open(output, "rb") as existing:
+                existing.seek(-1, os.SEEK_END)
+                needs_newline = existing.read(1) != b"\n"
+        else:
+            needs_newline = False
+        f = open(output, "a", encoding="utf-8")
+        if needs_newline:
+            f.write("\n")
+
+    started = time.perf_counter()
+    failed = 0
+    try:
+        tasks = [asyncio.ensure_future(answer_question(qa_chain, item, semaphore, limiter)) for item in pending]
+        for count, task in enumerate(asyncio.as_completed(tasks), start=1):
+            record = await task
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            failed += "error" in record
+            status = "실패" if "error" in record else f"{record['latency']:.2f}초"
+            print(f"[{count}/{len(pending)}] {record['id']} {status}", file=sys.stderr)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    print(f"완료: {len(pending) - failed}개 성공, {failed}개 실패, {time.perf_counter() - started:.1f}초", file=sys.stderr)
+    return failed
@@ -0,0 +1,466 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import urllib.request
+import numpy as np
+
+# 로컬 가짜 OpenAI 서버(fake_openai.py)를 띄워서 수집 / 검색 / 채팅 턴(TTS 포함) 전체를 측정하는 벤치마크
+# 시나리오마다 새 프로세스에서 실행해서 메모리 최고치(VmHWM)가 다른 시나리오와 섞이지 않도록 함
+# 예: python benchmark_e2e.py --json results.json
+#     python benchmark_e2e.py --json new.json --baseline results.json   (느려졌으면 종료 코드 1)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_PDF_DIR = os.path.join(HERE, "pdfs")
+
+# 앱(app.py)과 PDFRag.py 의 청크 설정
+PROFILES = {
+    "app": {"chunk_size": 500, "chunk_overlap": 200},
+    "cli": {"chunk_size": 2000, "chunk_overlap": 100, "combine_pages": True},
+}
+
+# 번들 PDF 용 질문 ({person} 은 파일 이름에서 뽑은 사람 이름)
+BUNDLED_QUESTIONS = [
+    "{person}의 취미는 뭐야?",
+    "{person}은 어떤 사람이야?",
+    "{person}의 장래희망은?",
+    "가장 기억에 남는 경험이 뭐야?",
+    "좋아하는 음식이 뭐야?",
+    "MBTI 가 뭐야?",
+]
+
+# 합성 PDF 에 쓸 단어 (기본 글꼴로 쓸 수 있도록 영문)
+SYNTHETIC_WORDS = (
+    "alpha bravo charlie delta echo foxtrot project schedule travel music hobby future dream school "
+    "friend family weekend science robot garden piano soccer camera river mountain ocean library "
+    "kitchen recipe coffee market history planet energy network design history memory journey"
+).split()
+FAMILY_NAMES = "김이박최정강조윤장임한오서신권황안송류홍"
+GIVEN_SYLLABLES = "민서지현우준하윤도연수아예은성진태영"
+
+# 기준 결과 대비 이 비율 이상, 그리고 단위별 최소 차이 이상 커지면 회귀로 판단
+REGRESSION_RATIO = 0.2
+REGRESSION_FLOORS = {"_ms": 5.0, "_seconds": 0.05, "_bytes": 8 * 1024 * 1024}
+
+
+# 이 프로세스의 메모리 최고치 (리눅스는 VmHWM, 그 밖에는 ru_maxrss)
+def peak_memory():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# 자식 프로세스(PDF 파싱 워커 등) 중 메모리 최고치
+def children_peak_memory():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# 밀리초 단위 지연 시간 요약
+def latency_summary(prefix, seconds):
+    values = np.asarray(seconds) * 1000
+    return {
+        f"{prefix}_p50_ms": float(np.percentile(values, 50)),
+        f"{prefix}_p95_ms": float(np.percentile(values, 95)),
+        f"{prefix}_max_ms": float(values.max()),
+    }
+
+
+# 가짜 서버의 호출 횟수
+def server_calls():
+    with urllib.request.urlopen(os.environ["OPENAI_BASE_URL"].rstrip("/") + "/stats") as response:
+        return json.load(response)
+
+
+def calls_since(before):
+    return {key: value - before.get(key, 0) for key, value in server_calls().items()}
+
+
+# 영문 텍스트만 담은 최소한의 PDF 파일 쓰기 (페이지마다 줄 목록)
+def write_text_pdf(path, pages):
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        text = "".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T*\n" for line in lines
+        )
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td\n{text}ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % i for i in page_ids), len(page_ids)
+    )
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+# 합성 설문지 PDF 만들기 (파일 이름에 사람 이름이 들어가서 사람별 분할도 함께 측정)
+def synthetic_corpus(directory, documents, pages=4, chars_per_page=1800, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    names = set()
+    while len(names) < documents:
+        names.add(rng.choice(FAMILY_NAMES) + rng.choice(GIVEN_SYLLABLES) + rng.choice(GIVEN_SYLLABLES))
+    for name in sorted(names):
+        page_lines = []
+        for _ in range(pages):
+            lines, length = [], 0
+            while length < chars_per_page:
+                line = " ".join(rng.choice(SYNTHETIC_WORDS) for _ in range(12)) + "."
+                lines.append(line)
+                length += len(line)
+            page_lines.append(lines)
+        write_text_pdf(os.path.join(directory, f"DNA_탐험_설문지_{name}.pdf"), page_lines)
+    return sorted(names)
+
+
+# 코퍼스에 맞는 질문 목록
+def corpus_questions(persons, synthetic, count=12, seed=0):
+    rng = random.Random(seed)
+    questions = []
+    for i in range(count):
+        person = persons[i % len(persons)] if persons else ""
+        if synthetic:
+            words = " ".join(rng.choice(SYNTHETIC_WORDS) for _ in range(3))
+            questions.append(f"{person} {words}?" if i % 2 == 0 else f"{words} 에 대해 알려줘")
+        else:
+            questions.append(BUNDLED_QUESTIONS[i % len(BUNDLED_QUESTIONS)].format(person=person))
+    return questions
+
+
+# 앱/PDFRag.py 와 같은 설정의 인덱스 저장소 (저장 위치와 임베딩 캐시만 벤치마크 작업 디렉토리로)
+def open_store(pdf_dir, store_root, profile):
+    from langchain_openai import OpenAIEmbeddings
+    from index_store import PDFIndexStore
+    from vector_index import IndexSpec, embedding_options
+    from embedding_cache import CachedEmbeddings
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(**embedding_options()),
+        cache_path=os.path.join(store_root, "embedding_cache.sqlite3")
+    )
+    return PDFIndexStore(pdf_dir, embeddings, store_root=store_root, index_spec=IndexSpec.from_env(), **PROFILES[profile])
+
+
+# PDF 를 처음 색인할 때와 변경 없이 다시 불러올 때의 시간
+def bench_ingest(job):
+    before = server_calls()
+    started = time.perf_counter()
+    store = open_store(job["pdf_dir"], job["store_root"], job["profile"])
+    vectorstore = store.sync()
+    cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    open_store(job["pdf_dir"], job["store_root"], job["profile"]).sync()
+    warm = time.perf_counter() - started
+    return [{
+        "files": len(store.load_manifest()["files"]),
+        "chunks": len(vectorstore.index_to_docstore_id) if vectorstore is not None else 0,
+        "cold_seconds": cold,
+        "warm_seconds": warm,
+        "api_calls": calls_since(before),
+    }]
+
+
+# k 별 검색 지연 시간 (질문 임베딩은 미리 캐시해 두고 검색 자체만 측정, 조각 선택 단계 유무 비교)
+def bench_retrieval(job):
+    from keyword_index import HybridRetriever
+    from partitions import PersonPartitions
+    from context_packing import ContextPacker
+    from conversation_memory import count_tokens
+    store = open_store(job["pdf_dir"], job["store_root"], job["profile"])
+    vectorstore = store.sync()
+    partitions = PersonPartitions(vectorstore)
+    questions = corpus_questions(partitions.persons, job["synthetic"], job["questions"])
+    vectorstore.embeddings.embed_documents(questions)
+
+    rows = []
+    for k in job["ks"]:
+        for packed in (False, True):
+            retriever = HybridRetriever(
+                vectorstore=vectorstore, keyword_index=store.keyword_index, partitions=partitions,
+                k=k, fetch_k=max(20, k), packer=ContextPacker(k=k) if packed else None
+            )
+            timings, tokens = [], []
+            for _ in range(job["repeat"]):
+                for question in questions:
+                    started = time.perf_counter()
+                    docs = retriever.invoke(question)
+                    timings.append(time.perf_counter() - started)
+                    tokens.append(sum(count_tokens(doc.page_content, "gpt-4.1-nano") for doc in docs))
+            rows.append(dict(
+                {"name": f"k={k}" + (" packed" if packed else ""), "k": k, "packed": packed,
+                 "context_tokens_mean": float(np.mean(tokens))},
+                **latency_summary("search", timings)
+            ))
+    return rows
+
+
+# 앱과 같은 경로로 한 턴씩 실행 (채팅 API 서버를 띄우고 ChatAPIClient 로 SSE 를 받으면서,
+# 브라우저의 플레이어처럼 start 이벤트의 음성 스트림을 바로 열어서 끝까지 받음)
+# 첫 토큰, 첫 음성(스트림의 첫 바이트), 답변, 턴 전체 시간은 클라이언트에서 잰 시간이고 검색 시간은 서버 트레이스의 검색 단계 끝 시각
+def bench_chat(job):
+    from concurrent.futures import ThreadPoolExecutor
+    from warmup import BackgroundTask
+    from live_index import LiveIndex
+    from context_packing import ContextPacker
+    from speech_cache import SpeechCache
+    from turn_tracing import Tracer
+    from chat_service import ChatService, build_qa_chain
+    from chat_server import ChatServerThread, create_app
+    from chat_client import ChatAPIClient, ChatAPIError
+
+    store = open_store(job["pdf_dir"], job["store_root"], job["profile"])
+    index_task = BackgroundTask(LiveIndex, store, build_qa_chain, mapped=True, packer=ContextPacker.from_env(), name="pdf-index")
+    snapshot = index_task.result().current()
+    service = ChatService.from_env(index_task, SpeechCache(os.path.join(job["store_root"], "speech")), Tracer(log_target="off"))
+    server = ChatServerThread(create_app(service), port=0).start()
+    client = ChatAPIClient(server.base_url)
+    listener = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speech-stream")
+    questions = corpus_questions(snapshot.partitions.persons, job["synthetic"], job["turns"])
+    request = {"model": "gpt-4.1-nano", "temperature": 0.7, "rag_mode": job["mode"],
+               "voice_model": "tts-1", "voice_type": "alloy", "voice_instructions": ""}
+
+    before = server_calls()
+    stages = {"retrieval": [], "ttft": [], "answer": [], "first_audio": [], "turn": []}
+    prompt_tokens = []
+    try:
+        session_id = client.create_session()
+        for question in questions:
+            started = time.perf_counter()
+            turn, heard, listening = {}, [], None
+
+            def listen(path):
+                for chunk in client.stream_audio(path):
+                    if chunk and not heard:
+                        heard.append(time.perf_counter() - started)
+
+            for event, data in client.chat(session_id, dict(request, message=question)):
+                if event == "token":
+                    turn.setdefault("ttft", time.perf_counter() - started)
+                elif event == "start" and data["audio_stream"] is not None:
+                    listening = listener.submit(listen, data["audio_stream"])
+                elif event == "error":
+                    raise ChatAPIError(data)
+                elif event in ("answer", "done"):
+                    turn[event] = data
+                    turn[f"{event}_seconds"] = time.perf_counter() - started
+            # 남은 음성을 다 받을 때까지 기다림
+            if listening is not None:
+                listening.result()
+
+            spans = [span for span in turn["done"]["trace"]["spans"] if span["name"] in ("retrieval", "retrieval_qa")]
+            stages["retrieval"].append(spans[0]["start"] + spans[0]["duration"] if spans else 0.0)
+            stages["ttft"].append(turn["ttft"])
+            stages["answer"].append(turn["answer_seconds"])
+            stages["first_audio"].append(heard[0] if heard else turn["done_seconds"])
+            stages["turn"].append(turn["done_seconds"])
+            prompt_tokens.append(turn["answer"]["metrics"]["prompt_tokens"])
+    finally:
+        listener.shutdown()
+        client.close()
+        server.stop()
+
+    row = {"turns": len(questions), "prompt_tokens_mean": float(np.mean(prompt_tokens)), "api_calls": calls_since(before)}
+    for stage, seconds in stages.items():
+        row.update(latency_summary(stage, seconds))
+    return [row]
+
+
+SCENARIOS = {"ingest": bench_ingest, "retrieval": bench_retrieval, "chat": bench_chat}
+
+
+# 자식 프로세스에서 시나리오 하나 실행 (결과를 마지막 줄에 JSON 으로 출력)
+def run_child(job):
+    sys.path.insert(0, HERE)
+    baseline = peak_memory()
+    rows = SCENARIOS[job["scenario"]](job)
+    for row in rows:
+        row["name"] = f"{job['name']} {row['name']}" if "name" in row else job["name"]
+        row["scenario"] = job["scenario"]
+        row["peak_rss_bytes"] = peak_memory()
+        row["startup_rss_bytes"] = baseline
+        row["workers_peak_rss_bytes"] = children_peak_memory()
+    print(json.dumps(rows, ensure_ascii=False))
+
+
+# 가짜 OpenAI 서버를 별도 프로세스로 시작하고 주소 반환
+def start_fake_server(args):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "fake_openai.py"), "--port", "0",
+         "--embedding-latency", str(args.embedding_latency), "--chat-latency", str(args.chat_latency),
+         "--token-latency", str(args.token_latency), "--speech-latency", str(args.speech_latency)],
+        stdout=subprocess.PIPE, text=True
+    )
+    base_url = process.stdout.readline().strip()
+    if not base_url:
+        raise RuntimeError("가짜 OpenAI 서버를 시작하지 못했습니다")
+    return process, base_url
+
+
+def run_job(job, env):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", json.dumps(job, ensure_ascii=False)],
+        cwd=HERE, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{job['name']} 실패:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# 실행할 시나리오 목록 (번들 PDF 와 합성 코퍼스, 앱/CLI 청크 설정)
+def plan_jobs(args, workdir):
+    corpora = [("bundled", BUNDLED_PDF_DIR, False)]
+    for documents in args.synthetic:
+        directory = os.path.join(workdir, f"synthetic_{documents}")
+        synthetic_corpus(directory, documents, pages=args.pages, seed=args.seed)
+        corpora.append((f"synthetic_{documents}", directory, True))
+
+    jobs = []
+    for corpus, pdf_dir, synthetic in corpora:
+        for profile in args.profiles:
+            common = {"pdf_dir": pdf_dir, "profile": profile, "synthetic": synthetic,
+                      "store_root": os.path.join(workdir, f"store_{corpus}_{profile}")}
+            label = f"{corpus}/{profile}"
+            if "ingest" in args.scenarios:
+                jobs.append(dict(common, scenario="ingest", name=label))
+            if "retrieval" in args.scenarios:
+                jobs.append(dict(common, scenario="retrieval", name=label, ks=args.k,
+                                 questions=args.questions, repeat=args.repeat))
+            if "chat" in args.scenarios and corpus == "bundled" and profile == "app":
+                for mode in ("single", "two_stage"):
+                    jobs.append(dict(common, scenario="chat", name=f"{label}/{mode}", mode=mode, turns=args.turns))
+    return jobs
+
+
+# 결과 한 줄 요약
+def describe(row):
+    parts = [f"{row['scenario']:<9} {row['name']:<32}"]
+    for key, value in row.items():
+        if key.endswith("_seconds"):
+            parts.append(f"{key[:-8]} {value:.2f}s")
+        elif key.endswith("_p50_ms"):
+            parts.append(f"{key[:-7]} p50 {value:.1f}ms")
+        elif key in ("chunks", "context_tokens_mean", "prompt_tokens_mean"):
+            parts.append(f"{key} {value:.0f}")
+    parts.append(f"peak {row['peak_rss_bytes'] / 1024 / 1024:.0f}MB")
+    return "  ".join(parts)
+
+
+# 기준 결과보다 나빠진 지표 목록 (시간과 메모리는 클수록 나쁨)
+def find_regressions(results, baseline):
+    previous = {(row["scenario"], row["name"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        old = previous.get((row["scenario"], row["name"]))
+        if old is None:
+            continue
+        for key, value in row.items():
+            floor = next((floor for suffix, floor in REGRESSION_FLOORS.items() if key.endswith(suffix)), None)
+            if floor is None or not isinstance(old.get(key), (int, float)):
+                continue
+            if value - old[key] > floor and value > old[key] * (1 + REGRESSION_RATIO):
+                regressions.append(f"{row['scenario']} {row['name']} {key}: {old[key]:.4g} → {value:.4g}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="가짜 OpenAI 서버로 수집/검색/채팅 턴 전체 벤치마크")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--synthetic", type=int, nargs="*", default=[20, 100], help="합성 코퍼스의 PDF 수")
+    parser.add_argument("--pages", type=int, default=4, help="합성 PDF 한 개의 페이지 수")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 4, 8, 16], help="검색 결과 수")
+    parser.add_argument("--questions", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=3, help="검색 측정 반복 횟수")
+    parser.add_argument("--turns", type=int, default=5, help="채팅 턴 수")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--speech-latency", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="결과를 저장할 JSON 파일 경로")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON (느려졌으면 종료 코드 1)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    server, base_url = start_fake_server(args)
+    workdir = tempfile.mkdtemp(prefix="benchmark_e2e_")
+    env = dict(os.environ, OPENAI_BASE_URL=base_url, OPENAI_API_KEY="fake", AUDIO_SINK="null")
+    results = []
+    try:
+        for job in plan_jobs(args, workdir):
+            for row in run_job(job, env):
+                results.append(row)
+                print(describe(row), flush=True)
+    finally:
+        server.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": {key: value for key, value in vars(args).items() if key not in ("json", "baseline", "child")},
+            "env": {key: os.environ[key] for key in ("FAISS_INDEX_TYPE", "EMBEDDING_DIMENSIONS", "CONTEXT_MAX_TOKENS")
+                    if key in os.environ},
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(results, json.load(f))
+        if regressions:
+            print("\n⚠️ 회귀:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n기준 대비 회귀 없음")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import faiss
+from vector_index import IndexSpec, INDEX_TYPES, build_index, recall_at_k
+
+# FAISS 인덱스 종류와 임베딩 차원별 recall@k, 검색 지연 시간, 메모리 비교
+# 예: python benchmark_index.py --n 20000 --dims 1536 512 256 --types flat ivf hnsw ivf_pq sq
+
+
+# 현재 프로세스의 상주 메모리 (리눅스가 아니면 0)
+def resident_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * 4096
+    except OSError:
+        return 0
+
+
+# text-embedding-3 처럼 앞쪽 차원에 정보가 몰린 합성 임베딩 (주제 클러스터 + 잡음, 길이 1)
+def synthetic_corpus(n, queries, dims=1536, topics=1000, noise=1.0, seed=0):
+    rng = np.random.default_rng(seed)
+    scale = 1 / np.sqrt(1 + np.arange(dims) / 64)
+    centers = rng.standard_normal((topics, dims)).astype(np.float32) * scale
+    total = n + queries
+    vectors = centers[rng.integers(topics, size=total)]
+    vectors += noise * rng.standard_normal((total, dims)).astype(np.float32) * scale
+    return vectors[:n], vectors[n:]
+
+
+# 앞쪽 차원만 남기고 다시 길이 1로 정규화 (dimensions 파라미터로 줄인 임베딩과 같은 방식)
+def shorten(vectors, dims):
+    vectors = np.ascontiguousarray(vectors[:, :dims])
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+# 질문 하나씩 검색했을 때의 지연 시간 백분위 (밀리초)
+def latency_percentiles(index, queries, k):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query[None, :], k)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+# 자식 프로세스가 fork 로 물려받는 벤치마크 데이터 (차원 -> (문서 벡터, 질문 벡터), 정답 이웃)
+_corpora = {}
+_truth = None
+
+
+# 인덱스 하나를 만들고 측정 (새 프로세스에서 실행해서 다른 설정의 메모리가 섞이지 않도록 함)
+def measure(dims, kind, k, recall_target):
+    vectors, query_vectors = _corpora[dims]
+    before = resident_bytes()
+    index, info = build_index(vectors, IndexSpec(kind=kind, recall_target=recall_target, tune_k=k))
+    # 학습 중 쓰고 반납하지 않은 메모리도 포함되므로 인덱스 자체 크기는 index_bytes 참고
+    resident = resident_bytes() - before
+    _, found = index.search(query_vectors, k)
+    p50, p99 = latency_percentiles(index, query_vectors, k)
+    return {
+        "dims": dims,
+        "kind": kind,
+        "factory": info.factory,
+        "param": info.param,
+        "value": info.value,
+        "recall": recall_at_k(found, _truth),
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "index_bytes": info.bytes,
+        "rss_growth_bytes": resident,
+        "build_seconds": info.build_seconds,
+    }
+
+
+def run(args):
+    global _truth
+    corpus, queries = synthetic_corpus(args.n, args.queries, max(args.dims), seed=args.seed)
+    # 정답은 가장 큰 차원의 정확한 이웃 (차원을 줄여서 잃는 재현율도 함께 측정)
+    exact = faiss.IndexFlatL2(max(args.dims))
+    exact.add(shorten(corpus, max(args.dims)))
+    _, _truth = exact.search(shorten(queries, max(args.dims)), args.k)
+    del exact
+    for dims in args.dims:
+        _corpora[dims] = (shorten(corpus, dims), shorten(queries, dims))
+
+    start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    results = []
+    for dims in args.dims:
+        for kind in args.types:
+            if start_method == "fork":
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as pool:
+                    result = pool.submit(measure, dims, kind, args.k, args.recall_target).result()
+            else:
+                # fork 를 지원하지 않으면 같은 프로세스에서 측정 (상주 메모리는 참고용)
+                result = measure(dims, kind, args.k, args.recall_target)
+            results.append(result)
+            print(f"{dims:>5} {result['factory']:<20} {str(result['param'] or '-'):>8}={str(result['value'] or '-'):<5} "
+                  f"recall@{args.k} {result['recall']:.3f}  p50 {result['p50_ms']:7.3f}ms  p99 {result['p99_ms']:7.3f}ms  "
+                  f"인덱스 {result['index_bytes'] / 1024 / 1024:7.1f}MB  상주 증가 {result['rss_growth_bytes'] / 1024 / 1024:7.1f}MB  "
+                  f"빌드 {result['build_seconds']:6.1f}s", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS 인덱스 종류별 recall@k / 지연 시간 / 메모리 벤치마크")
+    parser.add_argument("--n", type=int, default=20000, help="합성 문서 벡터 수")
+    parser.add_argument("--queries", type=int, default=200, help="검색 질문 수 (문서와 겹치지 않음)")
+    parser.add_argument("--dims", type=int, nargs="+", default=[1536, 512, 256], help="비교할 임베딩 차원")
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--recall-target", type=float, default=0.95, help="nprobe/efSearch 튜닝 목표")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="결과를 저장할 JSON 파일 경로")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
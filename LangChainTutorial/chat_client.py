@@ -0,0 +1,74 @@
+import json
+import httpx
+
+
+# 서버에 세션이 없음 (서버가 다시 시작됐거나 오래 사용하지 않아 정리된 경우)
+class SessionExpired(Exception):
+    pass
+
+
+# 서버가 error 이벤트로 알려 준 턴 처리 오류
+class ChatAPIError(Exception):
+    def __init__(self, data):
+        super().__init__(data.get("message", ""))
+        self.type = data.get("type")
+
+
+# 채팅 API 서버 클라이언트 (chat_server.py, 동기 방식이라 Streamlit 스크립트에서 바로 사용)
+# public_url 은 브라우저가 음성 파일을 받을 주소 (서버 주소와 다를 때만 지정)
+class ChatAPIClient:
+    def __init__(self, base_url, public_url=None, timeout=120.0):
+        self.base_url = base_url.rstrip("/")
+        self.public_url = (public_url or base_url).rstrip("/")
+        self.http = httpx.Client(base_url=self.base_url, timeout=timeout)
+
+    def health(self):
+        response = self.http.get("/health")
+        response.raise_for_status()
+        return response.json()
+
+    def create_session(self):
+        response = self.http.post("/sessions")
+        response.raise_for_status()
+        return response.json()["session_id"]
+
+    # 질문 하나를 보내고 (이벤트 이름, 데이터) 를 차례로 돌려주는 이터레이터 반환
+    # 세션이 없으면 SessionExpired (응답을 기다리기 전에 바로 발생)
+    def chat(self, session_id, request):
+        response = self.http.send(self.http.build_request("POST", f"/sessions/{session_id}/chat", json=request), stream=True)
+        if response.status_code == 404:
+            response.close()
+            raise SessionExpired(session_id)
+        if response.status_code >= 400:
+            response.read()
+            response.close()
+            response.raise_for_status()
+        return self._events(response)
+
+    # SSE 스트림을 이벤트 단위로 나누기
+    def _events(self, response):
+        try:
+            event, data = "message", []
+            for line in response.iter_lines():
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data.append(line[len("data:"):].strip())
+                elif not line and data:
+                    yield event, json.loads("\n".join(data))
+                    event, data = "message", []
+        finally:
+            response.close()
+
+    # 서버가 준 음성 경로를 브라우저에서 열 수 있는 URL 로 변환
+    def audio_url(self, path):
+        return self.public_url + path
+
+    # 턴의 음성 스트림을 조각이 도착하는 대로 돌려주는 이터레이터 (턴이 끝나면 끝남)
+    def stream_audio(self, path):
+        with self.http.stream("GET", path) as response:
+            response.raise_for_status()
+            yield from response.iter_bytes()
+
+    def close(self):
+        self.http.close()
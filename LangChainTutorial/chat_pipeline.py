@@ -0,0 +1,176 @@
+import os
+import time
+
+# RAG 답변 방식
+RAG_MODE_SINGLE = "single"        # 검색된 청크를 그대로 채팅 모델에 전달 (LLM 호출 1회)
+RAG_MODE_TWO_STAGE = "two_stage"  # RetrievalQA 답변을 다시 채팅 모델에 전달 (LLM 호출 2회)
+
+
+# 청크의 출처 표시 (파일 이름과 쪽 번호)
+def source_label(doc):
+    return metadata_label(doc.metadata)
+
+
+def metadata_label(metadata):
+    source = os.path.basename(metadata.get("source", "알 수 없음"))
+    page = metadata.get("page")
+    return f"{source} {page + 1}쪽" if isinstance(page, int) else source
+
+
+# 검색된 청크를 출처 정보와 함께 프롬프트용 텍스트로 변환
+def format_context(docs):
+    blocks = []
+    for i, doc in enumerate(docs, start=1):
+        blocks.append(f"[{i}] 출처: {', '.join(cite_sources([doc]))}\n{doc.page_content}")
+    return "\n\n".join(blocks)
+
+
+# 답변과 함께 보여 줄 출처 목록 (중복 제거, 검색 순서 유지)
+# 중복 제거로 합쳐진 청크는 같은 내용이 있던 다른 파일도 출처로 표시
+def cite_sources(docs):
+    labels = []
+    for doc in docs:
+        labels.append(source_label(doc))
+        labels.extend(metadata_label(source) for source in doc.metadata.get("duplicate_sources", []))
+    return list(dict.fromkeys(labels))
+
+
+# 음성 지시사항을 반영한 시스템 메시지
+def persona_message(voice_instructions):
+    if not voice_instructions:
+        return None
+    return {
+        "role": "system",
+        "content": f"당신은 {voice_instructions}로 대화하는 AI 어시스턴트입니다. 모든 응답은 이 톤과 스타일을 유지해야 합니다."
+    }
+
+
+# 채팅 모델에 보낼 메시지 목록 구성
+def build_messages(history, voice_instructions, context=None, rag_answer=None, summary=None):
+    system_message = persona_message(voice_instructions)
+    messages = [system_message] if system_message else []
+    if summary:
+        # 최근 대화보다 오래된 대화의 요약
+        messages.append({
+            "role": "system",
+            "content": f"다음은 지금까지 나눈 대화의 요약입니다: {summary}"
+        })
+    messages.extend([
+        {"role": m["role"], "content": m["content"]}
+        for m in history
+    ])
+
+    if context is not None:
+        # 검색된 청크 자체를 컨텍스트로 포함
+        messages.append({
+            "role": "system",
+            "content": "다음은 PDF 문서에서 찾은 관련 내용입니다. 이 내용을 근거로 답하고, "
+                       "문서에 없는 내용은 모른다고 답하세요.\n\n" + context
+        })
+    elif rag_answer is not None:
+        # PDF RAG 답변을 컨텍스트로 포함
+        messages.append({
+            "role": "system",
+            "content": f"다음은 PDF 문서에서 찾은 관련 정보입니다: {rag_answer}"
+        })
+    return messages
+
+
+# 한 턴의 지연 시간과 토큰 사용량 기록
+class TurnMetrics:
+    def __init__(self, mode=None):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.ttft = None             # 턴 시작부터 첫 토큰이 나올 때까지 걸린 시간
+        self.generation_time = None  # 최종 답변 생성 요청부터 마지막 토큰까지 걸린 시간
+        self.cache_hit = None        # 답변 캐시 적중 종류 (exact / semantic)
+        self.context_tokens = None   # 프롬프트에 넣은 문서 조각의 토큰 수
+
+    # LLM 호출 한 번의 토큰 수 더하기
+    def add_tokens(self, prompt_tokens, completion_tokens, llm_calls=1):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.llm_calls += llm_calls
+
+    # OpenAI usage 객체의 토큰 수 더하기
+    def add_usage(self, usage):
+        if usage is None:
+            self.add_tokens(0, 0)
+        else:
+            self.add_tokens(usage.prompt_tokens, usage.completion_tokens)
+
+    def to_dict(self):
+        return {
+            "mode": self.mode,
+            "latency": time.perf_counter() - self.started,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "llm_calls": self.llm_calls,
+            "ttft": self.ttft,
+            "generation_time": self.generation_time,
+            "cache_hit": self.cache_hit,
+            "context_tokens": self.context_tokens,
+        }
+
+
+# 턴 지표를 한 줄로 표시
+def describe_metrics(metrics):
+    parts = []
+    if metrics.get("mode"):
+        parts.append("단일 호출" if metrics["mode"] == RAG_MODE_SINGLE else "2단계")
+    if metrics.get("cache_hit"):
+        parts.append("캐시 적중 (" + ("같은 질문" if metrics["cache_hit"] == "exact" else "유사한 질문") + ")")
+    if metrics.get("ttft") is not None:
+        parts.append(f"첫 토큰 {metrics['ttft']:.2f}초")
+    if metrics.get("generation_time") is not None:
+        parts.append(f"생성 {metrics['generation_time']:.2f}초")
+    parts.append(f"전체 {metrics['latency']:.2f}초")
+    parts.append(f"LLM 호출 {metrics['llm_calls']}회")
+    parts.append(f"토큰 {metrics['prompt_tokens']} + {metrics['completion_tokens']}")
+    if metrics.get("context_tokens") is not None:
+        parts.append(f"문서 {metrics['context_tokens']}토큰")
+    return "⏱️ " + " · ".join(parts)
+
+
+# 채팅 응답을 스트리밍으로 받아 텍스트 조각을 하나씩 돌려주는 제너레이터 (st.write_stream 에 전달)
+def stream_completion(client, metrics, **kwargs):
+    request_started = time.perf_counter()
+    stream = client.chat.completions.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs
+    )
+    usage = None
+    for chunk in stream:
+        # 사용량은 마지막 청크(choices 가 비어 있음)에 담겨 옴
+        if chunk.usage is not None:
+            usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            if metrics.ttft is None:
+                metrics.ttft = time.perf_counter() - metrics.started
+            yield chunk.choices[0].delta.content
+    metrics.generation_time = time.perf_counter() - request_started
+    metrics.add_usage(usage)
+
+
+# stream_completion 의 비동기 버전 (AsyncOpenAI 클라이언트로 텍스트 조각을 하나씩 돌려주는 비동기 제너레이터)
+async def astream_completion(client, metrics, **kwargs):
+    request_started = time.perf_counter()
+    stream = await client.chat.completions.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs
+    )
+    usage = None
+    async for chunk in stream:
+        if chunk.usage is not None:
+            usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            if metrics.ttft is None:
+                metrics.ttft = time.perf_counter() - metrics.started
+            yield chunk.choices[0].delta.content
+    metrics.generation_time = time.perf_counter() - request_started
+    metrics.add_usage(usage)
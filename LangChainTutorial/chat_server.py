@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+from pathlib import Path
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from starlette.routing import Route
+from chat_service import ChatRequest, ChatService, create_live_index
+
+# 채팅 파이프라인을 HTTP 로 제공하는 ASGI 서버 (Streamlit 화면이나 다른 프론트엔드가 클라이언트)
+#   POST   /sessions                 새 대화 세션 → {"session_id": ...}
+#   GET    /sessions/{id}            대화 기록
+#   DELETE /sessions/{id}            세션 삭제
+#   POST   /sessions/{id}/chat       질문 하나 (ChatRequest JSON) → Server-Sent Events 로 토큰/음성/결과 전송
+#   GET    /turns/{id}/audio         턴의 문장 음성을 합성되는 대로 이어 보내는 mp3 스트림 (끝난 턴은 /audio/{key} 로 넘겨줌)
+#   GET    /audio/{key}              음성 파일 (mp3, Range 요청 지원)
+#   GET    /health, /metrics         상태, Prometheus 형식 지표
+# 예: python chat_server.py --port 8503
+#     curl -N -X POST localhost:8503/sessions/<id>/chat -d '{"message": "차수민의 취미는?"}'
+
+
+# SSE 이벤트 하나 (data 는 한 줄짜리 JSON)
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def create_app(service):
+    async def health(request):
+        return JSONResponse(service.health())
+
+    async def metrics(request):
+        return PlainTextResponse(service.tracer.metrics.render(), media_type="text/plain; version=0.0.4")
+
+    async def create_session(request):
+        session = service.sessions.create()
+        return JSONResponse({"session_id": session.id}, status_code=201)
+
+    async def get_session(request):
+        session = service.sessions.get(request.path_params["session_id"])
+        if session is None:
+            return JSONResponse({"error": "세션이 없습니다"}, status_code=404)
+        return JSONResponse({"session_id": session.id, "messages": session.messages})
+
+    async def delete_session(request):
+        if not service.sessions.delete(request.path_params["session_id"]):
+            return JSONResponse({"error": "세션이 없습니다"}, status_code=404)
+        return JSONResponse({"deleted": True})
+
+    async def chat(request):
+        session = service.sessions.get(request.path_params["session_id"])
+        if session is None:
+            return JSONResponse({"error": "세션이 없습니다"}, status_code=404)
+        try:
+            chat_request = ChatRequest.from_dict(await request.json())
+        except (ValueError, TypeError) as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+        async def events():
+            async for event, data in service.run_turn(session, chat_request):
+                yield sse_event(event, data)
+
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    async def turn_audio(request):
+        stream = service.turn_audio(request.path_params["turn_id"])
+        if stream is None:
+            return JSONResponse({"error": "음성 스트림이 없습니다"}, status_code=404)
+        # 이미 끝난 턴을 다시 재생하면 합쳐진 음성 파일로 넘겨서 Range 요청과 캐시를 사용
+        if stream.done and stream.key is not None and service.audio_path(stream.key) is not None:
+            return RedirectResponse(service.audio_url(stream.key))
+        return StreamingResponse(
+            stream.stream(),
+            media_type="audio/mpeg",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    async def audio(request):
+        path = service.audio_path(request.path_params["key"])
+        if path is None:
+            return JSONResponse({"error": "음성 파일이 없습니다"}, status_code=404)
+        # 파일 이름이 내용의 해시이므로 같은 URL 의 내용은 바뀌지 않음
+        return FileResponse(path, media_type="audio/mpeg", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await service.aclose()
+
+    return Starlette(
+        routes=[
+            Route("/health", health),
+            Route("/metrics", metrics),
+            Route("/sessions", create_session, methods=["POST"]),
+            Route("/sessions/{session_id}", get_session, methods=["GET"]),
+            Route("/sessions/{session_id}", delete_session, methods=["DELETE"]),
+            Route("/sessions/{session_id}/chat", chat, methods=["POST"]),
+            Route("/turns/{turn_id}/audio", turn_audio, methods=["GET"]),
+            Route("/audio/{key}", audio, methods=["GET", "HEAD"]),
+        ],
+        lifespan=lifespan
+    )
+
+
+# 포트를 열 수 없으면 빈 포트 사용 (같은 서버의 여러 Streamlit 프로세스가 각자 서버를 띄우는 경우)
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind((host, port))
+    except OSError:
+        sock.bind((host, 0))
+    return sock
+
+
+# 백그라운드 스레드에서 도는 서버 (Streamlit 프로세스 안에서 사용)
+class ChatServerThread:
+    def __init__(self, app, host="127.0.0.1", port=8503):
+        import uvicorn
+        self.sock = bind_socket(host, port)
+        self.host, self.port = self.sock.getsockname()[:2]
+        self.server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="on"))
+        self.thread = threading.Thread(target=self.server.run, kwargs={"sockets": [self.sock]}, name="chat-api", daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    # 서버를 시작하고 요청을 받을 수 있을 때까지 기다림
+    def start(self, timeout=10.0):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("채팅 API 서버를 시작하지 못했습니다")
+            time.sleep(0.02)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(5.0)
+
+
+def main():
+    from dotenv import load_dotenv
+    from warmup import BackgroundTask
+    from speech_cache import SpeechCache
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="채팅 API 서버 (SSE 스트리밍)")
+    parser.add_argument("--host", default=os.getenv("CHAT_API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("CHAT_API_PORT", "8503")))
+    parser.add_argument("--pdf-dir", default="pdfs")
+    parser.add_argument("--no-rag", action="store_true", help="문서 검색 없이 대화만")
+    args = parser.parse_args()
+
+    load_dotenv()
+    speech_dir = Path(__file__).parent.absolute() / "speech_files"
+    os.makedirs(speech_dir, exist_ok=True)
+    # 인덱스는 백그라운드에서 준비하고 그동안은 문서 검색 없이 답변
+    index_task = None if args.no_rag else BackgroundTask(create_live_index, args.pdf_dir, name="pdf-index")
+    service = ChatService.from_env(index_task, SpeechCache(speech_dir))
+    uvicorn.run(create_app(service), host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+import os
+import re
+import time
+import uuid
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, fields
+from speech_pipeline import SentenceSplitter
+from conversation_memory import ConversationMemory, count_tokens
+from chat_pipeline import RAG_MODE_SINGLE, RAG_MODE_TWO_STAGE, TurnMetrics, astream_completion, build_messages, cite_sources, format_context
+from turn_tracing import Tracer
+
+# Streamlit 화면과 채팅 API 서버가 함께 쓰는 채팅 파이프라인 (검색 → 답변 스트리밍 → 문장별 음성 합성)
+# 한 프로세스에서 여러 세션의 턴을 이벤트 루프 하나로 동시에 처리하고,
+# FAISS 검색이나 파일 쓰기처럼 블로킹되는 작업은 스레드로 넘김
+
+# 음성 캐시 키 형식 (sha256 16진수)
+SPEECH_KEY = re.compile(r"^[0-9a-f]{64}$")
+
+# 음성 스트림을 보관할 최근 턴 수 (끝난 턴의 스트림은 합쳐진 음성 파일로 넘겨줌)
+MAX_TURN_AUDIO = 32
+
+
+# 검색기로 QA 체인 생성 (벡터 검색 + BM25 하이브리드 검색기)
+def build_qa_chain(retriever):
+    from langchain.chains import RetrievalQA
+    from langchain_openai import ChatOpenAI
+    return RetrievalQA.from_chain_type(
+        llm=ChatOpenAI(temperature=0),
+        chain_type="stuff",
+        retriever=retriever,
+        return_source_documents=True
+    )
+
+
+# PDF 문서 로드 및 벡터 저장소 초기화
+def create_live_index(pdf_dir="pdfs"):
+    from langchain_openai import OpenAIEmbeddings
+    from index_store import PDFIndexStore
+    from vector_index import IndexSpec, embedding_options
+    from embedding_cache import CachedEmbeddings
+    from live_index import LiveIndex
+    from context_packing import ContextPacker
+
+    # 디스크에 저장된 인덱스를 불러오고 추가/변경된 PDF만 임베딩
+    store = PDFIndexStore(
+        pdf_dir=pdf_dir,
+        embeddings=CachedEmbeddings(OpenAIEmbeddings(**embedding_options())),
+        chunk_size=500,
+        chunk_overlap=200,
+        index_spec=IndexSpec.from_env()
+    )
+
+    # pdfs 폴더를 감시하면서 새 인덱스 버전을 백그라운드에서 교체
+    # 게시된 인덱스는 mmap 으로 열어서 여러 프로세스가 같은 메모리 페이지를 사용
+    # 검색된 조각은 MMR 로 겹치는 내용을 줄이고 이어지는 청크를 합쳐서 토큰 예산 안에서 전달
+    return LiveIndex(store, build_qa_chain, mapped=True, packer=ContextPacker.from_env()).start_watching()
+
+
+# 파일 내용 읽기 (그 사이 캐시에서 지워졌으면 None)
+def read_bytes(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+# 한 턴의 문장 음성을 합성이 끝나는 순서대로 이어 붙여 보내는 스트림
+# 브라우저의 <audio> 가 이 스트림을 열어 두면 첫 문장이 준비되는 대로 재생하고 다음 문장은 이어서 재생함
+# (mp3 조각은 그대로 이어 붙여도 하나의 mp3 로 재생됨)
+class TurnAudio:
+    def __init__(self):
+        self.segments = []
+        self.done = False
+        self.key = None  # 합쳐진 음성 파일의 캐시 키 (턴이 끝나고 파일이 저장됐을 때만)
+        self._changed = asyncio.Event()
+
+    def append(self, data):
+        self.segments.append(data)
+        self._changed.set()
+
+    def finish(self, key=None):
+        self.key = key
+        self.done = True
+        self._changed.set()
+
+    # 지금까지의 조각을 보내고, 턴이 끝날 때까지 새 조각을 기다렸다가 이어서 보냄
+    async def stream(self):
+        sent = 0
+        while True:
+            while sent < len(self.segments):
+                yield self.segments[sent]
+                sent += 1
+            if self.done:
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+
+# 한 턴의 요청 (질문과 답변 설정, 음성 설정)
+@dataclass
+class ChatRequest:
+    message: str
+    model: str = "gpt-4.1-nano"
+    temperature: float = 0.7
+    rag_mode: str = RAG_MODE_SINGLE
+    person: str = None
+    voice_model: str = "tts-1"
+    voice_type: str = "alloy"
+    voice_instructions: str = ""
+    speech: bool = True
+
+    # JSON 요청 본문에서 만들기 (모르는 항목은 무시, 질문이 없거나 값이 잘못되면 ValueError)
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict) or not str(data.get("message") or "").strip():
+            raise ValueError("message 가 필요합니다")
+        names = {f.name for f in fields(cls)}
+        request = cls(**{k: v for k, v in data.items() if k in names})
+        if request.rag_mode not in (RAG_MODE_SINGLE, RAG_MODE_TWO_STAGE):
+            raise ValueError(f"알 수 없는 rag_mode: {request.rag_mode}")
+        request.temperature = float(request.temperature)
+        return request
+
+    def voice(self):
+        return {
+            "voice_model": self.voice_model,
+            "voice_type": self.voice_type,
+            "voice_instructions": self.voice_instructions,
+        }
+
+
+# 대화 세션 하나 (대화 기록과 요약 메모리, 같은 세션의 턴은 한 번에 하나씩 처리)
+class ChatSession:
+    def __init__(self, session_id, memory):
+        self.id = session_id
+        self.memory = memory
+        self.messages = []
+        self.lock = asyncio.Lock()
+        self.created = time.time()
+        self.last_used = self.created
+
+    def touch(self):
+        self.last_used = time.time()
+
+    @property
+    def busy(self):
+        return self.lock.locked()
+
+
+# 세션 저장소 (최대 개수를 넘거나 오래 쓰지 않은 세션부터 정리, 처리 중인 세션은 남겨 둠)
+class SessionStore:
+    def __init__(self, create_memory, max_sessions=1000, idle_timeout=60 * 60):
+        self.create_memory = create_memory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()  # 세션 ID -> 세션 (오래 사용하지 않은 순서)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self):
+        now = time.time()
+        for session_id, session in list(self._sessions.items()):
+            over = len(self._sessions) >= self.max_sessions
+            idle = now - session.last_used > self.idle_timeout
+            if not (over or idle):
+                break
+            if not session.busy:
+                del self._sessions[session_id]
+
+    def create(self):
+        self._evict()
+        session = ChatSession(uuid.uuid4().hex, self.create_memory())
+        self._sessions[session.id] = session
+        return session
+
+    # 세션 찾기 (없거나 만료됐으면 None)
+    def get(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session.last_used > self.idle_timeout and not session.busy:
+            del self._sessions[session_id]
+            return None
+        session.touch()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id):
+        return self._sessions.pop(session_id, None) is not None
+
+
+# 채팅 파이프라인 (여러 세션이 함께 사용하는 OpenAI 클라이언트, 인덱스, 캐시)
+# index_task 는 LiveIndex 를 준비하는 BackgroundTask (준비되기 전이나 None 이면 문서 검색 없이 답변)
+# audio_url(key) 는 음성 캐시 키로 음성을 받을 수 있는 URL 을 만드는 함수
+class ChatService:
+    def __init__(self, index_task=None, speech_cache=None, tracer=None, answer_cache_threshold=0.92,
+                 max_connections=100, max_speech_requests=8, max_sessions=1000, audio_url=None):
+        self.index_task = index_task
+        self.speech_cache = speech_cache
+        self.tracer = tracer or Tracer()
+        self.answer_cache_threshold = answer_cache_threshold
+        self.max_connections = max_connections
+        self.max_speech_requests = max_speech_requests
+        self.audio_url = audio_url or (lambda key: f"/audio/{key}")
+        self.sessions = SessionStore(lambda: ConversationMemory(self.sync_client), max_sessions)
+        self._client = None
+        self._sync_client = None
+        self._answer_cache = None
+        self._speech_slots = None
+        self._turn_audio = OrderedDict()  # 턴 ID -> 음성 스트림 (최근 턴만)
+
+    # 환경 변수로 설정 (ANSWER_CACHE_THRESHOLD, OPENAI_MAX_CONNECTIONS, TTS_CONCURRENCY, CHAT_MAX_SESSIONS)
+    @classmethod
+    def from_env(cls, index_task=None, speech_cache=None, tracer=None, **kwargs):
+        return cls(
+            index_task,
+            speech_cache,
+            tracer,
+            answer_cache_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            max_speech_requests=int(os.getenv("TTS_CONCURRENCY", "8")),
+            max_sessions=int(os.getenv("CHAT_MAX_SESSIONS", "1000")),
+            **kwargs
+        )
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    # 비동기 OpenAI 클라이언트 (연결 풀을 모든 세션이 함께 사용, 처음 쓸 때 생성)
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            self._client = AsyncOpenAI(http_client=DefaultAsyncHttpxClient(limits=self._limits()))
+        return self._client
+
+    # 대화 요약처럼 스레드에서 실행하는 작업용 동기 클라이언트
+    @property
+    def sync_client(self):
+        if self._sync_client is None:
+            from openai import OpenAI, DefaultHttpxClient
+            self._sync_client = OpenAI(http_client=DefaultHttpxClient(limits=self._limits()))
+        return self._sync_client
+
+    @property
+    def live_index(self):
+        return self.index_task.get() if self.index_task is not None else None
+
+    # 현재 인덱스 스냅샷 (아직 색인 중이면 None)
+    def snapshot(self):
+        live_index = self.live_index
+        return live_index.current() if live_index is not None else None
+
+    # 답변 캐시 (질문 임베딩은 인덱스와 같은 임베딩 캐시를 사용, 인덱스가 준비되기 전에는 None)
+    @property
+    def answer_cache(self):
+        if self._answer_cache is None and self.live_index is not None:
+            from answer_cache import AnswerCache
+            self._answer_cache = AnswerCache(
+                self.live_index.store.embeddings,
+                similarity_threshold=self.answer_cache_threshold
+            )
+        return self._answer_cache
+
+    # 음성 캐시 키의 파일 경로 (잘못된 키이거나 캐시에 없으면 None)
+    def audio_path(self, key):
+        if self.speech_cache is None or not SPEECH_KEY.match(key):
+            return None
+        return self.speech_cache.peek(key)
+
+    # 서버 상태 (인덱스 준비 상태와 버전, 세션 수, 사람별 검색 대상)
+    def health(self):
+        snapshot = self.snapshot()
+        partitions = snapshot.partitions if snapshot is not None else None
+        return {
+            "index": self.index_task.status if self.index_task is not None else "disabled",
+            "index_version": snapshot.version if snapshot is not None else None,
+            "sessions": len(self.sessions),
+            "persons": partitions.persons if partitions is not None else [],
+        }
+
+    # 턴의 음성 스트림 (없거나 오래된 턴이면 None)
+    def turn_audio(self, turn_id):
+        return self._turn_audio.get(turn_id)
+
+    # 새 턴의 음성 스트림 등록 (최근 MAX_TURN_AUDIO 개 턴만 보관)
+    def _open_turn_audio(self, turn_id):
+        audio = self._turn_audio[turn_id] = TurnAudio()
+        while len(self._turn_audio) > MAX_TURN_AUDIO:
+            self._turn_audio.popitem(last=False)
+        return audio
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+        if self._sync_client is not None:
+            self._sync_client.close()
+
+    # 음성 합성 (동시에 보내는 TTS 요청 수를 제한)
+    async def synthesize(self, text, voice_model, voice_type, voice_instructions):
+        if self._speech_slots is None:
+            self._speech_slots = asyncio.Semaphore(self.max_speech_requests)
+        async with self._speech_slots:
+            async with self.client.audio.speech.with_streaming_response.create(
+                model=voice_model,
+                voice=voice_type,
+                input=text,
+                instructions=voice_instructions if voice_instructions else None,
+                response_format="mp3"
+            ) as response:
+                return await response.read()
+
+    # 문장 하나의 음성 (캐시에 있으면 재사용하고, 없으면 합성해서 캐시에 저장) -> (캐시 키, mp3 바이트)
+    async def speak(self, sentence, voice, trace):
+        key = self.speech_cache.key(sentence, **voice)
+        with trace.span("tts_sentence", chars=len(sentence)) as span:
+            path = self.speech_cache.get(key)
+            data = await asyncio.to_thread(read_bytes, path) if path is not None else None
+            span.set(cache="miss" if data is None else "hit")
+            if data is None:
+                with trace.span("tts_synthesize", chars=len(sentence)) as synth:
+                    data = await self.synthesize(sentence, **voice)
+                    synth.set(bytes=len(data))
+                await asyncio.to_thread(self.speech_cache.put, key, data)
+        self.tracer.cache_result("speech", span.attrs["cache"] == "hit")
+        return key, data
+
+    # 검색 결과로 이번 턴의 메시지 목록 만들기 -> (출처 목록, 메시지 목록)
+    async def prepare_messages(self, snapshot, request, history, memory, metrics, trace):
+        if snapshot is None or snapshot.vectorstore is None:
+            # 문서 인덱스가 준비되기 전이나 색인된 PDF 가 없으면 검색 없이 대화만으로 답변
+            return [], build_messages(history, request.voice_instructions, summary=memory.summary)
+
+        if request.rag_mode == RAG_MODE_SINGLE:
+            # 검색된 청크를 출처와 함께 채팅 모델에 바로 전달 (LLM 호출 1회)
+            with trace.span("retrieval") as span:
+                retriever = snapshot.retriever(person=request.person)
+                docs = await asyncio.to_thread(retriever.invoke, request.message)
+                context = format_context(docs)
+                metrics.context_tokens = count_tokens(context, request.model)
+                span.set(docs=len(docs), context_tokens=metrics.context_tokens, bytes=len(context.encode("utf-8")))
+            messages = build_messages(history, request.voice_instructions, context=context, summary=memory.summary)
+            return cite_sources(docs), messages
+
+        # PDF RAG를 사용하여 답변 생성한 뒤 채팅 모델에 다시 전달 (LLM 호출 2회)
+        from langchain_community.callbacks import get_openai_callback
+        qa_chain = snapshot.qa_chain if request.person is None else build_qa_chain(snapshot.retriever(person=request.person))
+        with trace.span("retrieval_qa") as span, get_openai_callback() as cb:
+            rag_response = await qa_chain.ainvoke({"query": request.message})
+            source_documents = rag_response["source_documents"]
+            metrics.context_tokens = sum(count_tokens(doc.page_content, request.model) for doc in source_documents)
+            metrics.add_tokens(cb.prompt_tokens, cb.completion_tokens, cb.successful_requests)
+            span.set(
+                docs=len(source_documents),
+                context_tokens=metrics.context_tokens,
+                prompt_tokens=cb.prompt_tokens,
+                completion_tokens=cb.completion_tokens,
+                bytes=sum(len(doc.page_content.encode("utf-8")) for doc in source_documents)
+            )
+        messages = build_messages(history, request.voice_instructions, rag_answer=rag_response["result"], summary=memory.summary)
+        return cite_sources(source_documents), messages
+
+    # 앞 문장부터 순서대로 합성이 끝난 음성 조각의 이벤트 (앞 문장이 아직이면 뒤 문장은 기다림)
+    def _finished_speech(self, pending, segments, errors, stream):
+        events = []
+        while pending and pending[0].done():
+            task = pending.popleft()
+            try:
+                key, data = task.result()
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                events.append(("speech_error", {"message": errors[-1]}))
+                continue
+            segments.append(data)
+            stream.append(data)
+            events.append(("speech", {"index": len(segments) - 1, "url": self.audio_url(key)}))
+        return events
+
+    # 한 턴 처리 (이벤트 이름과 JSON 으로 보낼 데이터를 차례로 돌려주는 비동기 제너레이터)
+    # start → token … (speech …) → answer → speech … → done, 실패하면 error
+    async def run_turn(self, session, request):
+        trace = self.tracer.start_turn(request.rag_mode, model=request.model, person=request.person)
+        pending = deque()  # 합성 중인 문장 음성 (문장 순서)
+        stream, audio_key = None, None
+        try:
+            async with session.lock:
+                # 질문은 답변이 끝난 뒤에 대화 기록에 넣음 (실패한 턴이 기록에 남지 않도록)
+                question = {"role": "user", "content": request.message}
+                # 질문을 처리하는 동안에는 시작 시점의 인덱스 버전을 계속 사용 (아직 색인 중이면 None)
+                snapshot = self.snapshot()
+                index_version = snapshot.version if snapshot is not None else None
+                trace.attrs["index_version"] = index_version
+                metrics = TurnMetrics(request.rag_mode)
+                # 음성을 만들면 문장 음성을 이어 보내는 스트림 주소도 함께 알려 줌 (클라이언트가 바로 열어 두고 재생)
+                speak = request.speech and self.speech_cache is not None
+                if speak:
+                    stream = self._open_turn_audio(trace.turn_id)
+                yield "start", {
+                    "turn_id": trace.turn_id,
+                    "index_version": index_version,
+                    "audio_stream": f"/turns/{trace.turn_id}/audio" if speak else None,
+                }
+
+                # 같은 (또는 의미가 거의 같은) 질문에 대한 답변이 캐시에 있으면 검색과 LLM 호출을 생략
+                cached, answer_cache = None, self.answer_cache
+                if snapshot is not None and answer_cache is not None:
+                    from answer_cache import answer_namespace, conversation_digest, question_person
+                    persons = snapshot.partitions.persons if snapshot.partitions is not None else []
+                    # 캐시는 모든 세션이 함께 쓰므로 이 세션의 앞선 대화도 구역에 넣음 (첫 질문끼리만 세션 사이에 공유)
+                    namespace = answer_namespace(
+                        request.model, request.temperature, snapshot.version, request.rag_mode,
+                        question_person(request.message, request.person, persons), request.voice_instructions,
+                        conversation_digest(session.messages)
+                    )
+                    with trace.span("answer_cache") as span:
+                        cached = await asyncio.to_thread(answer_cache.get, request.message, namespace)
+                        span.set(result=cached.kind if cached is not None else "miss")
+                    self.tracer.cache_result("answer", cached.kind if cached is not None else False)
+
+                if cached is not None:
+                    metrics.cache_hit = cached.kind
+                    metrics.ttft = time.perf_counter() - metrics.started
+                    sources = cached.sources or []
+                    chunks = None
+                else:
+                    # 최근 대화만 그대로 보내고 그 이전 대화는 요약으로 전달
+                    with trace.span("memory") as span:
+                        history = await asyncio.to_thread(session.memory.window, session.messages + [question], request.model, metrics)
+                        span.set(messages=len(history), prompt_tokens=metrics.prompt_tokens, completion_tokens=metrics.completion_tokens)
+                    sources, messages = await self.prepare_messages(snapshot, request, history, session.memory, metrics, trace)
+                    tokens_before = (metrics.prompt_tokens, metrics.completion_tokens)
+                    chunks = astream_completion(
+                        self.client, metrics,
+                        model=request.model, messages=messages, temperature=request.temperature
+                    )
+
+                # 토큰이 도착하는 대로 보내면서 문장이 완성되면 음성 합성을 시작
+                voice = request.voice()
+                splitter = SentenceSplitter()
+                segments, speech_errors, answer = [], [], []
+                if chunks is None:
+                    answer.append(cached.answer)
+                    yield "token", {"text": cached.answer}
+                    if speak:
+                        pending.extend(asyncio.create_task(self.speak(s, voice, trace)) for s in splitter.feed(cached.answer))
+                else:
+                    async for text in chunks:
+                        answer.append(text)
+                        yield "token", {"text": text}
+                        if speak:
+                            pending.extend(asyncio.create_task(self.speak(s, voice, trace)) for s in splitter.feed(text))
+                            for event in self._finished_speech(pending, segments, speech_errors, stream):
+                                yield event
+                    trace.add(
+                        "completion",
+                        metrics.generation_time,
+                        ttft=round(metrics.ttft, 4) if metrics.ttft is not None else None,
+                        prompt_tokens=metrics.prompt_tokens - tokens_before[0],
+                        completion_tokens=metrics.completion_tokens - tokens_before[1],
+                        bytes=len("".join(answer).encode("utf-8"))
+                    )
+                ai_response = "".join(answer)
+                if speak:
+                    pending.extend(asyncio.create_task(self.speak(s, voice, trace)) for s in splitter.flush())
+
+                if cached is None and snapshot is not None and answer_cache is not None:
+                    await asyncio.to_thread(answer_cache.put, request.message, ai_response, namespace, sources)
+                session.messages.extend([question, {"role": "assistant", "content": ai_response}])
+                yield "answer", {
+                    "answer": ai_response,
+                    "sources": sources,
+                    "metrics": metrics.to_dict(),
+                    "index_version": index_version,
+                }
+
+                # 남은 문장의 음성을 순서대로 보내고, 모든 조각을 하나의 파일로 합쳐 저장 (다시 듣기용)
+                audio_url = None
+                while pending:
+                    await asyncio.wait({pending[0]})
+                    for event in self._finished_speech(pending, segments, speech_errors, stream):
+                        yield event
+                if speak and segments and not speech_errors:
+                    key = audio_key = self.speech_cache.key(ai_response, **voice)
+                    found = self.speech_cache.peek(key) is not None
+                    self.tracer.cache_result("speech_file", found)
+                    if not found:
+                        with trace.span("speech_join") as span:
+                            audio = b"".join(segments)
+                            span.set(bytes=len(audio))
+                        with trace.span("speech_file_write", bytes=len(audio)):
+                            await asyncio.to_thread(self.speech_cache.put, key, audio)
+                    audio_url = self.audio_url(key)
+                if speech_errors:
+                    trace.attrs["speech_error"] = speech_errors[0]
+
+                record = trace.finish()
+                yield "done", {
+                    "audio": audio_url,
+                    "trace": record,
+                    "memory": {
+                        "summarized_count": session.memory.summarized_count,
+                        "last_window": session.memory.last_window,
+                    },
+                }
+        except Exception as e:
+            trace.finish(error=f"{type(e).__name__}: {e}")
+            yield "error", {"type": type(e).__name__, "message": str(e)}
+        finally:
+            # 클라이언트가 연결을 끊으면 남은 음성 합성을 취소
+            for task in pending:
+                task.cancel()
+            # 음성 스트림을 듣고 있는 클라이언트에게 턴이 끝났음을 알림 (다시 열면 합쳐진 음성 파일로 넘겨줌)
+            if stream is not None:
+                stream.finish(audio_key)
+            if trace.duration is None:
+                trace.finish(error="cancelled")
@@ -0,0 +1,141 @@
+import os
+from dataclasses import dataclass
+import numpy as np
+from langchain_core.documents import Document
+from conversation_memory import count_tokens, get_encoding
+
+# 프롬프트에 문서 조각 하나를 넣을 때 번호와 출처 표시로 추가되는 토큰 수
+CHUNK_OVERHEAD_TOKENS = 12
+
+
+# 청크 ID ("파일키-순번") 에서 (파일키, 순번) 추출 (형식이 다르면 None)
+def chunk_position(doc_id):
+    prefix, _, number = (doc_id or "").rpartition("-")
+    return (prefix, int(number)) if prefix and number.isdigit() else None
+
+
+# 행마다 길이 1로 정규화 (길이 0 인 행은 그대로)
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+# MMR: 질문과의 관련도와 이미 고른 조각과의 최대 유사도를 함께 보고 k 개 선택
+# 후보끼리의 유사도 행렬을 한 번만 계산하고, 고를 때마다 최대 유사도 벡터만 갱신
+# first 가 있으면 그 후보를 가장 먼저 고름 (검색 순위 1위 유지)
+def mmr_select(relevance, vectors, k, lambda_mult=0.5, first=None):
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    similarity = vectors @ vectors.T
+    selected = [int(np.argmax(relevance)) if first is None else first]
+    chosen = np.zeros(n, dtype=bool)
+    chosen[selected[0]] = True
+    max_similarity = similarity[selected[0]].copy()
+    while len(selected) < min(k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[chosen] = -np.inf
+        i = int(np.argmax(scores))
+        selected.append(i)
+        chosen[i] = True
+        np.maximum(max_similarity, similarity[i], out=max_similarity)
+    return selected
+
+
+# 앞 조각의 끝과 뒤 조각의 시작이 겹치는 길이 (chunk_overlap 으로 두 청크에 함께 들어간 텍스트)
+def overlap_length(left, right):
+    for size in range(min(len(left), len(right)), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+# 연속된 청크를 하나의 문서로 합치기 (겹치는 텍스트는 한 번만 넣음)
+def merge_run(run):
+    first = run[0]
+    text = first.page_content
+    duplicate_sources = list(first.metadata.get("duplicate_sources", []))
+    for doc in run[1:]:
+        overlap = overlap_length(text, doc.page_content)
+        text += doc.page_content[overlap:] if overlap else "\n" + doc.page_content
+        duplicate_sources.extend(s for s in doc.metadata.get("duplicate_sources", []) if s not in duplicate_sources)
+    metadata = dict(first.metadata, merged_ids=[doc.id for doc in run])
+    if duplicate_sources:
+        metadata["duplicate_sources"] = duplicate_sources
+    return Document(id=first.id, page_content=text, metadata=metadata)
+
+
+# 같은 파일에서 바로 이어지는 청크끼리 합치기 (합친 조각은 그중 가장 먼저 뽑힌 조각의 자리에 둠)
+def merge_adjacent(docs):
+    rank = {id(doc): i for i, doc in enumerate(docs)}
+    runs = []
+    positioned = sorted(
+        (doc for doc in docs if chunk_position(doc.id) is not None), key=lambda doc: chunk_position(doc.id)
+    )
+    for doc in positioned:
+        prefix, number = chunk_position(doc.id)
+        if runs and chunk_position(runs[-1][-1].id) == (prefix, number - 1):
+            runs[-1].append(doc)
+        else:
+            runs.append([doc])
+    runs.extend([doc] for doc in docs if chunk_position(doc.id) is None)
+    runs.sort(key=lambda run: min(rank[id(doc)] for doc in run))
+    return [run[0] if len(run) == 1 else merge_run(run) for run in runs]
+
+
+# 텍스트를 앞에서부터 max_tokens 토큰까지만 남기기
+def truncate_tokens(text, max_tokens, model):
+    encoding = get_encoding(model)
+    return encoding.decode(encoding.encode(text)[:max(max_tokens, 0)])
+
+
+# 토큰 예산 안에 들어가는 조각만 순서대로 담기 (첫 조각이 예산보다 크면 앞부분만 잘라서 사용)
+def pack_to_budget(docs, max_tokens, model):
+    packed, used = [], 0
+    for doc in docs:
+        tokens = count_tokens(doc.page_content, model) + CHUNK_OVERHEAD_TOKENS
+        if used + tokens <= max_tokens:
+            packed.append(doc)
+            used += tokens
+        elif not packed:
+            text = truncate_tokens(doc.page_content, max_tokens - CHUNK_OVERHEAD_TOKENS, model)
+            packed.append(Document(id=doc.id, page_content=text, metadata=doc.metadata))
+            used = max_tokens
+    return packed
+
+
+# 검색 후보에서 프롬프트에 넣을 문서 조각을 고르는 설정
+# (관련도가 낮은 조각 제외 → MMR 로 겹치는 내용 줄이기 → 이어지는 청크 합치기 → 토큰 예산에 맞추기)
+@dataclass(frozen=True)
+class ContextPacker:
+    k: int = 4                   # MMR 로 고를 최대 조각 수 (합치기 전)
+    lambda_mult: float = 0.5     # MMR 에서 관련도의 비중 (1 이면 관련도만, 0 이면 다양성만)
+    min_similarity: float = 0.2  # 질문과의 코사인 유사도가 이보다 낮은 조각은 버림 (검색 순위 1위는 항상 유지)
+    max_tokens: int = 2000       # 프롬프트에 넣을 문서 조각의 토큰 예산
+    merge: bool = True           # 같은 파일의 이어지는 청크 합치기
+    model: str = "gpt-4.1-nano"  # 토큰 수를 셀 때 쓸 토크나이저의 모델
+
+    # 환경 변수 CONTEXT_K, CONTEXT_MMR_LAMBDA, CONTEXT_MIN_SIMILARITY, CONTEXT_MAX_TOKENS 로 설정
+    @classmethod
+    def from_env(cls):
+        return cls(
+            k=int(os.getenv("CONTEXT_K", "4")),
+            lambda_mult=float(os.getenv("CONTEXT_MMR_LAMBDA", "0.5")),
+            min_similarity=float(os.getenv("CONTEXT_MIN_SIMILARITY", "0.2")),
+            max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "2000"))
+        )
+
+    # 검색 순위 순서의 후보 조각과 그 벡터로 프롬프트에 넣을 조각 고르기 (벡터가 없으면 순위대로 k 개)
+    def pack(self, query_vector, docs, vectors=None):
+        if docs and vectors is not None:
+            vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+            query = np.asarray(query_vector, dtype=np.float32)
+            relevance = vectors @ (query / (np.linalg.norm(query) or 1))
+            keep = [0] + [i for i in range(1, len(docs)) if relevance[i] >= self.min_similarity]
+            selected = mmr_select(relevance[keep], vectors[keep], self.k, self.lambda_mult, first=0)
+            docs = [docs[keep[i]] for i in selected]
+        else:
+            docs = docs[:self.k]
+        if self.merge:
+            docs = merge_adjacent(docs)
+        return pack_to_budget(docs, self.max_tokens, self.model)
@@ -0,0 +1,136 @@
+from functools import lru_cache
+import tiktoken
+
+# 모델별로 대화 기록에 쓸 토큰 예산 (요약 + 최근 대화, 시스템 메시지와 검색 문서는 제외)
+HISTORY_TOKEN_BUDGETS = {
+    "gpt-4.1-nano": 4000,
+    "gpt-3.5-turbo": 2000,
+    "gpt-4": 3000,
+    "gpt-4-turbo-preview": 4000,
+}
+DEFAULT_HISTORY_TOKEN_BUDGET = 3000
+
+# 메시지 하나에 역할 표시 등으로 추가되는 토큰 수
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+# 모델에 맞는 토크나이저 (모르는 모델이면 최신 기본 인코딩 사용)
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def token_budget(model):
+    return HISTORY_TOKEN_BUDGETS.get(model, DEFAULT_HISTORY_TOKEN_BUDGET)
+
+
+def count_tokens(text, model):
+    return len(get_encoding(model).encode(text))
+
+
+# 메시지의 토큰 수 (인코딩별로 메시지에 저장해 두고 다시 세지 않음)
+def message_tokens(message, model):
+    encoding = get_encoding(model)
+    counts = message.setdefault("token_counts", {})
+    if encoding.name not in counts:
+        counts[encoding.name] = len(encoding.encode(message["content"])) + MESSAGE_OVERHEAD_TOKENS
+    return counts[encoding.name]
+
+
+# 최근 N턴은 그대로 두고, 그보다 오래된 대화는 요약에 조금씩 합쳐 넣는 토큰 예산 대화 메모리
+class ConversationMemory:
+    def __init__(self, client, summary_model="gpt-4.1-nano", keep_turns=4, summary_max_tokens=400):
+        self.client = client
+        self.summary_model = summary_model
+        self.keep_turns = keep_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.summary = ""
+        self.summary_tokens = 0
+        self.summarized_count = 0  # 요약에 이미 합쳐진 앞쪽 메시지 수
+        self.last_window = 0       # 마지막으로 그대로 보낸 메시지 수
+        self.last_error = None
+
+    # 이번 턴에 그대로 보낼 최근 메시지 목록 (마지막 메시지는 항상 포함)
+    def window(self, messages, model, metrics=None):
+        if self.summarized_count > len(messages):
+            # 대화 기록이 초기화된 경우
+            self.summary, self.summary_tokens, self.summarized_count = "", 0, 0
+
+        budget = token_budget(model)
+        used = self.summary_tokens
+        turns = 0
+        start = len(messages)
+        while start > self.summarized_count:
+            message = messages[start - 1]
+            tokens = message_tokens(message, model)
+            if start < len(messages) and (turns >= self.keep_turns or used + tokens > budget):
+                break
+            used += tokens
+            start -= 1
+            if message["role"] == "user":
+                turns += 1
+
+        # 턴 중간에서 잘리지 않도록 사용자 메시지부터 시작
+        while start < len(messages) - 1 and messages[start]["role"] != "user":
+            start += 1
+
+        if start > self.summarized_count:
+            if self.fold(messages[self.summarized_count:start], metrics):
+                self.summarized_count = start
+            else:
+                # 요약에 실패하면 밀려난 대화를 버리지 않고 예산 안에서 그대로 보내고 다음 턴에 다시 요약
+                start = self.extend_window(messages, start, model)
+        self.last_window = len(messages) - start
+        return messages[start:]
+
+    # 아직 요약되지 않은 앞쪽 메시지 중 예산 안에 들어가는 만큼 창을 넓힘 (턴 단위로, 사용자 메시지부터 시작)
+    def extend_window(self, messages, start, model):
+        budget = token_budget(model)
+        used = self.summary_tokens + sum(message_tokens(message, model) for message in messages[start:])
+        earliest = start
+        while earliest > self.summarized_count:
+            tokens = message_tokens(messages[earliest - 1], model)
+            if used + tokens > budget:
+                break
+            used += tokens
+            earliest -= 1
+            if messages[earliest]["role"] == "user":
+                start = earliest
+        return start
+
+    # 기존 요약에 새로 밀려난 대화만 합쳐서 요약 갱신 (성공하면 True)
+    def fold(self, messages, metrics=None):
+        transcript = "\n".join(
+            f"{'사용자' if m['role'] == 'user' else '어시스턴트'}: {m['content']}"
+            for m in messages
+        )
+        try:
+            response = self.client.chat.completions.create(
+                model=self.summary_model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "당신은 대화 요약기입니다. 기존 요약과 이어지는 대화를 합쳐 하나의 요약으로 갱신하세요. "
+                                   "사용자의 요청, 선호, 중요한 사실과 결론은 빠뜨리지 말고 간결하게 작성하세요."
+                    },
+                    {
+                        "role": "user",
+                        "content": f"기존 요약:\n{self.summary or '(없음)'}\n\n이어지는 대화:\n{transcript}"
+                    }
+                ],
+                temperature=0,
+                max_tokens=self.summary_max_tokens
+            )
+        except Exception as e:
+            # 요약에 실패해도 답변은 계속 (밀려난 대화는 요약하지 않은 채로 남겨 두고 다음 턴에 다시 시도)
+            self.last_error = e
+            return False
+        if metrics is not None:
+            metrics.add_usage(response.usage)
+        self.summary = response.choices[0].message.content or ""
+        self.summary_tokens = count_tokens(self.summary, self.summary_model) + MESSAGE_OVERHEAD_TOKENS
+        self.last_error = None
+        return True
@@ -0,0 +1,110 @@
+import os
+import re
+import json
+import hashlib
+import unicodedata
+from dataclasses import dataclass
+import numpy as np
+import tiktoken
+
+DEDUP_INDEX_FILE = "dedup_index.json"
+SIMHASH_BITS = 64
+BIT_POSITIONS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+
+
+# 중복 제거 결과 요약
+@dataclass
+class DedupReport:
+    chunks: int = 0         # 새로 나눈 청크 수
+    duplicates: int = 0     # 다른 청크와 거의 같아서 임베딩/저장하지 않은 청크 수
+    tokens_saved: int = 0   # 임베딩하지 않은 토큰 수
+    bytes_saved: int = 0    # 저장하지 않은 벡터 크기
+
+    def describe(self):
+        kept = self.chunks - self.duplicates
+        return (f"청크 {self.chunks}개 → {kept}개 (중복 {self.duplicates}개 제거), "
+                f"임베딩 토큰 {self.tokens_saved}개 절약, 벡터 메모리 {self.bytes_saved / 1024:.1f}KB 절약")
+
+
+# 공백/유니코드를 정리한 글자 3-gram 의 SimHash (글자 몇 개만 다른 청크는 비트 몇 개만 다름)
+def simhash(text, n=3):
+    text = re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+    shingles = {text[i:i + n] for i in range(max(1, len(text) - n + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles],
+        dtype=np.uint64
+    )
+    bits = (hashes[:, None] >> BIT_POSITIONS) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+    return int(sum(1 << i for i in np.flatnonzero(votes > 0)))
+
+
+def count_tokens(text):
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+# SimHash 로 거의 같은 청크를 찾는 색인 (해밍 거리 max_distance 이하를 같은 청크로 봄)
+class NearDuplicateIndex:
+    def __init__(self, max_distance=3):
+        self.max_distance = max_distance
+        self.hashes = {}  # 청크 ID -> SimHash
+        # 거리가 d 이하면 d+1 개로 나눈 비트 구간 중 하나는 반드시 같으므로, 구간별로 후보를 찾음
+        widths = [SIMHASH_BITS // (max_distance + 1)] * (max_distance + 1)
+        widths[-1] += SIMHASH_BITS - sum(widths)
+        self.bands = []
+        shift = 0
+        for width in widths:
+            self.bands.append((shift, (1 << width) - 1))
+            shift += width
+        self.buckets = [{} for _ in self.bands]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _band_keys(self, value):
+        return [(value >> shift) & mask for shift, mask in self.bands]
+
+    # 거의 같은 청크의 ID (없으면 None)
+    def find(self, value):
+        for bucket, key in zip(self.buckets, self._band_keys(value)):
+            for chunk_id in bucket.get(key, ()):
+                if bin(self.hashes[chunk_id] ^ value).count("1") <= self.max_distance:
+                    return chunk_id
+        return None
+
+    def add(self, chunk_id, value):
+        self.hashes[chunk_id] = value
+        for bucket, key in zip(self.buckets, self._band_keys(value)):
+            bucket.setdefault(key, set()).add(chunk_id)
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            value = self.hashes.pop(chunk_id, None)
+            if value is None:
+                continue
+            for bucket, key in zip(self.buckets, self._band_keys(value)):
+                bucket[key].discard(chunk_id)
+                if not bucket[key]:
+                    del bucket[key]
+
+    def save(self, directory):
+        with open(os.path.join(directory, DEDUP_INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump({"max_distance": self.max_distance,
+                       "hashes": {chunk_id: format(value, "016x") for chunk_id, value in self.hashes.items()}}, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, DEDUP_INDEX_FILE), encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["max_distance"])
+        for chunk_id, value in data["hashes"].items():
+            index.add(chunk_id, int(value, 16))
+        return index
+
+    # 기존 벡터 저장소의 문서로 색인 만들기 (색인이 없던 이전 버전 인덱스용)
+    @classmethod
+    def from_vectorstore(cls, vectorstore, max_distance=3):
+        index = cls(max_distance)
+        for doc_id in vectorstore.index_to_docstore_id.values():
+            index.add(doc_id, simhash(vectorstore.docstore.search(doc_id).page_content))
+        return index
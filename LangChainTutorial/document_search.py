@@ -0,0 +1,136 @@
+import time
+import threading
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.documents import Document
+from chat_pipeline import cite_sources
+
+# 미리 불러 둔 인덱스로 문서 조각을 검색하는 도구 (MCP 서버 등에서 LLM 없이 검색 결과만 필요할 때)
+
+
+# 검색 결과나 문서 하나를 JSON 으로 돌려줄 dict (score 가 없으면 빼고, text 는 max_chars 까지만)
+def chunk_record(doc_id, doc, score=None, max_chars=None):
+    text = doc.page_content if max_chars is None else doc.page_content[:max_chars]
+    record = {
+        "id": doc_id,
+        "sources": cite_sources([doc]),
+        "person": doc.metadata.get("person"),
+        "page": doc.metadata.get("page"),
+        "text": text,
+    }
+    if score is not None:
+        record["score"] = round(score, 4)
+    if max_chars is not None and len(doc.page_content) > max_chars:
+        record["truncated"] = True
+    return record
+
+
+# FAISS 점수를 코사인 유사도로 변환 (OpenAI 임베딩은 길이 1 이므로 L2 거리 제곱 d 는 2 - 2cos)
+def cosine_score(raw, inner_product):
+    return raw if inner_product else 1.0 - raw / 2.0
+
+
+# LiveIndex 의 현재 버전으로 벡터 검색 (질문 여러 개는 임베딩 요청 1번, FAISS 검색 1번으로 처리)
+class DocumentSearch:
+    def __init__(self, live_index):
+        self.live_index = live_index
+
+    # 현재 인덱스 버전 (아직 게시된 인덱스가 없으면 None)
+    @property
+    def version(self):
+        snapshot = self.live_index.current()
+        return snapshot.version if snapshot is not None else None
+
+    # 질문 목록의 임베딩 (캐시에 없는 질문만 한 번에 요청)
+    def embed(self, queries):
+        return np.asarray(self.live_index.store.embeddings.embed_documents(list(queries)), dtype=np.float32)
+
+    # 질문마다 가까운 k 개 조각 (person 이 있으면 그 사람의 문서에서만 검색)
+    def search_many(self, queries, k=4, person=None, max_chars=None):
+        import faiss
+        snapshot = self.live_index.current()
+        vectorstore = snapshot.vectorstore if snapshot is not None else None
+        if vectorstore is None:
+            # 색인된 PDF 가 없으면 검색 결과도 없음
+            return [{"query": query, "results": []} for query in queries]
+        vectors = self.embed(queries)
+        if vectorstore._normalize_L2:
+            faiss.normalize_L2(vectors)
+        inner_product = vectorstore.index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+        if person is not None:
+            if snapshot.partitions is None or person not in snapshot.partitions:
+                raise ValueError(f"문서가 없는 사람입니다: {person}")
+            hits = snapshot.partitions.search_many_by_vector(person, vectors, k)
+        else:
+            raw, positions = vectorstore.index.search(vectors, k)
+            hits = [
+                [(vectorstore.index_to_docstore_id[int(p)], float(d)) for p, d in zip(row_positions, row_raw) if p >= 0]
+                for row_positions, row_raw in zip(positions, raw)
+            ]
+
+        results = []
+        for query, row in zip(queries, hits):
+            chunks = [
+                chunk_record(doc_id, vectorstore.docstore.search(doc_id), cosine_score(raw, inner_product), max_chars)
+                for doc_id, raw in row
+            ]
+            results.append({"query": query, "results": chunks})
+        return results
+
+    def search(self, query, k=4, person=None, max_chars=None):
+        return self.search_many([query], k, person, max_chars)[0]
+
+    # 조각 ID 로 문서 하나 가져오기 (없으면 None)
+    def get(self, doc_id):
+        snapshot = self.live_index.current()
+        if snapshot is None or snapshot.vectorstore is None:
+            return None
+        doc = snapshot.vectorstore.docstore.search(doc_id)
+        return chunk_record(doc_id, doc) if isinstance(doc, Document) else None
+
+    # 인덱스 페이지와 임베딩 클라이언트를 미리 사용해서 첫 호출도 빠르게 함
+    def warm_up(self, query="warm up"):
+        self.search(query, k=1)
+
+
+# 도구별 호출 시간 기록 (횟수, 오류 수, 평균/중앙값/p95/최대, 밀리초)
+class CallLatency:
+    def __init__(self, window=1000):
+        self.window = window  # 도구마다 최근 몇 번의 호출 시간으로 분위수를 계산할지
+        self.calls = {}       # 도구 -> {"count", "errors", "total", "recent"}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name):
+        started = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            self.record(name, time.perf_counter() - started, failed)
+
+    def record(self, name, seconds, failed=False):
+        with self._lock:
+            stats = self.calls.setdefault(name, {"count": 0, "errors": 0, "total": 0.0, "recent": []})
+            stats["count"] += 1
+            stats["errors"] += failed
+            stats["total"] += seconds
+            stats["recent"].append(seconds)
+            del stats["recent"][:-self.window]
+
+    def report(self):
+        with self._lock:
+            report = {}
+            for name, stats in sorted(self.calls.items()):
+                recent = np.array(stats["recent"]) * 1000
+                report[name] = {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "mean_ms": round(stats["total"] * 1000 / stats["count"], 2),
+                    "p50_ms": round(float(np.percentile(recent, 50)), 2),
+                    "p95_ms": round(float(np.percentile(recent, 95)), 2),
+                    "max_ms": round(float(recent.max()), 2),
+                }
+            return report
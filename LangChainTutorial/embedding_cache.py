@@ -0,0 +1,117 @@
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# SQLite IN 절 하나에 넣을 최대 키 개수
+LOOKUP_CHUNK = 500
+
+# 인덱스와 임베딩 캐시를 저장하는 폴더 (실행 위치와 관계없이 이 폴더 아래, FAISS_INDEX_DIR 로 변경)
+# app.py 와 두 PDFRag.py 가 같은 폴더를 쓰므로 임베딩 캐시와 인덱스 스냅샷을 함께 사용
+def default_store_root():
+    root = os.getenv("FAISS_INDEX_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "faiss_index")
+    return os.path.abspath(root)
+
+# 캐시 키 계산 전 텍스트 정규화 (유니코드 NFC + 공백 정리)
+def normalize_text(text):
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+# (임베딩 모델, 차원, 정규화된 청크 해시) 로 임베딩을 디스크에 캐시하는 래퍼
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, cache_path=None,
+                 batch_size=512, max_batch_chars=200_000, max_concurrency=4, dtype="float32"):
+        cache_path = cache_path or os.path.join(default_store_root(), "embedding_cache.sqlite3")
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.dimensions = getattr(embeddings, "dimensions", None)
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.max_concurrency = max_concurrency
+        self.dtype = np.dtype(dtype)
+        self.stats = {"hits": 0, "misses": 0, "api_calls": 0}
+
+        if os.path.dirname(cache_path):
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    # 캐시 키 생성
+    def cache_key(self, text):
+        raw = f"{self.model}|{self.dimensions}|{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # 캐시에서 벡터 조회
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                part = keys[start:start + LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part
+                ).fetchall()
+                for key, dtype, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=dtype).astype(np.float32).tolist()
+        return found
+
+    # 캐시에 벡터 저장
+    def _store(self, items):
+        rows = [(key, self.dtype.name, np.asarray(vector, dtype=self.dtype).tobytes()) for key, vector in items]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    # 개수와 글자 수 제한에 맞춰 캐시 미스 (키, 텍스트) 쌍을 배치로 나누기
+    def _batches(self, items):
+        batch, chars = [], 0
+        for key, text in items:
+            if batch and (len(batch) >= self.batch_size or chars + len(text) > self.max_batch_chars):
+                yield batch
+                batch, chars = [], 0
+            batch.append((key, text))
+            chars += len(text)
+        if batch:
+            yield batch
+
+    # 배치 하나를 임베딩하고 바로 캐시에 저장
+    def _embed_batch(self, batch):
+        vectors = self.embeddings.embed_documents([text for _, text in batch])
+        self._store([(key, vector) for (key, _), vector in zip(batch, vectors)])
+        return batch, vectors
+
+    def embed_documents(self, texts):
+        keys = [self.cache_key(text) for text in texts]
+        vectors = self._lookup(list(set(keys)))
+
+        # 캐시에 없는 청크만 (중복 제거 후) 임베딩 요청
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        self.stats["hits"] += len(texts) - len(missing)
+        self.stats["misses"] += len(missing)
+
+        if missing:
+            batches = list(self._batches(missing.items()))
+            self.stats["api_calls"] += len(batches)
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                for batch, batch_vectors in pool.map(self._embed_batch, batches):
+                    for (key, _), vector in zip(batch, batch_vectors):
+                        vectors[key] = vector
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
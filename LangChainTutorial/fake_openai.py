@@ -0,0 +1,227 @@
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import tiktoken
+
+# 벤치마크용 로컬 OpenAI 대체 서버 (chat / embeddings / audio.speech)
+# 같은 입력에는 항상 같은 출력을 돌려주고, 엔드포인트별 지연 시간을 설정할 수 있음
+# 예: python fake_openai.py --port 8765 --chat-latency 0.3 --token-latency 0.01
+#     OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python PDFRag.py
+
+ENCODING = tiktoken.get_encoding("cl100k_base")
+
+# 답변에 쓸 문장 (질문의 해시로 골라서 같은 질문에는 같은 답변)
+ANSWER_SENTENCES = [
+    "문서에 따르면 그 사람은 새로운 것을 배우는 것을 좋아합니다.",
+    "가장 기억에 남는 경험은 친구들과 함께한 여행이라고 적었습니다.",
+    "장래 희망은 사람들에게 도움이 되는 일을 하는 것입니다.",
+    "취미로는 음악 감상과 운동을 꼽았습니다.",
+    "스스로를 꼼꼼하고 책임감 있는 사람이라고 소개했습니다.",
+    "좋아하는 음식은 떡볶이와 김치찌개입니다.",
+    "요즘 가장 관심 있는 분야는 인공지능입니다.",
+    "주말에는 주로 가족과 시간을 보낸다고 합니다.",
+]
+
+# MP3 프레임 하나 (MPEG-1 Layer III, 128kbps, 44.1kHz, 무음 데이터)
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC0]) + bytes(413)
+
+
+# 텍스트의 글자 3-gram 을 해시해서 만든 길이 1 벡터 (비슷한 텍스트는 비슷한 벡터)
+def fake_embedding(text, dimensions=1536):
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for i in range(max(1, len(text) - 2)):
+        digest = hashlib.blake2b(text[i:i + 3].encode("utf-8"), digest_size=8).digest()
+        vector[int.from_bytes(digest, "little") % dimensions] += 1.0
+    return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+
+# 질문에 대한 답변 (같은 질문이면 항상 같은 문장들)
+def fake_answer(question, sentences=3):
+    seed = int.from_bytes(hashlib.blake2b(question.encode("utf-8"), digest_size=8).digest(), "little")
+    picked = [ANSWER_SENTENCES[(seed + i * 3) % len(ANSWER_SENTENCES)] for i in range(sentences)]
+    return " ".join(picked)
+
+
+def count_tokens(text):
+    return len(ENCODING.encode(text, disallowed_special=()))
+
+
+# 엔드포인트별 지연 시간 설정과 호출 횟수
+class FakeOpenAIConfig:
+    def __init__(self, embedding_latency=0.0, chat_latency=0.0, token_latency=0.0, speech_latency=0.0,
+                 answer_sentences=3):
+        self.embedding_latency = embedding_latency  # 임베딩 요청 하나의 지연 시간
+        self.chat_latency = chat_latency            # 채팅 요청부터 첫 토큰까지의 지연 시간
+        self.token_latency = token_latency          # 스트리밍 토큰 사이의 지연 시간
+        self.speech_latency = speech_latency        # 음성 합성 요청 하나의 지연 시간
+        self.answer_sentences = answer_sentences
+        self.calls = {"embeddings": 0, "embedding_inputs": 0, "chat": 0, "speech": 0}
+        self.lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.calls[name] += n
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, content_type="application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, obj):
+        self._send(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+    # 호출 횟수 조회 (GET /v1/stats)
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.server.config.lock:
+                self._json(dict(self.server.config.calls))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.endswith("/embeddings"):
+            self._embeddings(body)
+        elif self.path.endswith("/chat/completions"):
+            self._chat(body)
+        elif self.path.endswith("/audio/speech"):
+            self._speech(body)
+        else:
+            self.send_error(404)
+
+    def _embeddings(self, body):
+        config = self.server.config
+        time.sleep(config.embedding_latency)
+        inputs = body["input"]
+        inputs = [inputs] if isinstance(inputs, (str, int)) or (inputs and isinstance(inputs[0], int)) else inputs
+        config.count("embeddings")
+        config.count("embedding_inputs", len(inputs))
+        dimensions = body.get("dimensions") or 1536
+        data, tokens = [], 0
+        for i, item in enumerate(inputs):
+            # langchain_openai 는 텍스트 대신 토큰 ID 목록을 보내기도 함
+            text = ENCODING.decode(item) if isinstance(item, list) else str(item)
+            tokens += len(item) if isinstance(item, list) else count_tokens(text)
+            data.append({"object": "embedding", "index": i, "embedding": fake_embedding(text, dimensions)})
+        self._json({"object": "list", "data": data, "model": body.get("model"),
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def _chat(self, body):
+        config = self.server.config
+        config.count("chat")
+        question = str(body["messages"][-1]["content"])
+        answer = fake_answer(question, config.answer_sentences)
+        usage = {
+            "prompt_tokens": sum(count_tokens(str(m.get("content", ""))) for m in body["messages"]),
+            "completion_tokens": count_tokens(answer),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        time.sleep(config.chat_latency)
+        base = {"id": "chatcmpl-fake", "created": 0, "model": body.get("model")}
+        if not body.get("stream"):
+            self._json(dict(base, object="chat.completion", usage=usage, choices=[
+                {"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}
+            ]))
+            return
+
+        # 토큰 단위로 SSE 스트리밍 (마지막에 usage 만 담긴 청크)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        self.close_connection = True
+        pending = b""
+        for token in ENCODING.encode(answer):
+            # 한글처럼 토큰 하나가 글자 일부만 담고 있으면 글자가 완성될 때까지 모아서 보냄
+            pending += ENCODING.decode_single_token_bytes(token)
+            try:
+                piece = pending.decode("utf-8")
+            except UnicodeDecodeError:
+                continue
+            pending = b""
+            chunk = dict(base, object="chat.completion.chunk", choices=[
+                {"index": 0, "delta": {"content": piece}, "finish_reason": None}
+            ])
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(config.token_latency)
+        done = dict(base, object="chat.completion.chunk", choices=[
+            {"index": 0, "delta": {}, "finish_reason": "stop"}
+        ])
+        self.wfile.write(f"data: {json.dumps(done)}\n\n".encode("utf-8"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            final = dict(base, object="chat.completion.chunk", choices=[], usage=usage)
+            self.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _speech(self, body):
+        config = self.server.config
+        config.count("speech")
+        time.sleep(config.speech_latency)
+        # 글자 수에 비례하는 길이의 무음 mp3 (한 프레임은 약 26ms)
+        self._send(MP3_FRAME * (4 + len(body.get("input", "")) * 3), "audio/mpeg")
+
+
+# 백그라운드 스레드에서 도는 가짜 OpenAI 서버 (port=0 이면 빈 포트 사용)
+class FakeOpenAIServer:
+    def __init__(self, host="127.0.0.1", port=0, **config):
+        self.config = FakeOpenAIConfig(**config)
+        self.httpd = ThreadingHTTPServer((host, port), FakeOpenAIHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = self.config
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-openai", daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="벤치마크용 로컬 OpenAI 대체 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 이면 빈 포트 사용")
+    parser.add_argument("--embedding-latency", type=float, default=0.0)
+    parser.add_argument("--chat-latency", type=float, default=0.0, help="첫 토큰까지의 지연 시간 (초)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="스트리밍 토큰 사이의 지연 시간 (초)")
+    parser.add_argument("--speech-latency", type=float, default=0.0)
+    parser.add_argument("--answer-sentences", type=int, default=3)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        args.host, args.port,
+        embedding_latency=args.embedding_latency,
+        chat_latency=args.chat_latency,
+        token_latency=args.token_latency,
+        speech_latency=args.speech_latency,
+        answer_sentences=args.answer_sentences
+    )
+    # 첫 줄에 주소를 출력 (벤치마크 스크립트가 읽어서 OPENAI_BASE_URL 로 사용)
+    print(server.base_url, flush=True)
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+import os
+import json
+import shutil
+import hashlib
+import contextlib
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from ingest import IngestReport, ingest_pdfs
+from embedding_cache import default_store_root
+from keyword_index import KeywordIndex, KEYWORD_INDEX_FILE, keyword_text
+from dedup import NearDuplicateIndex, DedupReport, DEDUP_INDEX_FILE, simhash, count_tokens
+from vector_index import IndexSpec, INDEX_FLAT, build_index, apply_search_params
+from mapped_index import INDEX_FILE, has_mapped_docstore, write_mapped_docstore, open_mapped_vectorstore
+
+try:
+    import fcntl
+except ImportError:  # Windows 에서는 프로세스 간 잠금 없이 동작 (프로세스 하나로 실행)
+    fcntl = None
+
+# 청크 메타데이터 형식 버전 (바뀌면 새 디렉토리에 다시 색인, 임베딩은 캐시에서 재사용)
+METADATA_VERSION = 2
+
+# 인덱스 스냅샷 디렉토리 안의 파일 이름
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "LOCK"
+
+# 다른 프로세스가 아직 열고 있을 수 있으므로 최근 버전 몇 개는 지우지 않고 남겨 둠
+KEEP_VERSIONS = 2
+
+# 학습된 인덱스에 벡터가 이 배수 이상 늘어나면 클러스터를 다시 학습
+RETRAIN_GROWTH = 2
+
+# 파일 내용 해시 계산 함수
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# 파일 이름과 내용 해시로 문서 ID 접두어 생성 (내용이 같은 파일이 여러 개여도 충돌하지 않음)
+def file_key(filename, sha):
+    return hashlib.sha1(f"{filename}:{sha}".encode()).hexdigest()[:16]
+
+# 임베딩 모델 이름 가져오기
+def embedding_model_name(embeddings):
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+# 디렉토리 안의 PDF 파일별 해시 계산
+def scan_pdf_dir(pdf_dir):
+    hashes = {}
+    for filename in sorted(os.listdir(pdf_dir)):
+        if filename.endswith(".pdf"):
+            hashes[filename] = file_sha256(os.path.join(pdf_dir, filename))
+    return hashes
+
+
+# 파일 내용 해시를 기록한 매니페스트와 함께 FAISS 인덱스를 디스크에 저장하는 저장소
+class PDFIndexStore:
+    def __init__(self, pdf_dir, embeddings, store_root=None,
+                 chunk_size=500, chunk_overlap=200, combine_pages=False, max_workers=None, dedup_distance=3,
+                 index_spec=None):
+        self.pdf_dir = pdf_dir
+        self.embeddings = embeddings
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.combine_pages = combine_pages
+        self.max_workers = max_workers
+        # SimHash 해밍 거리가 이 값 이하인 청크는 하나의 벡터로 합침 (None 이면 중복 제거 안 함)
+        self.dedup_distance = dedup_distance
+        self.last_report = None
+        self.last_dedup_report = None
+        self.index_spec = index_spec or IndexSpec()
+        self.keyword_index = None  # 마지막으로 불러오거나 동기화한 BM25 역색인
+        self.config = {
+            # 같은 저장 폴더를 쓰는 다른 PDF 폴더의 스냅샷과 섞이지 않도록 폴더 경로도 포함
+            "pdf_dir": os.path.abspath(pdf_dir),
+            "embedding_model": embedding_model_name(embeddings),
+            "dimensions": getattr(embeddings, "dimensions", None),
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "combine_pages": combine_pages,
+            "metadata_version": METADATA_VERSION,
+            "dedup_distance": dedup_distance,
+        }
+        # Flat 이 아닌 인덱스는 별도 디렉토리에 저장 (기존 Flat 인덱스 디렉토리는 그대로 사용)
+        if self.index_spec.kind != INDEX_FLAT:
+            self.config["index"] = self.index_spec.config()
+        # 설정(임베딩 모델, 청크 크기 등)마다 별도의 하위 디렉토리를 사용
+        config_key = hashlib.sha1(json.dumps(self.config, sort_keys=True).encode()).hexdigest()[:12]
+        self.store_dir = os.path.join(store_root or default_store_root(), config_key)
+
+    # 현재 버전의 스냅샷 디렉토리 경로
+    def current_dir(self):
+        try:
+            with open(os.path.join(self.store_dir, CURRENT_FILE), encoding="utf-8") as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        path = os.path.join(self.store_dir, name)
+        return path if os.path.isdir(path) else None
+
+    # 현재 게시된 버전 번호 (CURRENT 파일만 읽음, 없으면 None)
+    def current_version(self):
+        snapshot_dir = self.current_dir()
+        return int(os.path.basename(snapshot_dir)[1:]) if snapshot_dir is not None else None
+
+    # 매니페스트 읽기 (없으면 빈 매니페스트)
+    def load_manifest(self, snapshot_dir=None):
+        snapshot_dir = snapshot_dir or self.current_dir()
+        if snapshot_dir is None:
+            return {"version": 0, "config": self.config, "files": {}}
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+
+    # 저장된 벡터 저장소 불러오기
+    def load_vectorstore(self):
+        snapshot_dir = self.current_dir()
+        if snapshot_dir is None or not os.path.exists(os.path.join(snapshot_dir, INDEX_FILE)):
+            return None
+        vectorstore = FAISS.load_local(
+            snapshot_dir,
+            self.embeddings,
+            allow_dangerous_deserialization=True
+        )
+        apply_search_params(vectorstore.index, self.load_manifest().get("index"))
+        return vectorstore
+
+    # 청크 ID -> (텍스트, 메타데이터, 벡터) 를 벡터 저장소에 추가 (저장소가 없으면 새로 만듦)
+    def add_embeddings(self, vectorstore, docs):
+        ids = list(docs)
+        text_embeddings = [(text, vector) for text, _, vector in docs.values()]
+        metadatas = [metadata for _, metadata, _ in docs.values()]
+        if vectorstore is None:
+            return FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+        vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return vectorstore
+
+    # 남은 청크와 새 청크로 인덱스를 새로 학습해서 만들기 (삭제를 지원하지 않거나 번호가 바뀌는 인덱스용)
+    def rebuild_vectorstore(self, vectorstore, new_docs, stale):
+        docs = {}
+        if vectorstore is not None:
+            for doc_id in vectorstore.index_to_docstore_id.values():
+                if doc_id not in stale:
+                    docs[doc_id] = vectorstore.docstore.search(doc_id)
+        # 기존 청크의 원래 벡터는 임베딩 캐시에서 다시 가져옴 (압축된 벡터를 다시 압축하지 않도록)
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in docs.values()]) if docs else []
+        for doc_id, (text, metadata, vector) in new_docs.items():
+            docs[doc_id] = Document(id=doc_id, page_content=text, metadata=metadata)
+            vectors.append(vector)
+        if not docs:
+            return None, None
+        index, info = build_index(np.asarray(vectors, dtype=np.float32), self.index_spec)
+        vectorstore = FAISS(self.embeddings, index, InMemoryDocstore(docs), dict(enumerate(docs)))
+        return vectorstore, info
+
+    # 저장된 BM25 역색인 불러오기 (역색인이 없던 이전 버전이면 벡터 저장소의 문서로 새로 만듦)
+    def load_keyword_index(self, vectorstore):
+        snapshot_dir = self.current_dir()
+        if snapshot_dir is not None and os.path.exists(os.path.join(snapshot_dir, KEYWORD_INDEX_FILE)):
+            return KeywordIndex.load(snapshot_dir)
+        if vectorstore is not None:
+            return KeywordIndex.from_vectorstore(vectorstore)
+        return KeywordIndex()
+
+    # 저장된 중복 청크 색인 불러오기 (중복 제거를 끈 경우 None)
+    def load_dedup_index(self, vectorstore):
+        if self.dedup_distance is None:
+            return None
+        snapshot_dir = self.current_dir()
+        if snapshot_dir is not None and os.path.exists(os.path.join(snapshot_dir, DEDUP_INDEX_FILE)):
+            return NearDuplicateIndex.load(snapshot_dir)
+        if vectorstore is not None:
+            return NearDuplicateIndex.from_vectorstore(vectorstore, self.dedup_distance)
+        return NearDuplicateIndex(self.dedup_distance)
+
+    # 새 버전의 스냅샷을 저장하고 CURRENT 를 원자적으로 교체
+    def publish(self, vectorstore, manifest, keyword_index=None, dedup_index=None):
+        os.makedirs(self.store_dir, exist_ok=True)
+        name = f"v{manifest['version']:06d}"
+        snapshot_dir = os.path.join(self.store_dir, name)
+        tmp_dir = snapshot_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        if vectorstore is not None:
+            vectorstore.save_local(tmp_dir)
+            # 읽기 전용 프로세스가 mmap 으로 함께 쓰는 문서 저장소
+            write_mapped_docstore(tmp_dir, vectorstore)
+        if keyword_index is not None:
+            keyword_index.save(tmp_dir)
+        if dedup_index is not None:
+            dedup_index.save(tmp_dir)
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        os.replace(tmp_dir, snapshot_dir)
+
+        current_tmp = os.path.join(self.store_dir, CURRENT_FILE + ".tmp")
+        with open(current_tmp, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(current_tmp, os.path.join(self.store_dir, CURRENT_FILE))
+
+        # 이전 버전 정리 (최근 버전은 mmap 으로 열고 있는 프로세스를 위해 남김)
+        versions = sorted(old for old in os.listdir(self.store_dir) if old.startswith("v") and not old.endswith(".tmp"))
+        for old in versions[:-KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(self.store_dir, old), ignore_errors=True)
+
+    # 인덱스를 쓰는 프로세스가 하나만 있도록 하는 파일 잠금
+    @contextlib.contextmanager
+    def writer_lock(self):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(os.path.join(self.store_dir, LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # 다시 색인하거나 게시해야 하는지 확인 (벡터 저장소를 불러오지 않고 매니페스트와 파일 해시만 비교)
+    def needs_sync(self):
+        snapshot_dir = self.current_dir()
+        if snapshot_dir is None:
+            return True
+        if os.path.exists(os.path.join(snapshot_dir, INDEX_FILE)) and not has_mapped_docstore(snapshot_dir):
+            return True
+        indexed = self.load_manifest(snapshot_dir)["files"]
+        current = scan_pdf_dir(self.pdf_dir)
+        return any(indexed.get(name, {}).get("sha256") != sha for name, sha in current.items()) \
+            or any(name not in current for name in indexed)
+
+    # 현재 버전을 mmap 으로 열기 (버전, 벡터 저장소, BM25 역색인), 게시된 버전이 없으면 None
+    def open_mapped(self):
+        for _ in range(3):
+            snapshot_dir = self.current_dir()
+            if snapshot_dir is None:
+                return None
+            try:
+                manifest = self.load_manifest(snapshot_dir)
+                if not os.path.exists(os.path.join(snapshot_dir, INDEX_FILE)):
+                    return manifest["version"], None, KeywordIndex()
+                vectorstore = open_mapped_vectorstore(snapshot_dir, self.embeddings)
+                apply_search_params(vectorstore.index, manifest.get("index"))
+                return manifest["version"], vectorstore, KeywordIndex.load(snapshot_dir)
+            except (FileNotFoundError, RuntimeError):
+                # 여는 도중 정리된 버전이면 새 CURRENT 로 다시 시도
+                continue
+        return None
+
+    # 저장된 인덱스를 불러오고 추가/변경/삭제된 PDF만 반영 (여러 프로세스가 동시에 호출해도 한 번에 하나씩)
+    def sync(self):
+        with self.writer_lock():
+            return self._sync()
+
+    def _sync(self):
+        manifest = self.load_manifest()
+        indexed = manifest["files"]
+        current = scan_pdf_dir(self.pdf_dir)
+
+        changed = [name for name, sha in current.items() if indexed.get(name, {}).get("sha256") != sha]
+        removed = [name for name in indexed if name not in current]
+
+        vectorstore = self.load_vectorstore()
+        keyword_index = self.load_keyword_index(vectorstore)
+        dedup_index = self.load_dedup_index(vectorstore)
+        if not changed and not removed:
+            if vectorstore is not None and not has_mapped_docstore(self.current_dir()):
+                # mmap 형식 문서 저장소가 없던 이전 스냅샷은 그대로 다시 게시
+                manifest["version"] += 1
+                self.publish(vectorstore, manifest, keyword_index, dedup_index)
+            self.keyword_index = keyword_index
+            return vectorstore
+
+        # 지워질 청크나 (임베딩 실패 등으로) 색인에 없는 청크를 대표 청크로 쓰던 다른 파일도 다시 처리
+        # (임베딩은 캐시에서 재사용)
+        known = set(vectorstore.index_to_docstore_id.values()) if vectorstore is not None else set()
+        while True:
+            stale = {doc_id for name in changed + removed for doc_id in indexed.get(name, {}).get("ids", [])}
+            orphaned = [name for name, entry in indexed.items()
+                        if name not in changed and name not in removed
+                        and any(canonical in stale or canonical not in known
+                                for canonical in entry.get("duplicates", {}).values())]
+            if not orphaned:
+                break
+            changed.extend(orphaned)
+
+        # 남아 있는 대표 청크에서 다시 처리하거나 삭제할 파일의 출처 제거
+        touched = set()
+        for name in changed + removed:
+            for canonical in set(indexed.get(name, {}).get("duplicates", {}).values()):
+                if canonical not in stale and canonical in known:
+                    metadata = vectorstore.docstore.search(canonical).metadata
+                    metadata["duplicate_sources"] = [
+                        source for source in metadata.get("duplicate_sources", [])
+                        if os.path.basename(source["source"]) != name
+                    ]
+                    touched.add(canonical)
+
+        # 변경되거나 삭제된 파일의 벡터 제거
+        stale_ids = sorted(stale)
+        if vectorstore is not None and stale_ids and self.index_spec.kind == INDEX_FLAT:
+            vectorstore.delete(stale_ids)
+        keyword_index.delete(stale_ids)
+        if dedup_index is not None:
+            dedup_index.delete(stale_ids)
+        for name in removed:
+            del indexed[name]
+
+        # 이미 색인된 청크나 이번에 먼저 나온 청크와 거의 같은 청크는 임베딩하지 않고 대표 청크에 출처만 추가
+        paths = {os.path.join(self.pdf_dir, name): name for name in changed}
+        duplicates = {}  # 청크 ID -> 대표 청크 ID
+        added = {}       # 파일 경로 -> 중복 색인에 대표 청크로 추가한 청크 ID
+        dedup_report = DedupReport()
+
+        def keep_chunk(path, i, text, metadata):
+            if dedup_index is None:
+                return True
+            chunk_id = f"{file_key(paths[path], current[paths[path]])}-{i}"
+            value = simhash(text)
+            canonical = dedup_index.find(value)
+            if canonical is None:
+                dedup_index.add(chunk_id, value)
+                added.setdefault(path, []).append(chunk_id)
+                return True
+            duplicates[chunk_id] = canonical
+            dedup_report.tokens_saved += count_tokens(text)
+            return False
+
+        # 추가되거나 변경된 파일만 병렬로 파싱하고 임베딩
+        # 임베딩이 끝난 파일부터 바로 인덱스에 넣어서 전체 문서의 청크와 벡터를 한꺼번에 들고 있지 않음
+        # (새로 학습해야 할 수 있는 인덱스는 학습 전까지 float32 배열로만 보관)
+        self.last_report = IngestReport()
+        new_docs = {}           # 학습할 인덱스에 넣을 청크 ID -> (텍스트, 메타데이터, 벡터)
+        duplicate_sources = {}  # 대표 청크 ID -> [중복 청크의 출처]
+        for path, file_results in ingest_pdfs(
+                list(paths),
+                self.embeddings.embed_documents,
+                chunk_size=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+                report=self.last_report,
+                combine_pages=self.combine_pages,
+                max_workers=self.max_workers,
+                keep_chunk=keep_chunk):
+            name = paths[path]
+            prefix = file_key(name, current[name])
+            file_ids, file_duplicates, file_docs = [], {}, {}
+            for i, (text, metadata, vector) in enumerate(file_results):
+                chunk_id = f"{prefix}-{i}"
+                if chunk_id in duplicates:
+                    file_duplicates[chunk_id] = duplicates[chunk_id]
+                    duplicate_sources.setdefault(duplicates[chunk_id], []).append({
+                        key: metadata.get(key) for key in ("source", "person", "page")
+                    })
+                else:
+                    file_docs[chunk_id] = (text, metadata, vector)
+                    file_ids.append(chunk_id)
+            indexed[name] = {"sha256": current[name], "ids": file_ids, "duplicates": file_duplicates}
+            if not file_docs:
+                continue
+            keyword_index.add(list(file_docs), [keyword_text(text, metadata) for text, metadata, _ in file_docs.values()])
+            if self.index_spec.kind == INDEX_FLAT:
+                vectorstore = self.add_embeddings(vectorstore, file_docs)
+            else:
+                for chunk_id, (text, metadata, vector) in file_docs.items():
+                    new_docs[chunk_id] = (text, metadata, np.asarray(vector, dtype=np.float32))
+
+        for path in self.last_report.failures:
+            # 파싱이나 임베딩에 실패한 파일은 매니페스트에서 빼서 다음 동기화 때 다시 시도
+            indexed.pop(paths[path], None)
+            if dedup_index is not None:
+                dedup_index.delete(added.get(path, []))
+
+        index_info = manifest.get("index")
+        if self.index_spec.kind != INDEX_FLAT and (
+                stale_ids or vectorstore is None or index_info is None
+                or len(vectorstore.index_to_docstore_id) + len(new_docs) > RETRAIN_GROWTH * index_info["trained_on"]):
+            # IVF 는 삭제하면 벡터 번호가 바뀌지 않고 HNSW 는 삭제를 지원하지 않으므로 새로 학습
+            vectorstore, info = self.rebuild_vectorstore(vectorstore, new_docs, stale)
+            index_info = info.to_dict() if info is not None else None
+        elif new_docs:
+            # 학습된 인덱스에는 새 벡터만 추가 (가까운 클러스터에 배정)
+            vectorstore = self.add_embeddings(vectorstore, new_docs)
+        new_docs.clear()
+
+        # 중복 청크의 출처를 대표 청크에 추가하고, 출처가 바뀐 대표 청크는 파일 이름 검색어도 다시 색인
+        # (대표 청크의 파일이 이번에 실패했으면 다음 동기화 때 중복 청크의 파일과 함께 다시 처리)
+        for canonical, sources in duplicate_sources.items():
+            doc = vectorstore.docstore.search(canonical) if vectorstore is not None else None
+            if isinstance(doc, Document):
+                doc.metadata.setdefault("duplicate_sources", []).extend(sources)
+                touched.add(canonical)
+        for canonical in touched:
+            doc = vectorstore.docstore.search(canonical)
+            keyword_index.add([canonical], [keyword_text(doc.page_content, doc.metadata)])
+
+        if vectorstore is not None and not vectorstore.index_to_docstore_id:
+            vectorstore = None
+        dedup_report.chunks = self.last_report.chunks
+        dedup_report.duplicates = self.last_report.duplicates
+        dedup_report.bytes_saved = dedup_report.duplicates * (vectorstore.index.d * 4 if vectorstore is not None else 0)
+        self.last_dedup_report = dedup_report
+
+        manifest["version"] += 1
+        manifest["config"] = self.config
+        if index_info is not None:
+            manifest["index"] = index_info
+        self.publish(vectorstore, manifest, keyword_index, dedup_index)
+        self.keyword_index = keyword_index
+        return vectorstore
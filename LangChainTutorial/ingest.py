@@ -0,0 +1,170 @@
+import os
+import time
+import bisect
+import multiprocessing
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from partitions import person_from_filename
+
+
+# 수집 결과 요약
+@dataclass
+class IngestReport:
+    files: int = 0
+    chunks: int = 0
+    embed_batches: int = 0
+    duplicates: int = 0
+    seconds: float = 0.0
+    failures: dict = field(default_factory=dict)
+
+
+# 워커 프로세스에서 PDF 한 개를 페이지 단위로 읽으면서 바로 청크로 나누기
+# 모든 청크에 출처(source), 파일 이름에서 뽑은 사람 이름(person), 페이지(page, 0부터) 를 기록
+def parse_and_split(path, chunk_size, chunk_overlap, combine_pages=False):
+    person = person_from_filename(path)
+    chunks = []
+    if combine_pages:
+        # 페이지를 모두 모은 뒤 한 번에 이어 붙이기 (반복적인 += 연결 대신 join 사용)
+        pages = [page.page_content for page in PyPDFLoader(path).lazy_load()]
+        text = "\n\n".join(pages)
+        # 각 페이지가 이어 붙인 텍스트에서 시작하는 위치 (청크가 시작하는 페이지를 찾는 데 사용)
+        page_starts = []
+        offset = 0
+        for page_text in pages:
+            page_starts.append(offset)
+            offset += len(page_text) + 2
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+        )
+        for doc in text_splitter.create_documents([text]):
+            page = bisect.bisect_right(page_starts, doc.metadata["start_index"]) - 1
+            chunks.append((doc.page_content, {"source": path, "person": person, "page": max(page, 0)}))
+    else:
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        for page in PyPDFLoader(path).lazy_load():
+            page.metadata.setdefault("source", path)
+            page.metadata["person"] = person
+            for chunk in text_splitter.split_text(page.page_content):
+                chunks.append((chunk, dict(page.metadata)))
+    return chunks
+
+
+# PDF 파싱은 프로세스 풀에서 병렬로, 임베딩은 파싱이 끝난 파일부터 배치로 바로 시작하는 수집 파이프라인
+# 임베딩까지 끝난 파일부터 (경로, [(텍스트, 메타데이터, 벡터)]) 를 바로 돌려주므로
+# 메모리에는 처리 중인 파일들의 청크만 남음 (전체 문서가 아니라 동시에 처리하는 창 크기에 비례)
+# keep_chunk(path, i, text, metadata) 가 False 를 돌려준 청크는 임베딩하지 않음 (벡터는 None)
+# 파싱이나 임베딩에 실패한 파일은 report.failures 에 기록하고 돌려주지 않음 (나머지 파일은 계속 처리)
+def ingest_pdfs(paths, embed_documents, chunk_size, chunk_overlap, report, combine_pages=False,
+                max_workers=None, embed_batch_size=256, embed_concurrency=4, keep_chunk=None):
+    started = time.perf_counter()
+    max_workers = max_workers or min(len(paths), os.cpu_count() or 1) or 1
+    max_inflight = max_workers * 2
+
+    pending_paths = list(paths)
+    parse_futures = {}
+    embed_futures = {}
+    files = {}  # 임베딩을 기다리는 파일 경로 -> {"chunks", "vectors", "waiting"}
+    batch = []
+
+    # 모아 둔 청크를 임베딩 배치로 제출
+    def submit_batch(embed_pool):
+        nonlocal batch
+        # 그 사이 임베딩에 실패한 파일의 청크는 보내지 않음
+        batch = [(path, i) for path, i in batch if path in files]
+        if batch:
+            texts = [files[path]["chunks"][i][0] for path, i in batch]
+            embed_futures[embed_pool.submit(embed_documents, texts)] = batch
+            report.embed_batches += 1
+            batch = []
+
+    # 파일의 모든 청크가 임베딩되었으면 결과를 넘기고 메모리에서 제거
+    def finish(path):
+        entry = files[path]
+        if entry["waiting"] == 0 and path not in report.failures:
+            del files[path]
+            report.files += 1
+            return [(path, [(text, metadata, vector) for (text, metadata), vector in zip(entry["chunks"], entry["vectors"])])]
+        return []
+
+    # 완료된 임베딩 배치의 결과를 파일별 위치에 기록하고 끝난 파일을 돌려줌
+    def collect(done):
+        finished = []
+        for future in done:
+            batch_items = embed_futures.pop(future)
+            try:
+                batch_vectors = future.result()
+            except Exception as e:
+                batch_vectors = None
+                # 임베딩에 실패한 배치에 청크가 있는 파일만 실패로 기록 (다음 동기화 때 다시 시도)
+                for path, _ in batch_items:
+                    report.failures.setdefault(path, f"{type(e).__name__}: {e}")
+            for j, (path, i) in enumerate(batch_items):
+                entry = files.get(path)
+                if entry is None:
+                    continue
+                entry["waiting"] -= 1
+                if batch_vectors is not None:
+                    entry["vectors"][i] = batch_vectors[j]
+            for path in dict.fromkeys(path for path, _ in batch_items):
+                if path in report.failures:
+                    # 실패한 파일의 나머지 배치는 결과를 기다리지 않고 버림
+                    files.pop(path, None)
+                elif path in files:
+                    finished.extend(finish(path))
+        return finished
+
+    # 색인은 스레드가 여러 개 도는 프로세스(Streamlit, 임베딩 캐시, 폴더 감시, 서버 등)에서 실행되므로
+    # 잠금 상태까지 복사하는 fork 대신 forkserver(없으면 spawn) 로 워커 생성
+    # 워커는 이 모듈의 함수만 실행하지만, 실행한 스크립트도 __mp_main__ 으로 다시 불러오므로
+    # 스크립트의 실행 코드는 __main__ 보호 필요 (Streamlit 앱은 app.py 에서 __spec__ 으로 처리)
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(start_method)
+    if start_method == "forkserver":
+        # 워커마다 PDF 파서를 다시 import 하지 않도록 forkserver 에 미리 불러 둠
+        context.set_forkserver_preload(["ingest"])
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as parse_pool, \
+            ThreadPoolExecutor(max_workers=embed_concurrency) as embed_pool:
+        while pending_paths or parse_futures:
+            # 동시에 파싱 중인 파일 수를 제한해 메모리 사용량을 창 크기로 묶어 둠
+            while pending_paths and len(parse_futures) < max_inflight:
+                path = pending_paths.pop(0)
+                future = parse_pool.submit(parse_and_split, path, chunk_size, chunk_overlap, combine_pages)
+                parse_futures[future] = path
+
+            done, _ = wait(parse_futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = parse_futures.pop(future)
+                try:
+                    file_chunks = future.result()
+                except Exception as e:
+                    # 실패한 파일은 기록만 하고 나머지 파일은 계속 처리
+                    report.failures[path] = f"{type(e).__name__}: {e}"
+                    continue
+                report.chunks += len(file_chunks)
+                files[path] = {"chunks": file_chunks, "vectors": [None] * len(file_chunks), "waiting": 0}
+                for i, (text, metadata) in enumerate(file_chunks):
+                    if keep_chunk is not None and not keep_chunk(path, i, text, metadata):
+                        report.duplicates += 1
+                        continue
+                    files[path]["waiting"] += 1
+                    batch.append((path, i))
+                    if len(batch) >= embed_batch_size:
+                        submit_batch(embed_pool)
+                # 임베딩할 청크가 없는 파일은 바로 끝남
+                yield from finish(path)
+
+            # 임베딩 요청이 너무 많이 쌓이면 가장 먼저 끝나는 배치를 기다림
+            while len(embed_futures) >= embed_concurrency * 2:
+                finished, _ = wait(embed_futures, return_when=FIRST_COMPLETED)
+                yield from collect(finished)
+            # 이미 끝난 배치가 있으면 기다리지 않고 결과를 넘김
+            yield from collect([future for future in list(embed_futures) if future.done()])
+
+        submit_batch(embed_pool)
+        while embed_futures:
+            finished, _ = wait(embed_futures, return_when=FIRST_COMPLETED)
+            yield from collect(finished)
+
+    report.seconds = time.perf_counter() - started
@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import math
+import unicodedata
+from collections import Counter
+from typing import Any, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from partitions import find_person
+
+KEYWORD_INDEX_FILE = "keyword_index.json"
+
+WORD = re.compile(r"[^\W_]+")
+HANGUL = re.compile(r"[가-힣]")
+
+
+# 검색용 토큰 나누기 (한글은 조사/어미가 붙어도 맞도록 글자 2-gram, 영문/숫자는 단어 그대로)
+def tokenize(text):
+    tokens = []
+    for word in WORD.findall(unicodedata.normalize("NFC", text).lower()):
+        if HANGUL.search(word):
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+# 청크 본문에 파일 이름을 붙여서 색인 (사람 이름이 파일 이름에만 있어도 찾을 수 있도록)
+# 중복 제거로 합쳐진 청크는 같은 내용이 있던 모든 파일의 이름을 붙임
+def keyword_text(text, metadata):
+    metadata = metadata or {}
+    sources = [metadata.get("source")] + [s.get("source") for s in metadata.get("duplicate_sources", [])]
+    names = [os.path.splitext(os.path.basename(source))[0] for source in sources if source]
+    if not names:
+        return text
+    return "\n".join(names + [text])
+
+
+# FAISS 저장소 옆에 함께 저장되는 BM25 역색인
+class KeywordIndex:
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_terms = {}  # 문서 ID -> {토큰: 빈도}
+        self.postings = {}   # 토큰 -> {문서 ID: 빈도}
+        self.doc_lengths = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, ids, texts):
+        for doc_id, text in zip(ids, texts):
+            if doc_id in self.doc_terms:
+                self.delete([doc_id])
+            self._add_terms(doc_id, dict(Counter(tokenize(text))))
+
+    def _add_terms(self, doc_id, terms):
+        self.doc_terms[doc_id] = terms
+        self.doc_lengths[doc_id] = sum(terms.values())
+        self.total_length += self.doc_lengths[doc_id]
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+    def delete(self, ids):
+        for doc_id in ids:
+            terms = self.doc_terms.pop(doc_id, None)
+            if terms is None:
+                continue
+            self.total_length -= self.doc_lengths.pop(doc_id)
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(doc_id, None)
+                    if not posting:
+                        del self.postings[term]
+
+    # BM25 점수가 높은 순서로 (문서 ID, 점수) 반환 (allowed 가 있으면 그 문서들만 점수 계산)
+    def search(self, query, k=20, allowed=None):
+        if not self.doc_terms:
+            return []
+        n = len(self.doc_terms)
+        avg_length = self.total_length / n
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                length = self.doc_lengths[doc_id]
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self, directory):
+        with open(os.path.join(directory, KEYWORD_INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "docs": self.doc_terms}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, KEYWORD_INDEX_FILE), encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        for doc_id, terms in data["docs"].items():
+            index._add_terms(doc_id, terms)
+        return index
+
+    # 기존 벡터 저장소의 문서로 역색인 만들기 (역색인이 없던 이전 버전 인덱스용)
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        index = cls()
+        for doc_id in vectorstore.index_to_docstore_id.values():
+            doc = vectorstore.docstore.search(doc_id)
+            index.add([doc_id], [keyword_text(doc.page_content, doc.metadata)])
+        return index
+
+
+# 여러 순위 목록을 순위 역수 합(RRF)으로 합치기
+def reciprocal_rank_fusion(rankings, rrf_k=60):
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+# 벡터 검색과 BM25 검색 결과를 RRF 로 합치는 검색기
+class HybridRetriever(BaseRetriever):
+    vectorstore: Any
+    keyword_index: Any
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    # BM25 최고 점수의 이 비율보다 낮은 키워드 결과는 버림 (흔한 2-gram 만 겹친 청크 제외)
+    keyword_min_ratio: float = 0.5
+    # 두 검색 결과가 모두 가리키는 청크가 있으면 한쪽에서만 나온 약한 청크는 잘라서 프롬프트를 줄임
+    min_score_ratio: float = 0.5
+    # 사람별 분할 인덱스와 검색 범위 (person 이 없으면 질문에 나온 이름으로 범위를 정함)
+    partitions: Any = None
+    person: Optional[str] = None
+    # 프롬프트에 넣을 조각을 고르는 ContextPacker (없으면 RRF 순위대로 k 개)
+    packer: Any = None
+
+    # 검색된 청크의 벡터를 인덱스에서 다시 꺼내기 (꺼낼 수 없는 인덱스면 None)
+    def _vectors(self, docs):
+        if self.partitions is not None:
+            positions = self.partitions.positions
+        else:
+            positions = {doc_id: position for position, doc_id in self.vectorstore.index_to_docstore_id.items()}
+        try:
+            return self.vectorstore.index.reconstruct_batch(np.array([positions[doc.id] for doc in docs], dtype=np.int64))
+        except (KeyError, RuntimeError):
+            return None
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        person = self.person
+        if person is None and self.partitions is not None:
+            person = find_person(query, self.partitions.persons)
+
+        # 질문 임베딩은 한 번만 만들어서 벡터 검색과 조각 선택에 함께 사용
+        vector = self.vectorstore._embed_query(query)
+        allowed = None
+        if person is not None and self.partitions is not None and person in self.partitions:
+            # 그 사람의 벡터만 비교 (검색 비용이 전체가 아닌 분할 크기에 비례)
+            dense = self.partitions.search_by_vector(person, vector, k=self.fetch_k)
+            allowed = self.partitions.ids(person)
+        else:
+            dense = self.vectorstore.similarity_search_by_vector(vector, k=self.fetch_k)
+        docs = {doc.id: doc for doc in dense}
+        rankings = []
+        if self.keyword_index is not None:
+            keyword = self.keyword_index.search(query, k=self.fetch_k, allowed=allowed)
+            if keyword:
+                threshold = keyword[0][1] * self.keyword_min_ratio
+                rankings.append([doc_id for doc_id, score in keyword if score >= threshold])
+        # 점수가 같으면 키워드 결과(정확히 일치하는 이름 등)가 앞에 오도록 키워드 순위를 먼저 넣음
+        rankings.append([doc.id for doc in dense])
+
+        # 조각을 고르는 단계가 있으면 후보를 넉넉히 넘기고 그 단계에서 줄임
+        fused = reciprocal_rank_fusion(rankings, self.rrf_k)[:self.k if self.packer is None else self.fetch_k]
+        if not fused:
+            return []
+        cutoff = fused[0][1] * self.min_score_ratio
+        results = []
+        for doc_id, score in fused:
+            if score < cutoff:
+                break
+            doc = docs.get(doc_id)
+            if doc is None:
+                doc = self.vectorstore.docstore.search(doc_id)
+                doc = Document(id=doc_id, page_content=doc.page_content, metadata=doc.metadata)
+            results.append(doc)
+        if self.packer is not None and results:
+            results = self.packer.pack(vector, results, self._vectors(results))
+        return results
@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+from dataclasses import dataclass, replace
+from typing import Any
+from keyword_index import HybridRetriever
+from partitions import PersonPartitions
+
+
+# 한 버전의 인덱스와 그 인덱스로 만든 QA 체인 (교체만 되고 수정되지 않음)
+@dataclass(frozen=True)
+class IndexSnapshot:
+    version: int
+    vectorstore: Any
+    qa_chain: Any
+    loaded_at: float
+    keyword_index: Any = None
+    partitions: Any = None
+    packer: Any = None
+
+    # 이 버전의 벡터 저장소, BM25 역색인, 사람별 분할 인덱스를 함께 쓰는 하이브리드 검색기
+    def retriever(self, **kwargs):
+        return HybridRetriever(
+            vectorstore=self.vectorstore,
+            keyword_index=self.keyword_index,
+            partitions=self.partitions,
+            packer=self.packer,
+            **kwargs
+        )
+
+
+# PDF 디렉토리의 파일 목록/크기/수정 시각 (변경 여부를 해시 없이 빠르게 확인)
+def pdf_dir_signature(pdf_dir):
+    signature = []
+    for entry in sorted(os.scandir(pdf_dir), key=lambda e: e.name):
+        if entry.name.endswith(".pdf") and entry.is_file():
+            stat = entry.stat()
+            signature.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+# PDF 디렉토리를 감시하면서 새 인덱스 버전을 백그라운드에서 만들어 교체하는 인덱스
+# mapped=True 이면 게시된 스냅샷을 mmap 으로 열어서 같은 서버의 여러 프로세스가 메모리를 함께 사용
+# (PDF 변경은 먼저 발견한 프로세스 하나가 반영하고, 나머지는 새 버전이 게시되면 다시 매핑)
+# packer 는 검색기가 프롬프트에 넣을 조각을 고를 때 쓰는 ContextPacker
+class LiveIndex:
+    def __init__(self, store, build_chain, poll_interval=5.0, mapped=False, packer=None):
+        self.store = store
+        self.packer = packer
+        self.build_chain = build_chain
+        self.poll_interval = poll_interval
+        self.mapped = mapped
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = None
+        self._snapshot = None
+        self.last_error = None
+        self.refresh(force=True)
+
+    # 현재 서비스 중인 스냅샷 (질문 하나를 처리하는 동안 이 값을 계속 사용)
+    def current(self):
+        return self._snapshot
+
+    # 현재 인덱스 버전 (아직 게시된 인덱스가 없으면 None)
+    @property
+    def version(self):
+        return self._snapshot.version if self._snapshot is not None else None
+
+    # PDF 변경 사항을 반영해 새 스냅샷으로 교체 (변경이 없으면 아무것도 하지 않음)
+    def refresh(self, force=False):
+        with self._lock:
+            signature = pdf_dir_signature(self.store.pdf_dir)
+            if self.mapped:
+                return self._refresh_mapped(signature, force)
+            if not force and signature == self._signature:
+                return False
+            # 디스크에서 새로 불러온 복사본에만 추가/삭제가 적용되므로 서비스 중인 인덱스는 그대로 유지됨
+            vectorstore = self.store.sync()
+            version = self.store.load_manifest()["version"]
+            self._signature = signature
+            return self._swap(version, vectorstore, self.store.keyword_index)
+
+    # 필요하면 인덱스를 다시 게시하고, 게시된 버전이 바뀌었으면 mmap 으로 다시 열기
+    def _refresh_mapped(self, signature, force):
+        if (force or signature != self._signature) and self.store.needs_sync():
+            self.store.sync()
+        self._signature = signature
+        if not force and self._snapshot is not None and self.store.current_version() == self._snapshot.version:
+            return False
+        opened = self.store.open_mapped()
+        if opened is None:
+            return False
+        return self._swap(*opened)
+
+    # 새 버전이면 검색기와 QA 체인을 만들어 스냅샷 교체
+    def _swap(self, version, vectorstore, keyword_index):
+        if self._snapshot is not None and version == self._snapshot.version:
+            return False
+        snapshot = IndexSnapshot(version, vectorstore, None, time.time(), keyword_index, packer=self.packer)
+        if vectorstore is not None:
+            snapshot = replace(snapshot, partitions=PersonPartitions(vectorstore))
+            snapshot = replace(snapshot, qa_chain=self.build_chain(snapshot.retriever()))
+        # 참조 교체는 원자적이므로 읽는 쪽은 잠금 없이 이전 또는 새 스냅샷 중 하나를 보게 됨
+        # (이전 스냅샷의 mmap 은 그 스냅샷을 쓰던 질문이 끝나고 참조가 없어지면 닫힘)
+        self._snapshot = snapshot
+        return True
+
+    # 감시 스레드 본문
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+
+    # PDF 디렉토리 감시 시작
+    def start_watching(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="pdf-index-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    # PDF 디렉토리 감시 중지
+    def stop_watching(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -1,4 +1,4 @@
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationSummaryBufferMemory
 from langchain_openai import ChatOpenAI
 from langchain.chains import ConversationChain
 from dotenv import load_dotenv
@@ -11,9 +11,9 @@ llm = ChatOpenAI(temperature=0)
 
 # ConversationChain을 생성합니다.
 conversation = ConversationChain(
-    # ConversationBufferMemory를 사용합니다.
+    # ConversationSummaryBufferMemory를 사용합니다. (최근 대화는 그대로, 토큰 한도를 넘는 이전 대화는 요약)
     llm=llm,
-    memory=ConversationBufferMemory(),
+    memory=ConversationSummaryBufferMemory(llm=llm, max_token_limit=1000),
 )
 # memory.save_context(
 #     inputs={
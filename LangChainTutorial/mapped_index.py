@@ -0,0 +1,62 @@
+import os
+import json
+import mmap
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+
+# 스냅샷 디렉토리 안의 읽기 전용 문서 저장소 파일 (FAISS 위치 순서로 저장)
+MAPPED_DOCS_FILE = "docstore.bin"           # 문서별 JSON 을 이어 붙인 파일
+MAPPED_OFFSETS_FILE = "docstore_offsets.npy"  # 문서 i 는 offsets[i]:offsets[i+1] 구간
+MAPPED_IDS_FILE = "docstore_ids.json"       # FAISS 위치별 문서 ID (마지막에 써서 완성 표시로 사용)
+INDEX_FILE = "index.faiss"
+
+
+# 스냅샷에 mmap 으로 열 수 있는 문서 저장소가 있는지 확인
+def has_mapped_docstore(directory):
+    return directory is not None and os.path.exists(os.path.join(directory, MAPPED_IDS_FILE))
+
+
+# 벡터 저장소의 문서를 mmap 으로 읽을 수 있는 형식으로 저장
+def write_mapped_docstore(directory, vectorstore):
+    ids = [vectorstore.index_to_docstore_id[i] for i in range(len(vectorstore.index_to_docstore_id))]
+    offsets = [0]
+    with open(os.path.join(directory, MAPPED_DOCS_FILE), "wb") as f:
+        for doc_id in ids:
+            doc = vectorstore.docstore.search(doc_id)
+            record = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False)
+            offsets.append(offsets[-1] + f.write(record.encode("utf-8")))
+    np.save(os.path.join(directory, MAPPED_OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(directory, MAPPED_IDS_FILE), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+
+
+# 여러 프로세스가 OS 페이지 캐시를 함께 쓰도록 mmap 으로 여는 읽기 전용 문서 저장소
+class MappedDocstore(Docstore):
+    def __init__(self, directory):
+        with open(os.path.join(directory, MAPPED_IDS_FILE), encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self.offsets = np.load(os.path.join(directory, MAPPED_OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(directory, MAPPED_DOCS_FILE), "rb") as f:
+            # 빈 파일은 mmap 할 수 없음
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, search):
+        position = self.positions.get(search)
+        if position is None:
+            return f"ID {search} not found."
+        record = json.loads(self._data[int(self.offsets[position]):int(self.offsets[position + 1])])
+        return Document(id=search, page_content=record["page_content"], metadata=record["metadata"])
+
+
+# 스냅샷 디렉토리의 FAISS 인덱스와 문서 저장소를 mmap 으로 열기 (읽기 전용)
+def open_mapped_vectorstore(directory, embeddings):
+    import faiss
+    index = faiss.read_index(os.path.join(directory, INDEX_FILE), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    docstore = MappedDocstore(directory)
+    return FAISS(embeddings, index, docstore, dict(enumerate(docstore.ids)))
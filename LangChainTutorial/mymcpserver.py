@@ -1,6 +1,61 @@
+from startup_profile import StartupProfile
+import sys
+import time
+import asyncio
+from pathlib import Path
+from typing import Optional
 from mcp.server import FastMCP
+from warmup import BackgroundTask
+from document_search import CallLatency, DocumentSearch
+
+# 시작 단계별 시간과 도구별 호출 시간 기록
+startup_profile = StartupProfile()
+latency = CallLatency()
+
+# 한 번에 돌려주는 검색 결과 수 / 질문 수 / 조각 본문 길이 제한 (전체 본문은 get_document 로)
+MAX_K = 20
+MAX_QUERIES = 32
+MAX_CHARS = 1500
+
+# MCP 클라이언트가 어디서 실행하든 이 폴더의 pdfs 를 사용 (인덱스와 캐시 저장 위치도 이 폴더 기준 절대 경로)
+PDF_DIR = Path(__file__).parent.absolute() / "pdfs"
 
 mcp = FastMCP("my_mcp_server")
+startup_profile.mark("모듈 import")
+
+
+# 디스크에 저장된 인덱스를 불러오고(바뀐 PDF만 임베딩) 첫 검색으로 인덱스와 임베딩 클라이언트를 미리 준비
+# 이후에는 pdfs 폴더를 감시하면서 새 인덱스 버전으로 교체 (도구 호출마다 인덱스를 만들지 않음)
+def load_document_search():
+    from chat_service import create_live_index
+    started = time.perf_counter()
+    search = DocumentSearch(create_live_index(str(PDF_DIR)))
+    startup_profile.record("인덱스 준비", time.perf_counter() - started)
+    started = time.perf_counter()
+    search.warm_up()
+    startup_profile.record("첫 검색 (워밍업)", time.perf_counter() - started)
+    startup_profile.mark("검색 준비 완료")
+    # 표준 출력은 MCP 프로토콜이 사용하므로 표준 에러에 기록
+    startup_profile.log_once(file=sys.stderr)
+    return search
+
+
+# 서버가 시작될 때 한 번만 백그라운드에서 준비 (준비 중에 들어온 호출은 끝날 때까지 기다림)
+# PDF 파싱 워커 프로세스가 이 파일을 __mp_main__ 으로 다시 불러올 때는 준비 작업을 시작하지 않음
+index_task = BackgroundTask(load_document_search, name="pdf-index") if __name__ != "__mp_main__" else None
+
+
+async def get_search():
+    return await asyncio.to_thread(index_task.result)
+
+
+def clamp_k(k):
+    return max(1, min(int(k), MAX_K))
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
 
 @mcp.tool()
 def add(a: int, b: int) -> int:
@@ -10,5 +65,43 @@ def add(a: int, b: int) -> int:
 def subtract(a: int, b: int) -> int:
     return a - b
 
+@mcp.tool(description="설문 문서에서 질문과 가까운 조각을 k 개까지 코사인 유사도 점수와 출처(파일, 쪽)와 함께 검색합니다. person 을 주면 그 사람의 문서에서만 찾습니다.")
+async def search_documents(query: str, k: int = 4, person: Optional[str] = None) -> dict:
+    started = time.perf_counter()
+    with latency.measure("search_documents"):
+        search = await get_search()
+        result = await asyncio.to_thread(search.search, query, clamp_k(k), person, MAX_CHARS)
+    return {**result, "index_version": search.version, "elapsed_ms": elapsed_ms(started)}
+
+@mcp.tool(description=f"여러 질문을 한 번에 검색합니다 (임베딩 요청과 인덱스 검색을 한 번씩만 수행, 최대 {MAX_QUERIES}개). 질문마다 search_documents 와 같은 형식의 결과를 돌려줍니다.")
+async def search_documents_batch(queries: list[str], k: int = 4, person: Optional[str] = None) -> dict:
+    started = time.perf_counter()
+    with latency.measure("search_documents_batch"):
+        if not queries or len(queries) > MAX_QUERIES:
+            raise ValueError(f"질문은 1개 이상 {MAX_QUERIES}개 이하여야 합니다")
+        search = await get_search()
+        results = await asyncio.to_thread(search.search_many, queries, clamp_k(k), person, MAX_CHARS)
+    return {"results": results, "index_version": search.version, "elapsed_ms": elapsed_ms(started)}
+
+@mcp.tool(description="검색 결과의 id 로 문서 조각 하나의 전체 본문과 출처를 가져옵니다.")
+async def get_document(id: str) -> dict:
+    started = time.perf_counter()
+    with latency.measure("get_document"):
+        search = await get_search()
+        record = await asyncio.to_thread(search.get, id)
+        if record is None:
+            raise ValueError(f"문서가 없습니다: {id}")
+    return {**record, "index_version": search.version, "elapsed_ms": elapsed_ms(started)}
+
+@mcp.tool(description="서버 시작 단계별 시간과 도구별 호출 시간(횟수, 평균, 중앙값, p95, 최대)을 보여 줍니다.")
+async def latency_report() -> dict:
+    search = index_task.get()
+    return {
+        "index": index_task.status,
+        "index_version": search.version if search is not None else None,
+        "startup_ms": {stage: round(seconds * 1000, 1) for stage, seconds in startup_profile.report()},
+        "calls": latency.report(),
+    }
+
 if __name__ == "__main__":
-    mcp.run()
\ No newline at end of file
+    mcp.run()
@@ -0,0 +1,122 @@
+import os
+import re
+import unicodedata
+import numpy as np
+from langchain_core.documents import Document
+
+# 설문지 파일 이름에 공통으로 들어가는 단어 (사람 이름이 아님)
+TEMPLATE_WORDS = {"dna", "탐험", "설문지", "설문"}
+NAME = re.compile(r"^[가-힣]{2,4}$")
+
+
+# 파일 이름에서 사람 이름 추출 (예: "DNA_탐험_설문지_박수현.pdf" -> "박수현", 이름이 없으면 None)
+def person_from_filename(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for word in re.split(r"[\s_\-]+", unicodedata.normalize("NFC", stem)):
+        if word.lower() not in TEMPLATE_WORDS and NAME.match(word):
+            return word
+    return None
+
+
+# 질문에 나오는 사람 이름 찾기 (여러 명이면 가장 긴 이름, 없으면 None)
+def find_person(query, persons):
+    query = unicodedata.normalize("NFC", query)
+    matches = [person for person in persons if person in query]
+    return max(matches, key=len) if matches else None
+
+
+# 사람별 벡터 위치 목록 (한 사람으로 범위가 정해진 질문은 그 사람의 벡터만 꺼내서 비교)
+# 사람별 벡터는 처음 검색할 때 한 번만 복원해 두고 스냅샷이 교체되면 이 객체와 함께 버림
+class PersonPartitions:
+    def __init__(self, vectorstore):
+        self.vectorstore = vectorstore
+        self.positions = {}  # 문서 ID -> FAISS 위치 (검색된 청크의 벡터를 다시 꺼낼 때 사용)
+        members = {}  # 사람 -> [(FAISS 위치, 문서 ID)]
+        for position, doc_id in vectorstore.index_to_docstore_id.items():
+            self.positions[doc_id] = position
+            doc = vectorstore.docstore.search(doc_id)
+            if not isinstance(doc, Document):
+                continue
+            # 중복 제거로 합쳐진 청크는 같은 내용이 있던 모든 사람의 분할에 포함
+            persons = {doc.metadata.get("person")}
+            persons.update(source.get("person") for source in doc.metadata.get("duplicate_sources", []))
+            for person in persons:
+                if person:
+                    members.setdefault(person, []).append((position, doc_id))
+
+        self.partitions = {}  # 사람 -> (FAISS 위치 배열, [문서 ID])
+        self._members = {}  # 사람 -> (복원한 벡터, 벡터 제곱 노름), 복원할 수 없는 인덱스면 None
+        for person, items in members.items():
+            positions = np.array([position for position, _ in items], dtype=np.int64)
+            self.partitions[person] = (positions, [doc_id for _, doc_id in items])
+
+    @property
+    def persons(self):
+        return sorted(self.partitions)
+
+    def __contains__(self, person):
+        return person in self.partitions
+
+    def ids(self, person):
+        return set(self.partitions[person][1])
+
+    # 한 사람의 벡터 중에서만 질문과 가까운 청크 검색
+    def search(self, person, query, k=4):
+        return self.search_by_vector(person, self.vectorstore._embed_query(query), k)
+
+    def search_by_vector(self, person, vector, k=4):
+        vector = np.array(vector, dtype=np.float32)
+        if self.vectorstore._normalize_L2:
+            vector = vector / np.linalg.norm(vector)
+        docs = []
+        for doc_id, _ in self.search_many_by_vector(person, vector[None, :], k)[0]:
+            doc = self.vectorstore.docstore.search(doc_id)
+            docs.append(Document(id=doc_id, page_content=doc.page_content, metadata=doc.metadata))
+        return docs
+
+    # 한 사람의 벡터와 제곱 노름 (direct map 이 없는 IVF 처럼 벡터를 꺼낼 수 없으면 None)
+    def _member_vectors(self, person):
+        if person not in self._members:
+            try:
+                members = self.vectorstore.index.reconstruct_batch(self.partitions[person][0])
+                self._members[person] = (members, (members ** 2).sum(axis=1))
+            except RuntimeError:
+                self._members[person] = None
+        return self._members[person]
+
+    # 여러 질문 벡터를 한 사람의 벡터와 한 번에 비교 -> 질문마다 가까운 순서의 [(문서 ID, FAISS 점수)]
+    # 점수는 index.search 와 같은 기준 (L2 는 거리 제곱, 내적 인덱스는 내적)
+    def search_many_by_vector(self, person, vectors, k=4):
+        import faiss
+        positions, doc_ids = self.partitions[person]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        cached = self._member_vectors(person)
+        if cached is None:
+            return self._search_index(person, vectors, k)
+        members, member_norms = cached
+        products = vectors @ members.T
+        if self.vectorstore.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            order = np.argsort(-products, axis=1)[:, :k]
+            scores = products
+        else:
+            scores = (vectors ** 2).sum(axis=1)[:, None] + member_norms[None, :] - 2 * products
+            order = np.argsort(scores, axis=1)[:, :k]
+        return [[(doc_ids[i], float(scores[row, i])) for i in order[row]] for row in range(len(vectors))]
+
+    # 벡터를 꺼낼 수 없는 인덱스는 전체 인덱스를 검색해서 그 사람의 청크만 남김
+    # (k 개가 모일 때까지 검색 범위를 두 배씩 넓힘)
+    def _search_index(self, person, vectors, k):
+        index = self.vectorstore.index
+        members = set(self.partitions[person][0].tolist())
+        wanted = min(k, len(members))
+        fetch_k = min(index.ntotal, 4 * k)
+        while True:
+            raw, positions = index.search(vectors, fetch_k)
+            hits = [
+                [(int(p), float(d)) for p, d in zip(row_positions, row_raw) if p in members][:k]
+                for row_positions, row_raw in zip(positions, raw)
+            ]
+            if fetch_k >= index.ntotal or all(len(row) >= wanted for row in hits):
+                break
+            fetch_k = min(index.ntotal, fetch_k * 2)
+        return [[(self.vectorstore.index_to_docstore_id[p], d) for p, d in row] for row in hits]
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+INDEX_FILE = "index.json"
+
+
+# 파일을 임시 파일에 쓴 뒤 이름을 바꿔 원자적으로 저장
+def atomic_write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# (텍스트, 음성 모델, 목소리, 지시사항, 형식) 으로 주소가 정해지는 크기 제한 음성 캐시
+class SpeechCache:
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._index = self._load_index()
+
+    # 인덱스 읽기 (파일이 없어진 항목은 제외)
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_FILE), encoding="utf-8") as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return {key: entry for key, entry in index.items()
+                if os.path.exists(os.path.join(self.cache_dir, entry["file"]))}
+
+    def _save_index(self):
+        data = json.dumps(self._index, ensure_ascii=False).encode("utf-8")
+        atomic_write(os.path.join(self.cache_dir, INDEX_FILE), data)
+
+    # 캐시 키 생성
+    def key(self, text, voice_model, voice_type, voice_instructions, fmt="mp3"):
+        raw = json.dumps([text, voice_model, voice_type, voice_instructions or "", fmt], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # 캐시된 파일 경로 (없으면 None), 적중/미스 통계와 사용 순서는 바꾸지 않음 (기록 표시 등 존재 확인용)
+    def peek(self, key):
+        with self._lock:
+            return self._path(key)
+
+    # 합성 대신 캐시를 사용할 때의 파일 경로 (없으면 None), 적중/미스를 세고 최근 사용으로 표시
+    def get(self, key):
+        with self._lock:
+            path = self._path(key)
+            if path is None:
+                self.stats["misses"] += 1
+                return None
+            self._index[key]["last_access"] = time.time()
+            self.stats["hits"] += 1
+            return path
+
+    def _path(self, key):
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        path = os.path.join(self.cache_dir, entry["file"])
+        if not os.path.exists(path):
+            del self._index[key]
+            return None
+        return path
+
+    # 음성 데이터를 캐시에 저장하고 파일 경로 반환
+    def put(self, key, data, fmt="mp3"):
+        filename = f"{key}.{fmt}"
+        path = os.path.join(self.cache_dir, filename)
+        atomic_write(path, data)
+        with self._lock:
+            self._index[key] = {"file": filename, "size": len(data), "last_access": time.time()}
+            self._evict(keep=key)
+            self._save_index()
+        return path
+
+    # 전체 크기가 제한을 넘으면 가장 오래 사용하지 않은 파일부터 삭제
+    # 방금 저장한 파일(keep)은 호출한 쪽이 바로 사용하므로 지우지 않음
+    def _evict(self, keep=None):
+        total = sum(entry["size"] for entry in self._index.values())
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, entry["file"]))
+            except FileNotFoundError:
+                pass
+            total -= entry["size"]
+            del self._index[key]
+            self.stats["evictions"] += 1
+
+    # 캐시에 있으면 그 음성을, 없으면 합성해서 캐시에 넣은 뒤 음성 바이트 반환
+    def get_or_synthesize(self, text, synthesize, voice_model, voice_type, voice_instructions, fmt="mp3"):
+        key = self.key(text, voice_model, voice_type, voice_instructions, fmt)
+        path = self.get(key)
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                pass
+        data = synthesize(text, voice_model=voice_model, voice_type=voice_type, voice_instructions=voice_instructions)
+        self.put(key, data, fmt)
+        return data
+
+    # 캐시 상태 요약
+    def summary(self):
+        with self._lock:
+            return {
+                **self.stats,
+                "files": len(self._index),
+                "bytes": sum(entry["size"] for entry in self._index.values()),
+            }
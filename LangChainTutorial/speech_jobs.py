@@ -0,0 +1,86 @@
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+# 음성 합성 작업 상태
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+
+# 메시지 하나의 음성 합성 작업
+@dataclass
+class SpeechJob:
+    key: str
+    status: str = PENDING
+    path: str = None
+    error: str = None
+
+
+# 화면을 그리는 동안 기다리지 않도록 백그라운드 워커에서 음성을 합성해 캐시에 저장하는 작업 큐
+class SpeechJobQueue:
+    def __init__(self, cache, synthesize, max_workers=2):
+        # synthesize(text, voice_model, voice_type, voice_instructions) -> mp3 bytes
+        self.cache = cache
+        self.synthesize = synthesize
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speech-job")
+        self.jobs = {}  # 캐시 키 -> 생성 중이거나 실패한 작업
+        self.stats = {"submitted": 0, "coalesced": 0, "failed": 0}
+        self._cond = threading.Condition()
+
+    # 텍스트의 음성을 요청하고 현재 작업 상태 반환 (같은 내용의 작업이 이미 있으면 그 작업을 함께 사용)
+    def request(self, text, voice):
+        key = self.cache.key(text, **voice)
+        with self._cond:
+            job = self.jobs.get(key)
+            if job is not None:
+                if job.status == PENDING:
+                    self.stats["coalesced"] += 1
+                return job
+
+        path = self.cache.get(key)
+        if path is not None:
+            return SpeechJob(key, READY, path)
+
+        with self._cond:
+            job = self.jobs.get(key)
+            if job is not None:
+                return job
+            job = SpeechJob(key)
+            self.jobs[key] = job
+            self.stats["submitted"] += 1
+        self.pool.submit(self._run, job, text, voice)
+        return job
+
+    def _run(self, job, text, voice):
+        try:
+            path = self.cache.put(job.key, self.synthesize(text, **voice))
+        except Exception as e:
+            with self._cond:
+                job.status = FAILED
+                job.error = str(e)
+                self.stats["failed"] += 1
+                self._cond.notify_all()
+            return
+        with self._cond:
+            job.path = path
+            job.status = READY
+            # 완료된 작업은 캐시에서 찾을 수 있으므로 목록에서 제거
+            del self.jobs[job.key]
+            self._cond.notify_all()
+
+    # 실패한 작업을 지워서 다음 요청 때 다시 합성하도록 함
+    def retry(self, key):
+        with self._cond:
+            job = self.jobs.get(key)
+            if job is not None and job.status == FAILED:
+                del self.jobs[key]
+
+    # 주어진 작업이 모두 끝날 때까지 최대 timeout 초 기다리기 (모두 끝났으면 True)
+    def wait(self, jobs, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: all(job.status != PENDING for job in jobs), timeout)
+
+    def pending(self):
+        with self._cond:
+            return sum(1 for job in self.jobs.values() if job.status == PENDING)
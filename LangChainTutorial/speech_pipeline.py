@@ -0,0 +1,116 @@
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 문장 끝 (마침표/물음표/느낌표/말줄임표/물결, 전각 문장부호 포함) 뒤에 공백이 오거나 줄바꿈이 나오는 위치
+SENTENCE_END = re.compile(r"[.!?~…。！？]+[\"'”’)\]]*\s+|\n+")
+
+
+# 스트리밍되는 텍스트를 문장 단위로 잘라 주는 분할기
+class SentenceSplitter:
+    def __init__(self, min_chars=10):
+        # 너무 짧은 문장은 다음 문장과 합쳐서 TTS 요청 수를 줄임
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    # 새 텍스트 조각을 넣고 완성된 문장들을 돌려받기
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            sentence = self.buffer[start:match.end()].strip()
+            if len(sentence) >= self.min_chars:
+                sentences.append(sentence)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    # 남은 텍스트를 마지막 문장으로 내보내기
+    def flush(self):
+        sentence = self.buffer.strip()
+        self.buffer = ""
+        return [sentence] if sentence else []
+
+
+# 문장이 완성되는 대로 음성 합성을 동시에 요청하고, 순서대로 재생/저장하는 파이프라인
+class SpeechPipeline:
+    def __init__(self, synthesize, max_workers=3, min_chars=10):
+        # synthesize(text) -> mp3 bytes
+        self.synthesize = synthesize
+        self.splitter = SentenceSplitter(min_chars=min_chars)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.sentences = []
+        self.futures = []
+        self.closed = False
+        self.errors = []
+        self._cond = threading.Condition()
+        self._player = None
+        self.started = time.perf_counter()
+        self.time_to_first_audio = None  # 파이프라인 생성부터 첫 조각 재생 시작까지 걸린 시간
+
+    def _submit(self, sentence):
+        with self._cond:
+            self.sentences.append(sentence)
+            self.futures.append(self.pool.submit(self.synthesize, sentence))
+            self._cond.notify_all()
+
+    # LLM 응답 조각 넣기
+    def feed(self, text):
+        for sentence in self.splitter.feed(text):
+            self._submit(sentence)
+
+    # 응답이 끝났을 때 남은 텍스트까지 합성 요청
+    def close(self):
+        for sentence in self.splitter.flush():
+            self._submit(sentence)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self.pool.shutdown(wait=False)
+
+    # 합성된 음성 조각을 문장 순서대로 꺼내기 (뒤 문장이 아직 합성 중이어도 앞 문장부터 바로 반환)
+    def segments(self):
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.futures) and not self.closed:
+                    self._cond.wait()
+                if i >= len(self.futures):
+                    return
+                future = self.futures[i]
+            yield future.result()
+            i += 1
+
+    # 첫 조각이 준비되는 즉시 백그라운드에서 순서대로 재생 시작
+    def start_playback(self, play):
+        def run():
+            try:
+                for data in self.segments():
+                    if self.time_to_first_audio is None:
+                        self.time_to_first_audio = time.perf_counter() - self.started
+                    play(data)
+            except Exception as e:
+                self.errors.append(e)
+
+        self._player = threading.Thread(target=run, name="speech-playback", daemon=True)
+        self._player.start()
+        return self._player
+
+    # 모든 조각을 하나의 mp3 데이터로 이어 붙이기 (다시 듣기용 파일로 저장)
+    def audio(self):
+        data = b"".join(self.segments())
+        if not data:
+            raise Exception("음성 파일이 생성되지 않았습니다.")
+        return data
+
+
+# 스트리밍 응답을 그대로 전달하면서 음성 파이프라인에도 넣어 주는 제너레이터
+def speak_while_streaming(chunks, pipeline):
+    try:
+        for chunk in chunks:
+            pipeline.feed(chunk)
+            yield chunk
+    finally:
+        pipeline.close()
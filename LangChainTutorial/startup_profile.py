@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# 이 모듈을 처음 import 한 시각 (앱 스크립트 맨 앞에서 import 해서 첫 실행 시작 시각으로 사용)
+STARTED = time.perf_counter()
+
+# 첫 화면을 그리기 전에 import 하는 모듈 (가벼워야 함)
+EAGER_MODULES = [
+    "dotenv", "warmup", "speech_cache", "conversation_memory", "speech_jobs", "turn_tracing", "chat_pipeline",
+]
+# 백그라운드 준비 작업에서 import 하는 무거운 모듈
+DEFERRED_MODULES = [
+    "openai", "langchain_openai", "langchain.chains", "langchain_community.callbacks",
+    "vector_index", "embedding_cache", "index_store", "live_index", "answer_cache",
+    "chat_service", "chat_client", "chat_server",
+]
+
+# 기준보다 이만큼 이상 그리고 이 비율 이상 느려지면 회귀로 판단
+REGRESSION_MS = 50
+REGRESSION_RATIO = 0.2
+
+# 새 파이썬 프로세스에서 모듈을 순서대로 import 하면서 모듈별 추가 시간을 재는 코드
+PROBE = """
+import sys, json, time, importlib
+times = {}
+for name in sys.argv[1:]:
+    started = time.perf_counter()
+    importlib.import_module(name)
+    times[name] = (time.perf_counter() - started) * 1000
+print(json.dumps(times))
+"""
+
+
+# 앱 한 프로세스의 시작 단계별 시간 기록 (첫 실행 시작부터 걸린 시간)
+class StartupProfile:
+    def __init__(self):
+        self.marks = {}  # 단계 -> 초
+        self.logged = False
+
+    # 단계가 처음 끝난 시각 기록 (다시 실행될 때의 값은 무시)
+    def mark(self, stage):
+        self.marks.setdefault(stage, time.perf_counter() - STARTED)
+
+    # 백그라운드 작업처럼 따로 잰 시간 기록
+    def record(self, stage, seconds):
+        self.marks.setdefault(stage, seconds)
+
+    def report(self):
+        return sorted(self.marks.items(), key=lambda item: item[1])
+
+    def describe(self):
+        return "\n".join(f"{stage}: {seconds * 1000:.0f}ms" for stage, seconds in self.report())
+
+    # 모든 준비가 끝났을 때 서버 로그에 한 번만 출력 (표준 출력을 프로토콜로 쓰는 서버는 file=sys.stderr)
+    def log_once(self, file=None):
+        if not self.logged:
+            self.logged = True
+            print("[startup] " + " · ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in self.report()), file=file, flush=True)
+
+
+# 새 프로세스에서 모듈을 순서대로 import 했을 때 모듈별 시간 (여러 번 재서 가장 짧은 값, 밀리초)
+def measure_imports(modules, repeat=3):
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = {}
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE, *modules], cwd=here, capture_output=True, text=True, check=True
+        ).stdout
+        for name, ms in json.loads(output.splitlines()[-1]).items():
+            best[name] = min(best.get(name, ms), ms)
+    return best
+
+
+# 첫 화면 전 import 와 백그라운드 import 시간 측정
+def profile_imports(repeat=3):
+    times = measure_imports(["streamlit"] + EAGER_MODULES + DEFERRED_MODULES, repeat)
+    eager = {name: times[name] for name in EAGER_MODULES}
+    deferred = {name: times[name] for name in DEFERRED_MODULES}
+    return {
+        "streamlit": times["streamlit"],
+        "eager": eager,
+        "deferred": deferred,
+        "eager_total": sum(eager.values()),
+        "deferred_total": sum(deferred.values()),
+    }
+
+
+# 기준 결과보다 느려진 항목 목록
+def find_regressions(result, baseline):
+    regressions = []
+    for key in ("eager_total", "deferred_total"):
+        before, after = baseline[key], result[key]
+        if after - before > REGRESSION_MS and after > before * (1 + REGRESSION_RATIO):
+            regressions.append(f"{key}: {before:.0f}ms → {after:.0f}ms")
+    for group in ("eager", "deferred"):
+        for name, after in result[group].items():
+            before = baseline[group].get(name)
+            if before is not None and after - before > REGRESSION_MS and after > before * (1 + REGRESSION_RATIO):
+                regressions.append(f"{name}: {before:.0f}ms → {after:.0f}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="앱 시작 시 import 시간 측정 (첫 화면 전 / 백그라운드)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="결과를 저장할 JSON 파일 경로")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON (느려졌으면 종료 코드 1)")
+    args = parser.parse_args()
+
+    result = profile_imports(args.repeat)
+    print(f"streamlit (실행 전에 이미 import 됨): {result['streamlit']:.0f}ms")
+    for title, group, total in [("첫 화면 전 import", "eager", "eager_total"),
+                                ("백그라운드 import", "deferred", "deferred_total")]:
+        print(f"\n{title}: {result[total]:.0f}ms")
+        for name, ms in sorted(result[group].items(), key=lambda item: item[1], reverse=True):
+            print(f"  {name:<32} {ms:7.1f}ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(result, json.load(f))
+        if regressions:
+            print("\n⚠️ 시작 시간 회귀:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n기준 대비 회귀 없음")
+
+
+if __name__ == "__main__":
+    main()
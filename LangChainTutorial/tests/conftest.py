@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 모듈이 LangChainTutorial 폴더에 바로 있으므로 (패키지가 아님) import 경로에 추가
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
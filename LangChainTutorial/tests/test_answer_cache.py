@@ -0,0 +1,66 @@
+from langchain_core.embeddings import Embeddings
+from answer_cache import AnswerCache, EXACT_HIT, SEMANTIC_HIT, answer_namespace, conversation_digest, question_person
+
+PERSONS = ["차수민", "박수현", "김나현"]
+
+
+# 사람 이름을 지운 문장으로 임베딩을 만드는 대역 (이름만 다른 질문은 코사인 유사도가 1)
+class NameBlindEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        for person in PERSONS:
+            text = text.replace(person, "")
+        return [float(text.count(ch)) for ch in "어떤사람이야취미는?"] + [1.0]
+
+
+def namespace(question, person=None):
+    return answer_namespace("gpt-4.1-nano", 0.7, 1, "single", question_person(question, person, PERSONS), "")
+
+
+def test_question_person_uses_the_scope_or_the_name_in_the_question():
+    assert question_person("차수민은 어떤 사람이야?", None, PERSONS) == "차수민"
+    assert question_person("차수민은 어떤 사람이야?", "김나현", PERSONS) == "김나현"
+    assert question_person("오늘 날씨는?", None, PERSONS) is None
+
+
+def test_exact_and_semantic_hits_within_a_namespace():
+    cache = AnswerCache(NameBlindEmbeddings(), similarity_threshold=0.92)
+    question = "차수민은 어떤 사람이야?"
+    cache.put(question, "차수민은 ...", namespace(question), ["차수민.pdf 1쪽"])
+    exact = cache.get("  차수민은 어떤 사람이야? ", namespace(question))
+    assert exact.kind == EXACT_HIT and exact.sources == ["차수민.pdf 1쪽"]
+    similar = cache.get("차수민은 어떤 사람이야??", namespace("차수민은 어떤 사람이야??"))
+    assert similar.kind == SEMANTIC_HIT
+
+
+def test_near_identical_questions_about_different_people_do_not_share_answers():
+    cache = AnswerCache(NameBlindEmbeddings(), similarity_threshold=0.92)
+    # 사람 이름이 구역에 없으면 이름만 다른 질문이 유사 질문으로 적중함
+    unscoped = answer_namespace("gpt-4.1-nano", 0.7, 1, "single", None, "")
+    cache.put("차수민은 어떤 사람이야?", "차수민은 ...", unscoped)
+    assert cache.get("박수현은 어떤 사람이야?", unscoped).kind == SEMANTIC_HIT
+
+    cache.put("차수민은 어떤 사람이야?", "차수민은 ...", namespace("차수민은 어떤 사람이야?"))
+    assert cache.get("박수현은 어떤 사람이야?", namespace("박수현은 어떤 사람이야?")) is None
+    assert cache.get("차수민은 어떤 사람이야??", namespace("차수민은 어떤 사람이야??")).answer == "차수민은 ..."
+
+
+def test_index_version_change_invalidates_answers():
+    cache = AnswerCache(NameBlindEmbeddings())
+    cache.put("차수민의 취미는?", "독서", answer_namespace("gpt-4.1-nano", 0, 1))
+    assert cache.get("차수민의 취미는?", answer_namespace("gpt-4.1-nano", 0, 2)) is None
+
+
+def test_follow_up_questions_are_scoped_by_the_conversation():
+    cache = AnswerCache(NameBlindEmbeddings())
+    first = [{"role": "user", "content": "차수민은 어떤 사람이야?"}, {"role": "assistant", "content": "차수민은 ..."}]
+    second = [{"role": "user", "content": "박수현은 어떤 사람이야?"}, {"role": "assistant", "content": "박수현은 ..."}]
+    assert conversation_digest([]) is None
+    assert conversation_digest(first) == conversation_digest([dict(m) for m in first])
+
+    question = "그 사람 취미는?"
+    cache.put(question, "독서", namespace(question) + (conversation_digest(first),))
+    assert cache.get(question, namespace(question) + (conversation_digest(second),)) is None
+    assert cache.get(question, namespace(question) + (conversation_digest(first),)).answer == "독서"
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+import context_packing
+import conversation_memory
+from context_packing import CHUNK_OVERHEAD_TOKENS, ContextPacker, merge_adjacent, mmr_select, overlap_length, pack_to_budget
+
+
+# 글자 하나를 토큰 하나로 세는 인코딩 (네트워크에서 tiktoken 인코딩을 받지 않도록)
+class CharEncoding:
+    name = "chars"
+
+    def encode(self, text):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def char_tokens(monkeypatch):
+    monkeypatch.setattr(conversation_memory, "get_encoding", lambda model: CharEncoding())
+    monkeypatch.setattr(context_packing, "get_encoding", lambda model: CharEncoding())
+
+
+def doc(doc_id, text="내용", **metadata):
+    return Document(id=doc_id, page_content=text, metadata=metadata)
+
+
+def test_mmr_skips_a_near_copy_of_the_first_pick():
+    vectors = np.array([[1.0, 0.0], [0.99, 0.14], [0.6, 0.8]], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    relevance = np.array([0.9, 0.89, 0.6], dtype=np.float32)
+    assert mmr_select(relevance, vectors, k=2, lambda_mult=0.5) == [0, 2]
+    assert mmr_select(relevance, vectors, k=2, lambda_mult=1.0) == [0, 1]
+    assert mmr_select(relevance, vectors, k=2, first=2)[0] == 2
+
+
+def test_adjacent_chunks_are_merged_with_the_overlap_written_once():
+    assert overlap_length("가나다라마", "라마바사") == 2
+    merged = merge_adjacent([
+        doc("f1-1", "라마바사"), doc("other", "별개"), doc("f1-0", "가나다라마"), doc("f1-3", "아자차"),
+    ])
+    assert [d.id for d in merged] == ["f1-0", "other", "f1-3"]
+    assert merged[0].page_content == "가나다라마바사"
+    assert merged[0].metadata["merged_ids"] == ["f1-0", "f1-1"]
+
+
+def test_budget_keeps_whole_chunks_and_truncates_only_an_oversized_first_chunk():
+    docs = [doc("a", "가" * 30), doc("b", "나" * 30), doc("c", "다" * 5)]
+    packed = pack_to_budget(docs, max_tokens=2 * (30 + CHUNK_OVERHEAD_TOKENS), model="m")
+    assert [d.id for d in packed] == ["a", "b"]
+    packed = pack_to_budget(docs, max_tokens=60, model="m")
+    assert [d.id for d in packed] == ["a", "c"]
+    packed = pack_to_budget([doc("big", "라" * 100)], max_tokens=40, model="m")
+    assert packed[0].page_content == "라" * (40 - CHUNK_OVERHEAD_TOKENS)
+
+
+def test_low_similarity_chunks_are_dropped_but_the_top_hit_is_kept():
+    packer = ContextPacker(k=4, min_similarity=0.5, max_tokens=1000, merge=False)
+    query = [1.0, 0.0]
+    docs = [doc("top"), doc("related"), doc("unrelated")]
+    vectors = [[0.1, 1.0], [0.9, 0.1], [0.0, 1.0]]
+    assert [d.id for d in packer.pack(query, docs, vectors)] == ["top", "related"]
+
+
+def test_without_vectors_the_first_k_candidates_are_used():
+    packer = ContextPacker(k=2, max_tokens=1000)
+    assert [d.id for d in packer.pack([1.0], [doc("a"), doc("b"), doc("c")])] == ["a", "b"]
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+import pytest
+import conversation_memory
+from conversation_memory import ConversationMemory
+
+
+# 글자 하나를 토큰 하나로 세는 인코딩 (네트워크에서 tiktoken 인코딩을 받지 않도록)
+class CharEncoding:
+    name = "chars"
+
+    def encode(self, text):
+        return list(text)
+
+
+# 요약 요청을 기록하고, fail 이 True 이면 예외를 내는 OpenAI 클라이언트 대역
+class SummaryClient:
+    def __init__(self):
+        self.fail = False
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs["messages"][-1]["content"])
+        if self.fail:
+            raise RuntimeError("summary unavailable")
+        return SimpleNamespace(
+            usage=None,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=f"요약{len(self.requests)}"))]
+        )
+
+
+@pytest.fixture(autouse=True)
+def char_tokens(monkeypatch):
+    monkeypatch.setattr(conversation_memory, "get_encoding", lambda model: CharEncoding())
+
+
+def conversation(turns):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"질문{i}"})
+        messages.append({"role": "assistant", "content": f"답변{i}"})
+    return messages
+
+
+def test_old_turns_are_folded_into_the_summary():
+    client = SummaryClient()
+    memory = ConversationMemory(client, keep_turns=2)
+    messages = conversation(4) + [{"role": "user", "content": "질문4"}]
+    window = memory.window(messages, "gpt-4.1-nano")
+    assert [m["content"] for m in window] == ["질문3", "답변3", "질문4"]
+    assert memory.summarized_count == 6
+    assert memory.summary == "요약1"
+    assert "질문0" in client.requests[0] and "답변2" in client.requests[0]
+
+
+def test_failed_summary_keeps_turns_in_the_window_and_retries():
+    client = SummaryClient()
+    client.fail = True
+    memory = ConversationMemory(client, keep_turns=2)
+    messages = conversation(4) + [{"role": "user", "content": "질문4"}]
+    window = memory.window(messages, "gpt-4.1-nano")
+    assert window == messages
+    assert memory.summarized_count == 0
+    assert memory.summary == ""
+    assert memory.last_error is not None
+
+    client.fail = False
+    messages += [{"role": "assistant", "content": "답변4"}, {"role": "user", "content": "질문5"}]
+    window = memory.window(messages, "gpt-4.1-nano")
+    assert [m["content"] for m in window] == ["질문4", "답변4", "질문5"]
+    assert memory.summarized_count == 8
+    assert "질문0" in client.requests[-1]
+    assert memory.last_error is None
+
+
+def test_failed_summary_window_stays_within_budget(monkeypatch):
+    monkeypatch.setitem(conversation_memory.HISTORY_TOKEN_BUDGETS, "tiny", 40)
+    client = SummaryClient()
+    client.fail = True
+    memory = ConversationMemory(client, keep_turns=1)
+    messages = conversation(6) + [{"role": "user", "content": "질문6"}]
+    window = memory.window(messages, "tiny")
+    # 메시지 하나는 글자 3개 + 역할 표시 4토큰이므로 예산 40 에는 5개까지 들어가고, 창은 사용자 메시지부터 시작
+    assert [m["content"] for m in window] == ["질문4", "답변4", "질문5", "답변5", "질문6"]
+    assert memory.summarized_count == 0
@@ -0,0 +1,93 @@
+import shutil
+import hashlib
+import unicodedata
+from pathlib import Path
+import numpy as np
+from langchain_core.embeddings import Embeddings
+import index_store
+from dedup import NearDuplicateIndex, SIMHASH_BITS, simhash
+from index_store import PDFIndexStore
+
+PDF_DIR = Path(__file__).resolve().parent.parent / "pdfs"
+
+
+def distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+# 한 비트씩 떨어진 위치(구간마다 하나씩)를 뒤집은 값
+def flip(value, count):
+    for i in range(count):
+        value ^= 1 << (i * SIMHASH_BITS // 4 + 1)
+    return value
+
+
+class HashEmbeddings(Embeddings):
+    model = "hash"
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(8).tolist()
+
+
+def test_simhash_ignores_whitespace_and_unicode_form():
+    text = "취미는 독서와 등산입니다."
+    assert simhash(text) == simhash(unicodedata.normalize("NFD", "  취미는   독서와\n등산입니다. "))
+
+
+def test_small_edits_stay_close_and_different_text_does_not():
+    base = "저는 주말마다 친구들과 등산을 하고, 평일 저녁에는 책을 읽거나 영화를 봅니다. " * 4
+    edited = base.replace("영화를", "연극을", 1)
+    other = "가장 좋아하는 음식은 김치찌개이고, 여행을 가면 바다가 보이는 곳에 머무릅니다. " * 4
+    assert distance(simhash(base), simhash(edited)) < distance(simhash(base), simhash(other))
+    assert distance(simhash(base), simhash(other)) > 3
+
+
+def test_index_matches_up_to_max_distance():
+    index = NearDuplicateIndex(max_distance=3)
+    value = simhash("설문 답변 청크")
+    index.add("a", value)
+    assert index.find(value) == "a"
+    assert index.find(flip(value, 3)) == "a"
+    assert index.find(flip(value, 4)) is None
+
+
+def test_delete_and_save_load(tmp_path):
+    index = NearDuplicateIndex(max_distance=3)
+    index.add("a", simhash("첫 번째 청크"))
+    index.add("b", simhash("두 번째 청크의 내용"))
+    index.delete(["a"])
+    assert index.find(simhash("첫 번째 청크")) is None
+    index.save(tmp_path)
+    loaded = NearDuplicateIndex.load(tmp_path)
+    assert len(loaded) == 1
+    assert loaded.find(simhash("두 번째 청크의 내용")) == "b"
+
+
+def test_copied_pdf_is_stored_once_with_both_sources(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_store, "count_tokens", len)
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    shutil.copy(PDF_DIR / "김나현.pdf", pdf_dir / "김나현.pdf")
+    shutil.copy(PDF_DIR / "김나현.pdf", pdf_dir / "김나현_사본.pdf")
+    store = PDFIndexStore(str(pdf_dir), HashEmbeddings(), store_root=str(tmp_path / "index"), max_workers=1)
+    vectorstore = store.sync()
+
+    report = store.last_dedup_report
+    assert report.chunks == 2 * len(vectorstore.index_to_docstore_id)
+    assert report.duplicates == report.chunks // 2
+    files = store.load_manifest()["files"]
+    assert sum(len(entry["duplicates"]) for entry in files.values()) == report.duplicates
+    for doc_id in vectorstore.index_to_docstore_id.values():
+        metadata = vectorstore.docstore.search(doc_id).metadata
+        sources = [metadata["source"]] + [s["source"] for s in metadata["duplicate_sources"]]
+        assert sorted(Path(source).name for source in sources) == ["김나현.pdf", "김나현_사본.pdf"]
+
+    # 사본을 지우면 대표 청크에서 사본의 출처도 빠짐
+    (pdf_dir / "김나현_사본.pdf").unlink()
+    vectorstore = store.sync()
+    for doc_id in vectorstore.index_to_docstore_id.values():
+        assert vectorstore.docstore.search(doc_id).metadata.get("duplicate_sources", []) == []
@@ -0,0 +1,74 @@
+import unicodedata
+from langchain_core.embeddings import Embeddings
+from embedding_cache import CachedEmbeddings, normalize_text
+
+
+# 요청마다 받은 텍스트를 기록하는 임베딩 (텍스트 길이로 만든 결정적인 벡터)
+class RecordingEmbeddings(Embeddings):
+    def __init__(self, model="fake-embedding"):
+        self.model = model
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def make_cache(tmp_path, inner=None, **kwargs):
+    return CachedEmbeddings(inner or RecordingEmbeddings(), cache_path=str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_second_call_is_served_from_cache(tmp_path):
+    inner = RecordingEmbeddings()
+    cache = make_cache(tmp_path, inner)
+    first = cache.embed_documents(["가나다", "라마"])
+    second = cache.embed_documents(["라마", "가나다"])
+    assert second == [first[1], first[0]]
+    assert len(inner.calls) == 1
+    assert cache.stats == {"hits": 2, "misses": 2, "api_calls": 1}
+
+
+def test_duplicate_texts_in_one_call_are_embedded_once(tmp_path):
+    inner = RecordingEmbeddings()
+    cache = make_cache(tmp_path, inner)
+    vectors = cache.embed_documents(["같은 청크", "같은 청크", "다른 청크"])
+    assert inner.calls == [["같은 청크", "다른 청크"]]
+    assert vectors[0] == vectors[1]
+
+
+def test_normalized_text_shares_a_cache_key(tmp_path):
+    cache = make_cache(tmp_path)
+    decomposed = unicodedata.normalize("NFD", "  한글   문장\n")
+    assert normalize_text(decomposed) == "한글 문장"
+    assert cache.cache_key(decomposed) == cache.cache_key("한글 문장")
+
+
+def test_model_and_dimensions_are_part_of_the_key(tmp_path):
+    small = make_cache(tmp_path, RecordingEmbeddings("model-a"))
+    large = make_cache(tmp_path, RecordingEmbeddings("model-b"))
+    assert small.cache_key("청크") != large.cache_key("청크")
+
+
+def test_misses_are_split_by_count_and_size(tmp_path):
+    inner = RecordingEmbeddings()
+    cache = make_cache(tmp_path, inner, batch_size=2, max_batch_chars=10, max_concurrency=1)
+    cache.embed_documents(["a", "b", "c", "0123456789", "d"])
+    assert inner.calls == [["a", "b"], ["c"], ["0123456789"], ["d"]]
+    assert cache.stats["api_calls"] == 4
+
+
+def test_vectors_persist_across_instances(tmp_path):
+    make_cache(tmp_path).embed_documents(["저장된 청크"])
+    inner = RecordingEmbeddings()
+    reopened = make_cache(tmp_path, inner)
+    assert reopened.embed_query("저장된 청크") == [6.0, 1.0, 0.5]
+    assert inner.calls == []
+
+
+def test_float16_storage_round_trips_approximately(tmp_path):
+    cache = make_cache(tmp_path, dtype="float16")
+    cache.embed_documents(["abc"])
+    assert cache._lookup([cache.cache_key("abc")])[cache.cache_key("abc")] == [3.0, 1.0, 0.5]
@@ -0,0 +1,78 @@
+import hashlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from keyword_index import HybridRetriever, KeywordIndex, keyword_text, reciprocal_rank_fusion, tokenize
+
+
+# 텍스트 해시로 만든 결정적인 임베딩 (의미와 무관하므로 키워드 검색의 효과만 드러남)
+class HashEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).standard_normal(16)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def test_hangul_words_become_bigrams_and_latin_words_stay_whole():
+    assert tokenize("차수민의 GPT-4 취미") == ["차수", "수민", "민의", "gpt", "4", "취미"]
+    assert tokenize("나") == ["나"]
+
+
+def test_name_with_a_different_particle_still_matches():
+    index = KeywordIndex()
+    index.add(["a", "b"], ["차수민은 독서를 좋아합니다", "박수현은 등산을 좋아합니다"])
+    assert index.search("차수민의 취미", k=2)[0][0] == "a"
+
+
+def test_file_name_is_indexed_with_the_chunk():
+    text = keyword_text("취미: 독서", {"source": "pdfs/DNA_탐험_설문지_박수현.pdf",
+                                     "duplicate_sources": [{"source": "pdfs/김나현.pdf"}]})
+    assert text.splitlines() == ["DNA_탐험_설문지_박수현", "김나현", "취미: 독서"]
+    index = KeywordIndex()
+    index.add(["a", "b"], [text, keyword_text("취미: 등산", {"source": "pdfs/차수민.pdf"})])
+    assert [doc_id for doc_id, _ in index.search("박수현")] == ["a"]
+    assert [doc_id for doc_id, _ in index.search("김나현")] == ["a"]
+
+
+def test_allowed_limits_scoring_to_a_partition():
+    index = KeywordIndex()
+    index.add(["a", "b"], ["취미는 독서", "취미는 등산"])
+    assert [doc_id for doc_id, _ in index.search("취미", allowed={"b"})] == ["b"]
+
+
+def test_delete_and_re_add_keep_statistics_consistent(tmp_path):
+    index = KeywordIndex()
+    index.add(["a", "b"], ["차수민 독서", "박수현 등산"])
+    index.delete(["a"])
+    assert index.search("차수민") == []
+    assert index.total_length == sum(index.doc_lengths.values())
+    index.add(["b"], ["박수현 요리"])
+    index.save(tmp_path)
+    loaded = KeywordIndex.load(tmp_path)
+    assert len(loaded) == 1
+    assert loaded.search("요리") == index.search("요리")
+    assert loaded.search("등산") == []
+
+
+def test_rrf_rewards_documents_found_by_both_rankings():
+    fused = reciprocal_rank_fusion([["k1", "both"], ["d1", "both"]], rrf_k=60)
+    assert fused[0][0] == "both"
+    assert fused[0][1] == 2 / 62
+    # 점수가 같으면 먼저 넣은 순위 목록(키워드)의 문서가 앞에 옴
+    assert [doc_id for doc_id, _ in fused[1:]] == ["k1", "d1"]
+
+
+def test_hybrid_retriever_puts_the_named_persons_chunk_first():
+    texts = [f"{name}의 설문 답변: 취미와 특기" for name in ["김나현", "박수현", "차수민", "이여진", "오시현"]]
+    ids = [f"doc-{i}" for i in range(len(texts))]
+    vectorstore = FAISS.from_texts(texts, HashEmbeddings(), ids=ids)
+    keyword_index = KeywordIndex()
+    keyword_index.add(ids, texts)
+    retriever = HybridRetriever(vectorstore=vectorstore, keyword_index=keyword_index, k=4, fetch_k=5)
+    docs = retriever.invoke("차수민은 어떤 취미가 있어?")
+    assert docs[0].id == "doc-2"
+    # 키워드 결과와 벡터 결과가 모두 가리키는 청크가 있으면 한쪽에서만 나온 약한 청크는 잘림
+    assert len(docs) < 4
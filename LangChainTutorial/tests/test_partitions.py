@@ -0,0 +1,56 @@
+import hashlib
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from partitions import PersonPartitions
+
+
+# 텍스트 해시로 만든 결정적인 임베딩
+class HashEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).standard_normal(16)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def make_store():
+    persons = ["차수민", "박수현", "김나현"]
+    texts = [f"{persons[i % 3]}의 설문 답변 {i}" for i in range(30)]
+    metadatas = [{"person": persons[i % 3]} for i in range(30)]
+    return FAISS.from_texts(texts, HashEmbeddings(), metadatas=metadatas)
+
+
+def test_search_keeps_the_callers_vector_and_stays_in_the_partition():
+    store = make_store()
+    store._normalize_L2 = True
+    partitions = PersonPartitions(store)
+    vector = np.array(HashEmbeddings().embed_query("취미"), dtype=np.float32) * 3
+    before = vector.copy()
+    docs = partitions.search_by_vector("박수현", vector, k=4)
+    assert np.array_equal(vector, before)
+    assert len(docs) == 4
+    assert all(doc.metadata["person"] == "박수현" for doc in docs)
+
+
+def test_index_without_direct_map_falls_back_to_a_filtered_search():
+    store = make_store()
+    partitions = PersonPartitions(store)
+    vectors = np.array(HashEmbeddings().embed_documents(["취미", "전공"]), dtype=np.float32)
+    expected = partitions.search_many_by_vector("김나현", vectors, k=3)
+
+    flat = store.index.reconstruct_n(0, store.index.ntotal)
+    ivf = faiss.IndexIVFFlat(faiss.IndexFlatL2(flat.shape[1]), flat.shape[1], 2)
+    ivf.train(flat)
+    ivf.add(flat)
+    ivf.nprobe = 2
+    store.index = ivf
+    fallback = PersonPartitions(store)
+    found = fallback.search_many_by_vector("김나현", vectors, k=3)
+    assert fallback._members["김나현"] is None
+    assert [[doc_id for doc_id, _ in row] for row in found] == [[doc_id for doc_id, _ in row] for row in expected]
+    for row, expected_row in zip(found, expected):
+        assert np.allclose([score for _, score in row], [score for _, score in expected_row], atol=1e-4)
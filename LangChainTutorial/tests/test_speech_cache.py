@@ -0,0 +1,52 @@
+import os
+from speech_cache import SpeechCache
+
+VOICE = {"voice_model": "tts-1", "voice_type": "alloy", "voice_instructions": ""}
+
+
+def test_put_never_evicts_the_file_it_just_wrote(tmp_path):
+    cache = SpeechCache(tmp_path, max_bytes=10)
+    old = cache.put(cache.key("이전 문장", **VOICE), b"x" * 8)
+    new = cache.put(cache.key("긴 새 문장", **VOICE), b"y" * 12)
+    assert os.path.exists(new)
+    assert not os.path.exists(old)
+    assert cache.summary()["evictions"] == 1
+
+
+def test_least_recently_used_file_is_evicted_first(tmp_path):
+    cache = SpeechCache(tmp_path, max_bytes=10)
+    first = cache.key("첫 문장", **VOICE)
+    second = cache.key("둘째 문장", **VOICE)
+    cache.put(first, b"a" * 4)
+    cache.put(second, b"b" * 4)
+    cache._index[first]["last_access"] = 0
+    cache._index[second]["last_access"] = 1
+    assert cache.get(first) is not None
+    cache.put(cache.key("셋째 문장", **VOICE), b"c" * 4)
+    assert cache.peek(first) is not None
+    assert cache.peek(second) is None
+
+
+def test_peek_does_not_count_hits_or_refresh_order(tmp_path):
+    cache = SpeechCache(tmp_path)
+    key = cache.key("문장", **VOICE)
+    assert cache.peek(key) is None
+    cache.put(key, b"mp3")
+    last_access = cache._index[key]["last_access"]
+    assert cache.peek(key) is not None
+    assert cache._index[key]["last_access"] == last_access
+    assert cache.summary()["hits"] == 0 and cache.summary()["misses"] == 0
+
+
+def test_get_or_synthesize_counts_one_miss_then_hits(tmp_path):
+    cache = SpeechCache(tmp_path)
+    calls = []
+
+    def synthesize(text, **voice):
+        calls.append(text)
+        return b"mp3:" + text.encode()
+
+    assert cache.get_or_synthesize("안녕하세요", synthesize, **VOICE) == "mp3:안녕하세요".encode()
+    assert cache.get_or_synthesize("안녕하세요", synthesize, **VOICE) == "mp3:안녕하세요".encode()
+    assert calls == ["안녕하세요"]
+    assert cache.summary()["hits"] == 1 and cache.summary()["misses"] == 1
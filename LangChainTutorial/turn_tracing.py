@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# 단계별 지연 시간 히스토그램 구간 (초)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 스팬 속성 중 토큰 수로 집계할 항목
+TOKEN_ATTRS = ("prompt_tokens", "completion_tokens", "context_tokens")
+
+
+# 한 턴 안의 한 단계 (턴 시작부터의 시작 시각, 걸린 시간, 토큰/바이트 수 등)
+@dataclass
+class Span:
+    name: str
+    start: float
+    duration: float = 0.0
+    attrs: dict = field(default_factory=dict)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {"name": self.name, "start": round(self.start, 4), "duration": round(self.duration, 4), **self.attrs}
+
+
+# 한 턴의 단계별 기록 (음성 합성처럼 다른 스레드에서 끝나는 단계도 함께 기록)
+class TurnTrace:
+    def __init__(self, tracer, mode=None, **attrs):
+        self.tracer = tracer
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.spans = []
+        self.duration = None
+        self._lock = threading.Lock()
+
+    def _add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    # 단계 하나의 시간 재기 (예외가 나면 error 속성을 남기고 그대로 다시 발생)
+    @contextmanager
+    def span(self, name, **attrs):
+        started = time.perf_counter()
+        span = Span(name, started - self.started, attrs=dict(attrs))
+        try:
+            yield span
+        except Exception as e:
+            span.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            self._add(span)
+
+    # 다른 곳에서 잰 단계 추가 (started 는 perf_counter 값, 없으면 지금에서 duration 만큼 전)
+    def add(self, name, duration, started=None, **attrs):
+        started = time.perf_counter() - duration if started is None else started
+        self._add(Span(name, started - self.started, duration, dict(attrs)))
+
+    # 턴을 끝내고 로그와 지표에 기록 (한 번만 기록)
+    def finish(self, **attrs):
+        if self.duration is not None:
+            return self.to_dict()
+        self.attrs.update(attrs)
+        self.duration = time.perf_counter() - self.started
+        record = self.to_dict()
+        self.tracer.record(record)
+        return record
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return {
+            "turn_id": self.turn_id,
+            "mode": self.mode,
+            "time": self.wall_started,
+            "duration": round(self.duration, 4) if self.duration is not None else None,
+            **self.attrs,
+            "spans": [span.to_dict() for span in spans],
+        }
+
+
+# Prometheus 레이블 표기 ({key="value",...})
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (
+        key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+# Prometheus 텍스트 형식으로 내보내는 카운터 / 히스토그램 모음 (외부 패키지 없이)
+class MetricsRegistry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = {}    # 이름 -> {레이블: 값}
+        self.histograms = {}  # 이름 -> {레이블: [구간별 개수..., 합계, 개수]}
+        self.help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            counts = series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_label_text(labels)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, counts in sorted(series.items()):
+                    for bound, count in zip(self.buckets, counts):
+                        lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {count}")
+                    lines.append(f"{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {counts[-1]}")
+                    lines.append(f"{name}_sum{_label_text(labels)} {counts[-2]}")
+                    lines.append(f"{name}_count{_label_text(labels)} {counts[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+# 턴 기록을 JSON 한 줄 로그와 지표로 남기는 트레이서 (프로세스당 하나)
+# TRACE_LOG: 비어 있으면 표준 에러, "off" 면 로그 없음, 그 밖에는 로그 파일 경로
+class Tracer:
+    def __init__(self, log_target=None):
+        self.metrics = MetricsRegistry()
+        self.metrics.describe("chatbot_turns_total", "처리한 채팅 턴 수")
+        self.metrics.describe("chatbot_turn_duration_seconds", "채팅 턴 전체 시간")
+        self.metrics.describe("chatbot_stage_duration_seconds", "턴 단계별 시간")
+        self.metrics.describe("chatbot_tokens_total", "단계별 토큰 수")
+        self.metrics.describe("chatbot_bytes_total", "단계별로 주고받거나 쓴 바이트 수")
+        self.metrics.describe("chatbot_cache_requests_total", "캐시 조회 결과")
+        self.metrics.describe("chatbot_errors_total", "단계별 오류 수")
+        self.logger = logging.getLogger("chatbot.trace")
+        target = os.getenv("TRACE_LOG", "") if log_target is None else log_target
+        if target.lower() == "off":
+            self.logger.disabled = True
+        elif not self.logger.handlers:
+            handler = logging.FileHandler(target, encoding="utf-8") if target else logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+
+    def start_turn(self, mode=None, **attrs):
+        return TurnTrace(self, mode, **attrs)
+
+    # 캐시 조회 결과 집계 (cache: answer / speech / embedding 등, hit: 적중 여부 또는 적중 종류)
+    def cache_result(self, cache, hit):
+        self.metrics.inc("chatbot_cache_requests_total", cache=cache, result=hit if isinstance(hit, str) else ("hit" if hit else "miss"))
+
+    def record(self, record):
+        mode = record.get("mode") or "none"
+        self.metrics.inc("chatbot_turns_total", mode=mode)
+        self.metrics.observe("chatbot_turn_duration_seconds", record["duration"], mode=mode)
+        if record.get("error"):
+            self.metrics.inc("chatbot_errors_total", stage="turn")
+        for span in record["spans"]:
+            stage = span["name"]
+            self.metrics.observe("chatbot_stage_duration_seconds", span["duration"], stage=stage)
+            for kind in TOKEN_ATTRS:
+                if span.get(kind):
+                    self.metrics.inc("chatbot_tokens_total", span[kind], stage=stage, kind=kind[:-len("_tokens")])
+            if span.get("bytes"):
+                self.metrics.inc("chatbot_bytes_total", span["bytes"], stage=stage)
+            if span.get("error"):
+                self.metrics.inc("chatbot_errors_total", stage=stage)
+        self.logger.info(json.dumps({"event": "chat_turn", **record}, ensure_ascii=False))
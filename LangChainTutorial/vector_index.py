@@ -0,0 +1,209 @@
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import Optional
+import numpy as np
+
+# FAISS 인덱스 종류
+INDEX_FLAT = "flat"      # 벡터를 그대로 저장하고 전부 비교 (정확하지만 벡터 수에 비례해서 느려짐)
+INDEX_IVF = "ivf"        # 벡터를 클러스터로 나누고 질문과 가까운 nprobe 개 클러스터만 비교
+INDEX_HNSW = "hnsw"      # 근접 그래프 탐색 (efSearch 로 정확도와 속도 조절)
+INDEX_IVF_PQ = "ivf_pq"  # IVF + 곱 양자화 (벡터 하나를 수십 바이트로 압축)
+INDEX_SQ = "sq"          # 차원마다 8비트 스칼라 양자화 (float32 의 1/4 크기)
+INDEX_TYPES = (INDEX_FLAT, INDEX_IVF, INDEX_HNSW, INDEX_IVF_PQ, INDEX_SQ)
+
+# 학습이 필요한 인덱스를 만들 최소 벡터 수 (이보다 적으면 Flat 사용)
+MIN_TRAIN_VECTORS = 128
+# k-means 가 클러스터 하나당 필요로 하는 학습 벡터 수
+POINTS_PER_CENTROID = 39
+
+# 검색 파라미터 후보 (작은 값부터 재현율 목표를 넘을 때까지 올림)
+NPROBE_CANDIDATES = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+EF_SEARCH_CANDIDATES = (16, 32, 64, 128, 256, 512, 1024)
+# 가장 큰 파라미터로도 목표에 못 미치면 (압축 손실 등) 그 재현율에서 이만큼 뺀 값을 목표로 사용
+RECALL_TOLERANCE = 0.01
+
+
+# 차원 축소 임베딩 설정 (EMBEDDING_DIMENSIONS 가 있으면 text-embedding-3 계열 모델의 dimensions 사용)
+def embedding_options(model=None):
+    options = {"model": model} if model else {}
+    dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+    if dimensions:
+        options["model"] = model or "text-embedding-3-small"
+        options["dimensions"] = int(dimensions)
+    return options
+
+
+# 만들 인덱스의 종류와 학습/튜닝 설정
+@dataclass(frozen=True)
+class IndexSpec:
+    kind: str = INDEX_FLAT
+    nlist: Optional[int] = None  # IVF 클러스터 수 (None 이면 벡터 수에 맞춰 자동)
+    hnsw_m: int = 32             # HNSW 노드당 이웃 수
+    pq_m: Optional[int] = None   # PQ 부분 벡터 수 (None 이면 8차원마다 1바이트)
+    pq_bits: int = 8
+    recall_target: float = 0.95  # 검색 파라미터 튜닝 시 맞출 recall@k
+    tune_k: int = 10
+    tune_queries: int = 200
+
+    def __post_init__(self):
+        if self.kind not in INDEX_TYPES:
+            raise ValueError(f"알 수 없는 인덱스 종류: {self.kind} ({', '.join(INDEX_TYPES)} 중 하나)")
+
+    # 인덱스 구조를 결정하는 설정 (저장 디렉토리 구분용, 튜닝 목표는 제외)
+    def config(self):
+        return {"kind": self.kind, "nlist": self.nlist, "hnsw_m": self.hnsw_m,
+                "pq_m": self.pq_m, "pq_bits": self.pq_bits}
+
+    # 환경 변수 FAISS_INDEX_TYPE, FAISS_RECALL_TARGET 로 설정
+    @classmethod
+    def from_env(cls):
+        return cls(
+            kind=os.getenv("FAISS_INDEX_TYPE", INDEX_FLAT).lower(),
+            recall_target=float(os.getenv("FAISS_RECALL_TARGET", "0.95"))
+        )
+
+
+# 만들어진 인덱스 정보 (매니페스트에 저장)
+@dataclass
+class IndexInfo:
+    factory: str
+    trained_on: int
+    param: Optional[str] = None   # 튜닝한 검색 파라미터 이름 (nprobe / efSearch)
+    value: Optional[int] = None
+    recall: Optional[float] = None
+    k: int = 10
+    bytes: int = 0
+    build_seconds: float = 0.0
+
+    def to_dict(self):
+        return asdict(self)
+
+    def describe(self):
+        text = f"{self.factory} · 벡터 {self.trained_on}개로 생성 · {self.bytes / 1024 / 1024:.1f}MB"
+        if self.param is not None:
+            text += f" · {self.param}={self.value}"
+        if self.recall is not None:
+            text += f" · recall@{self.k} {self.recall:.2f}"
+        return text
+
+
+# IVF 클러스터 수 (대략 4√n, 클러스터당 학습 벡터가 충분하도록 제한)
+def default_nlist(n):
+    return max(1, min(int(4 * np.sqrt(n)), n // POINTS_PER_CENTROID))
+
+
+# PQ 부분 벡터 수 (차원을 나누어떨어지게 하면서 8차원마다 1바이트에 가장 가까운 값)
+def default_pq_m(d):
+    for m in range(max(1, d // 8), 0, -1):
+        if d % m == 0:
+            return m
+    return 1
+
+
+# faiss.index_factory 에 넘길 인덱스 설명 문자열
+def factory_string(spec, n, d):
+    if spec.kind == INDEX_FLAT or n < MIN_TRAIN_VECTORS:
+        return "Flat"
+    nlist = spec.nlist or default_nlist(n)
+    if spec.kind == INDEX_IVF:
+        return f"IVF{nlist},Flat"
+    if spec.kind == INDEX_HNSW:
+        return f"HNSW{spec.hnsw_m}"
+    if spec.kind == INDEX_IVF_PQ:
+        # 학습 벡터가 적으면 코드북 크기를 줄임 (np: 오래 걸리는 polysemous 학습 생략)
+        bits = max(4, min(spec.pq_bits, int(np.log2(n / POINTS_PER_CENTROID))))
+        return f"IVF{nlist},PQ{spec.pq_m or default_pq_m(d)}x{bits}np"
+    return "SQ8"
+
+
+# 인덱스의 튜닝할 검색 파라미터 (이름, 후보 값, 설정 함수), 없으면 None
+def search_param(index):
+    import faiss
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None
+    if ivf is not None:
+        return "nprobe", [v for v in NPROBE_CANDIDATES if v < ivf.nlist] + [ivf.nlist], \
+            lambda value: setattr(ivf, "nprobe", value)
+    index = faiss.downcast_index(index)
+    if hasattr(index, "hnsw"):
+        return "efSearch", list(EF_SEARCH_CANDIDATES), lambda value: setattr(index.hnsw, "efSearch", value)
+    return None
+
+
+# 저장된 튜닝 결과를 인덱스에 다시 적용
+def apply_search_params(index, info):
+    param = search_param(index)
+    if param is not None and info is not None and info.get("value") is not None:
+        param[2](info["value"])
+
+
+# 정확한 이웃 중 인덱스가 찾은 비율 (recall@k)
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[f >= 0]) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+# 검색 결과에서 질문으로 쓴 벡터 자신을 빼고 k 개만 남기기
+def without_self(found, query_ids, k):
+    return np.array([[i for i in row if i != query_id][:k] for row, query_id in zip(found, query_ids)])
+
+
+# 재현율 목표를 넘는 가장 작은 검색 파라미터 찾기 (가장 큰 값으로도 못 넘으면 그 재현율에 가까운 값)
+# 저장된 벡터를 질문으로 쓰되 자기 자신은 빼고 비교 (처음 보는 질문과 비슷한 조건)
+def tune_index(index, vectors, spec, info, seed=0):
+    import faiss
+    k = min(spec.tune_k, len(vectors) - 1)
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(len(vectors), min(spec.tune_queries, len(vectors)), replace=False)
+    queries = vectors[query_ids]
+    exact = faiss.IndexFlat(vectors.shape[1], index.metric_type)
+    exact.add(vectors)
+    _, truth = exact.search(queries, k + 1)
+    truth = without_self(truth, query_ids, k)
+
+    def recall_with(value=None):
+        if value is not None:
+            apply(value)
+        _, found = index.search(queries, k + 1)
+        return recall_at_k(without_self(found, query_ids, k), truth)
+
+    info.k = k
+    param = search_param(index)
+    if param is None:
+        info.recall = recall_with()
+        return info
+    info.param, candidates, apply = param
+
+    target = min(spec.recall_target, recall_with(candidates[-1]) - RECALL_TOLERANCE)
+    for value in candidates:
+        info.value, info.recall = value, recall_with(value)
+        if info.recall >= target:
+            break
+    return info
+
+
+# 벡터로 인덱스를 만들고 학습/튜닝 (IVF 는 분할 검색용 reconstruct 가 되도록 direct map 유지)
+def build_index(vectors, spec, metric=None):
+    import faiss
+    started = time.perf_counter()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    factory = factory_string(spec, n, d)
+    index = faiss.index_factory(d, factory, faiss.METRIC_L2 if metric is None else metric)
+    if not index.is_trained:
+        index.train(vectors)
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except RuntimeError:
+        pass
+    index.add(vectors)
+
+    info = IndexInfo(factory=factory, trained_on=n)
+    if factory != "Flat":
+        tune_index(index, vectors, spec, info)
+    info.bytes = len(faiss.serialize_index(index))
+    info.build_seconds = time.perf_counter() - started
+    return index, info
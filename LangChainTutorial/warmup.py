@@ -0,0 +1,58 @@
+import time
+import threading
+
+# 백그라운드 준비 작업 상태
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+# 오래 걸리는 초기화(무거운 import, 인덱스 생성 등)를 백그라운드 스레드에서 실행하고 결과를 보관하는 작업
+class BackgroundTask:
+    def __init__(self, fn, *args, name=None, **kwargs):
+        self.name = name or fn.__name__
+        self.status = LOADING
+        self.value = None
+        self.error = None
+        self.started = time.perf_counter()
+        self.elapsed = None  # 끝날 때까지 걸린 시간 (끝나기 전에는 None)
+        self._done = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(fn, args, kwargs), name=f"warmup-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, fn, args, kwargs):
+        try:
+            self.value = fn(*args, **kwargs)
+            self.status = READY
+        except Exception as e:
+            self.error = e
+            self.status = FAILED
+        finally:
+            self.elapsed = time.perf_counter() - self.started
+            self._done.set()
+
+    @property
+    def ready(self):
+        return self.status == READY
+
+    # 지금까지 걸린 시간 (끝났으면 전체 시간)
+    def running_time(self):
+        return self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+
+    # 끝날 때까지 최대 timeout 초 기다리기 (끝났으면 True)
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    # 결과 가져오기 (끝날 때까지 기다리고, 실패했으면 그 예외를 다시 발생)
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"{self.name} 준비가 {timeout}초 안에 끝나지 않았습니다")
+        if self.status == FAILED:
+            raise self.error
+        return self.value
+
+    # 준비된 결과 (아직 준비 중이거나 실패했으면 None, 기다리지 않음)
+    def get(self):
+        return self.value if self.status == READY else None
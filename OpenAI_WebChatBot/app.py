@@ -1,12 +1,19 @@
 import streamlit as st
 from dotenv import load_dotenv
 import os
+from functools import partial
 from openai import OpenAI, BadRequestError
-import pygame
-import tempfile
-import time
-import hashlib
-from datetime import datetime
+import sys
+from pathlib import Path
+
+# LangChainTutorial 의 공용 채팅 모듈 사용
+sys.path.append(str(Path(__file__).resolve().parent.parent / "LangChainTutorial"))
+from chat_pipeline import TurnMetrics, build_messages, describe_metrics, stream_completion
+from speech_cache import SpeechCache
+from speech_pipeline import SpeechPipeline, speak_while_streaming
+from audio_player import AudioPlayer
+from conversation_memory import ConversationMemory, token_budget
+from speech_jobs import SpeechJobQueue, PENDING, READY
 
 # 환경 변수 로드
 load_dotenv()
@@ -14,9 +21,6 @@ load_dotenv()
 # OpenAI 클라이언트 초기화
 client = OpenAI()
 
-# pygame 초기화
-pygame.mixer.init()
-
 # 음성 파일 저장 디렉토리 생성
 os.makedirs("speech_files", exist_ok=True)
 
@@ -33,37 +37,58 @@ if "voice_type" not in st.session_state:
     st.session_state.voice_type = "alloy"
 if "voice_instructions" not in st.session_state:
     st.session_state.voice_instructions = ""
-if "current_speech" not in st.session_state:
-    st.session_state.current_speech = None
 
-# 음성 파일 경로 생성 함수
-def get_speech_file_path(message_content):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    content_hash = hashlib.md5(message_content.encode()).hexdigest()[:8]
-    return os.path.join("speech_files", f"speech_{timestamp}_{content_hash}.mp3")
+# 대화 메모리 초기화 (오래된 대화는 요약해서 토큰 예산 안에서 전달)
+if "memory" not in st.session_state:
+    st.session_state.memory = ConversationMemory(client)
 
-# 음성 생성 및 저장 함수
-def generate_and_save_speech(text, file_path):
+# 음성 합성 함수 (백그라운드 스레드에서도 호출할 수 있도록 음성 설정을 인자로 받고 mp3 바이트를 반환)
+def synthesize_speech(text, voice_model, voice_type, voice_instructions):
     with client.audio.speech.with_streaming_response.create(
-        model=st.session_state.voice_model,
-        voice=st.session_state.voice_type,
+        model=voice_model,
+        voice=voice_type,
         input=text,
-        instructions=st.session_state.voice_instructions if st.session_state.voice_instructions else None
+        instructions=voice_instructions if voice_instructions else None,
+        response_format="mp3"
     ) as response:
-        response.stream_to_file(file_path)
-    return file_path
+        return response.read()
+
+# 음성 캐시 초기화 (모든 세션이 함께 사용)
+@st.cache_resource
+def get_speech_cache():
+    return SpeechCache("speech_files")
+
+speech_cache = get_speech_cache()
+
+# 채팅 기록의 음성을 백그라운드에서 만드는 작업 큐 (모든 세션이 함께 사용)
+@st.cache_resource
+def get_speech_jobs():
+    return SpeechJobQueue(speech_cache, synthesize_speech)
+
+speech_jobs = get_speech_jobs()
+
+# 현재 음성 설정
+def current_voice_settings():
+    return {
+        "voice_model": st.session_state.voice_model,
+        "voice_type": st.session_state.voice_type,
+        "voice_instructions": st.session_state.voice_instructions,
+    }
+
+# 음성 파일 경로 가져오기 함수 (같은 텍스트와 음성 설정으로 만든 파일이 캐시에 없으면 None)
+def get_speech_file_path(message_content, voice):
+    return speech_cache.get(speech_cache.key(message_content, **voice))
+
+# 음성 플레이어 초기화 (프로세스당 하나의 재생 스레드, AUDIO_SINK=null 이면 소리 없이 동작)
+@st.cache_resource
+def get_audio_player():
+    return AudioPlayer()
+
+audio_player = get_audio_player()
 
-# 음성 재생 콜백 함수
+# 음성 재생 콜백 함수 (재생 중인 음성을 멈추고 이 파일을 재생 대기열에 넣은 뒤 바로 반환)
 def play_audio(file_path):
-    st.session_state.current_speech = file_path
-    
-# 실제 음성 재생 함수
-def play_speech(file_path):
-    pygame.mixer.music.load(file_path)
-    pygame.mixer.music.play()
-    while pygame.mixer.music.get_busy():
-        time.sleep(0.1)
-    pygame.mixer.music.unload()
+    audio_player.interrupt()(file_path)
 
 # 페이지 설정
 st.set_page_config(page_title="차수민 챗봇", page_icon="💬")
@@ -95,10 +120,20 @@ with st.sidebar:
         step=0.1,
         help="값이 높을수록 더 창의적인 응답을 생성합니다. 낮을수록 더 결정적이고 일관된 응답을 생성합니다."
     )
+    memory = st.session_state.memory
+    st.caption(f"🧠 대화 메모리: 요약된 메시지 {memory.summarized_count}개 · 최근 메시지 {memory.last_window}개 그대로 전달 · 예산 {token_budget(st.session_state.model)} 토큰")
 
     # 음성 설정 구분선
     st.divider()
     st.subheader("음성 설정 🎤")
+    cache_summary = speech_cache.summary()
+    st.caption(f"🔊 음성 캐시: 적중 {cache_summary['hits']} / 미스 {cache_summary['misses']} · 파일 {cache_summary['files']}개 ({cache_summary['bytes'] / 1024 / 1024:.1f}MB) · 생성 중 {speech_jobs.pending()}개")
+
+    # 음성 재생 제어 (재생은 별도 스레드에서 하므로 화면은 바로 반응함)
+    play_col, stop_col = st.columns(2)
+    play_col.button("⏭️ 건너뛰기", on_click=audio_player.skip)
+    stop_col.button("⏹️ 정지", on_click=audio_player.stop)
+    st.caption(f"🔈 출력 장치: {audio_player.sink.name} · 대기 중인 음성 {audio_player.pending()}개")
 
     # 음성 모델 선택
     voice_model_options = {
@@ -168,26 +203,33 @@ with st.sidebar:
 st.title("AI 채팅방 🤖")
 
 # 채팅 기록 표시
+pending_speech_jobs = []
 for i, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         st.write(message["content"])
+        if "metrics" in message:
+            st.caption(describe_metrics(message["metrics"]))
         
         # AI 응답에만 음성 재생 버튼 추가
         if message["role"] == "assistant":
-            # 음성 파일 경로가 없으면 생성
-            if "speech_file" not in message:
-                speech_file = get_speech_file_path(message["content"])
-                if not os.path.exists(speech_file):
-                    speech_file = generate_and_save_speech(message["content"], speech_file)
-                message["speech_file"] = speech_file
+            # 음성 파일이 없으면 백그라운드 작업으로 요청하고 화면은 기다리지 않고 계속 그림
+            if "speech_file" not in message or not os.path.exists(message["speech_file"]):
+                job = speech_jobs.request(message["content"], current_voice_settings())
+                message["speech_status"] = job.status
+                if job.status == READY:
+                    message["speech_file"] = job.path
+                elif job.status == PENDING:
+                    message.pop("speech_file", None)
+                    pending_speech_jobs.append(job)
+                    st.caption("🔊 음성 생성 중...")
+                else:
+                    message.pop("speech_file", None)
+                    st.error(f"음성 파일 생성 중 오류가 발생했습니다: {job.error}")
+                    st.button("음성 다시 생성", key=f"retry_speech_{i}", on_click=speech_jobs.retry, args=(job.key,))
             
             # 음성 재생 버튼
-            st.button("🔊 음성 다시 듣기", key=f"play_{i}", on_click=play_audio, args=(message["speech_file"],))
-
-# 현재 재생할 음성이 있으면 재생
-if st.session_state.current_speech:
-    play_speech(st.session_state.current_speech)
-    st.session_state.current_speech = None
+            if "speech_file" in message:
+                st.button("🔊 음성 다시 듣기", key=f"play_{i}", on_click=play_audio, args=(message["speech_file"],))
 
 # 사용자 입력
 if prompt := st.chat_input("메시지를 입력하세요..."):
@@ -199,45 +241,51 @@ if prompt := st.chat_input("메시지를 입력하세요..."):
     # AI 응답 생성
     with st.chat_message("assistant"):
         try:
-            # 시스템 메시지에 음성 지시사항 반영
-            system_message = {
-                "role": "system",
-                "content": f"당신은 {st.session_state.voice_instructions}로 대화하는 AI 어시스턴트입니다. 모든 응답은 이 톤과 스타일을 유지해야 합니다."
-            } if st.session_state.voice_instructions else None
-
-            # 메시지 목록 준비
-            messages = [system_message] if system_message else []
-            messages.extend([
-                {"role": m["role"], "content": m["content"]}
-                for m in st.session_state.messages
-            ])
-
-            # OpenAI API 호출
-            response = client.chat.completions.create(
+            # 메시지 목록 준비 (음성 지시사항을 시스템 메시지로 반영, 최근 대화만 그대로 보내고 이전 대화는 요약으로 전달)
+            metrics = TurnMetrics()
+            history = st.session_state.memory.window(st.session_state.messages, st.session_state.model, metrics)
+            messages = build_messages(
+                history,
+                st.session_state.voice_instructions,
+                summary=st.session_state.memory.summary
+            )
+
+            # 문장이 완성되는 대로 음성을 합성하고(캐시에 있는 문장은 재사용), 첫 문장이 준비되면 바로 재생 시작
+            voice = current_voice_settings()
+            speech = SpeechPipeline(partial(speech_cache.get_or_synthesize, synthesize=synthesize_speech, **voice))
+            speech.start_playback(audio_player.interrupt())
+
+            # OpenAI API 호출 (토큰이 도착하는 대로 말풍선에 표시하면서 음성 파이프라인에도 전달)
+            ai_response = st.write_stream(speak_while_streaming(stream_completion(
+                client,
+                metrics,
                 model=st.session_state.model,
                 messages=messages,
                 temperature=st.session_state.temperature,
-            )
-            
-            # AI 응답 표시
-            ai_response = response.choices[0].message.content
-            st.write(ai_response)
+            ), speech))
+            turn_metrics = metrics.to_dict()
+            st.caption(describe_metrics(turn_metrics))
             
-            # 음성 파일 생성 및 저장
-            speech_file = get_speech_file_path(ai_response)
-            generate_and_save_speech(ai_response, speech_file)
+            # 문장별 음성을 하나의 파일로 합쳐 저장 (다시 듣기용)
+            speech_file = get_speech_file_path(ai_response, voice) or speech_cache.put(
+                speech_cache.key(ai_response, **voice), speech.audio()
+            )
             
             # AI 응답을 메시지 히스토리에 추가
             st.session_state.messages.append({
                 "role": "assistant",
                 "content": ai_response,
-                "speech_file": speech_file
+                "speech_file": speech_file,
+                "speech_status": READY,
+                "metrics": turn_metrics
             })
             
-            # 음성 즉시 재생
-            play_speech(speech_file)
-            
         except BadRequestError as e:
             st.error(f"API 호출 중 오류가 발생했습니다: {str(e)}")
         except Exception as e:
             st.error(f"예기치 않은 오류가 발생했습니다: {str(e)}")
+
+# 생성 중인 음성이 있으면 잠시 기다렸다가 다시 그려서 준비된 버튼을 표시
+if pending_speech_jobs:
+    speech_jobs.wait(pending_speech_jobs, timeout=1.0)
+    st.rerun()